@@ -0,0 +1,331 @@
+"""
+Versioned JSON API for Annasamarpan
+Served under /api/v1 for the dashboards' polling and for partner
+integrations. Lists are paginated with keyset cursors (see pagination.py);
+pass `next_cursor` back as `cursor` for the next page. ObjectId and datetime
+fields are serialized by the app's JSON provider, which uses orjson when it
+is installed (pip install orjson).
+"""
+
+import functools
+import hmac
+import os
+import uuid
+from datetime import date, datetime
+
+from bson.objectid import ObjectId
+from flask import Blueprint, current_app, jsonify, request, session
+from flask.json.provider import DefaultJSONProvider
+from pymongo.errors import BulkWriteError
+
+import archive
+import counters
+import live
+import search
+from bulk_io import MAX_REPORTED_ERRORS, RowError, validate_row
+from pagination import fetch_page
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Default and largest page size for list endpoints
+API_PAGE_SIZE = int(os.environ.get('API_PAGE_SIZE', 20))
+API_MAX_PAGE_SIZE = 100
+
+# Milliseconds browsers wait before reconnecting a dropped event stream
+LIVE_RETRY_MS = 5000
+
+# Donation line items accepted in one bulk request
+API_BULK_MAX_ITEMS = int(os.environ.get('API_BULK_MAX_ITEMS', 500))
+
+# Comma-separated bearer tokens for partner integrations (bulk submission)
+API_TOKENS = [token.strip() for token in os.environ.get('API_TOKENS', '').split(',') if token.strip()]
+
+DONATION_SORT = [('created_at', -1), ('_id', -1)]
+VOLUNTEER_SORT = [('created_at', -1), ('_id', -1)]
+ASSIGNMENT_SORT = [('_id', -1)]
+
+DONATION_FIELDS = {'donor_email': 1, 'food_type': 1, 'quantity': 1, 'description': 1, 'pickup_address': 1,
+                   'expiry_date': 1, 'status': 1, 'created_at': 1}
+VOLUNTEER_FIELDS = {'name': 1, 'email': 1, 'city': 1, 'state': 1, 'availability': 1,
+                    'active_assignments': 1, 'created_at': 1}
+
+api = Blueprint('api_v1', __name__, url_prefix='/api/v1')
+
+
+def _default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class MongoJSONProvider(DefaultJSONProvider):
+    """JSON provider that writes ObjectIds as strings and datetimes as ISO 8601"""
+
+    default = staticmethod(_default)
+
+    def dumps(self, obj, **kwargs):
+        # orjson always writes compact output, which is what jsonify asks for
+        # outside debug; indented output goes through json
+        sort_keys = kwargs.pop('sort_keys', self.sort_keys)
+        if orjson is not None and kwargs.pop('separators', (',', ':')) == (',', ':') and not kwargs:
+            option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_SORT_KEYS if sort_keys else 0)
+            return orjson.dumps(obj, default=_default, option=option).decode()
+        return super().dumps(obj, sort_keys=sort_keys, **kwargs)
+
+
+def _db():
+    return current_app.extensions['annasamarpan_db']
+
+
+def _analytics_db():
+    """Handle for dashboard reads, which may be served by a secondary"""
+    return current_app.extensions['annasamarpan_analytics_db']
+
+
+def _error(message, status, **details):
+    return jsonify({'error': message, **details}), status
+
+
+def _requires_session(key):
+    """Answer 401 unless the session carries `key` (admin_email / volunteer_email)"""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if not session.get(key):
+                return _error('authentication required', 401)
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _valid_token():
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    return scheme.lower() == 'bearer' and any(
+        hmac.compare_digest(token.encode(), allowed.encode()) for allowed in API_TOKENS)
+
+
+def _requires_admin_or_token(view):
+    """Answer 401 unless an admin is logged in or a partner sent a valid API token"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not session.get('admin_email') and not _valid_token():
+            return _error('authentication required', 401)
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def _wants_history():
+    """True when the request asks for archived records too (?history=true)"""
+    return request.args.get('history', '').lower() in ('1', 'true', 'yes')
+
+
+def _page_size():
+    try:
+        size = int(request.args.get('limit', API_PAGE_SIZE))
+    except ValueError:
+        size = API_PAGE_SIZE
+    return min(max(size, 1), API_MAX_PAGE_SIZE)
+
+
+@api.route('/admin/stats')
+@_requires_session('admin_email')
+def admin_stats():
+    """Dashboard totals from the counters collection (short-TTL cached)"""
+    return jsonify(counters.get_stats(_analytics_db().counters))
+
+
+@api.route('/admin/donations')
+@_requires_session('admin_email')
+def admin_donations():
+    """Newest donations first, optionally filtered by status (`history=true` adds archived ones)"""
+    query = {'status': request.args['status']} if request.args.get('status') else {}
+    if _wants_history():
+        donations, next_cursor = archive.fetch_history_page(_analytics_db(), 'donations', query, DONATION_SORT,
+                                                            _page_size(), request.args.get('cursor'), DONATION_FIELDS)
+    else:
+        donations, next_cursor = fetch_page(_analytics_db().donations, query, DONATION_SORT, _page_size(),
+                                            request.args.get('cursor'), DONATION_FIELDS)
+    return jsonify({'donations': donations, 'next_cursor': next_cursor})
+
+
+@api.route('/admin/volunteers')
+@_requires_session('admin_email')
+def admin_volunteers():
+    """Newest volunteers first"""
+    volunteers, next_cursor = fetch_page(_analytics_db().volunteers, {}, VOLUNTEER_SORT, _page_size(),
+                                         request.args.get('cursor'), VOLUNTEER_FIELDS)
+    return jsonify({'volunteers': volunteers, 'next_cursor': next_cursor})
+
+
+@api.route('/admin/search')
+@_requires_session('admin_email')
+def admin_search():
+    """Donors, volunteers, recipients and donations matching `q`, most relevant first
+
+    `collections` narrows the search (comma separated). Results are ranked
+    in memory from a bounded candidate set, so `next_cursor` is an offset.
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return _error('q is required', 400)
+    names = [name for name in request.args.get('collections', '').split(',') if name]
+    unknown = [name for name in names if name not in search.SEARCH_COLLECTIONS]
+    if unknown:
+        return _error(f"unknown collections: {', '.join(unknown)}", 400)
+    cursor = request.args.get('cursor', '')
+    offset = int(cursor) if cursor.isdigit() else 0
+    size = _page_size()
+
+    results = search.search(_analytics_db(), query, names or search.SEARCH_COLLECTIONS)
+    next_cursor = str(offset + size) if len(results) > offset + size else None
+    return jsonify({'results': results[offset:offset + size], 'total': len(results), 'next_cursor': next_cursor})
+
+
+@api.route('/volunteer/assignments')
+@_requires_session('volunteer_email')
+def volunteer_assignments():
+    """The logged-in volunteer's assignments (newest first) with their donations and per-status counts
+
+    Counts always include archived deliveries; `history=true` also lists archived assignments.
+    """
+    db = _analytics_db()
+    email = session['volunteer_email']
+    if _wants_history():
+        assignments, next_cursor = archive.fetch_history_page(db, 'assignments', {'volunteer_email': email},
+                                                              ASSIGNMENT_SORT, _page_size(), request.args.get('cursor'))
+        donations = archive.find_by_ids(db, 'donations', [a['donation_id'] for a in assignments], DONATION_FIELDS)
+    else:
+        assignments, next_cursor = fetch_page(db.assignments, {'volunteer_email': email}, ASSIGNMENT_SORT,
+                                              _page_size(), request.args.get('cursor'))
+        donations = {d['_id']: d for d in db.donations.find(
+            {'_id': {'$in': [a['donation_id'] for a in assignments]}}, DONATION_FIELDS)}
+    for assignment in assignments:
+        assignment['donation'] = donations.get(assignment['donation_id'])
+
+    counts = {row['_id']: row['count'] for row in db.assignments.aggregate([
+        {'$match': {'volunteer_email': email}},
+        {'$group': {'_id': '$status', 'count': {'$sum': 1}}}
+    ])}
+    volunteer = db.volunteers.find_one({'email': email}, {'archived_deliveries': 1}) or {}
+    if volunteer.get('archived_deliveries'):
+        counts['completed'] = counts.get('completed', 0) + volunteer['archived_deliveries']
+    counts['total'] = sum(counts.values())
+    return jsonify({'assignments': assignments, 'next_cursor': next_cursor, 'counts': counts})
+
+
+@api.route('/events')
+def events():
+    """Server-Sent Events: donation and assignment changes for the logged-in admin or volunteer"""
+    if session.get('admin_email'):
+        volunteer_email = None
+    elif session.get('volunteer_email'):
+        volunteer_email = session['volunteer_email']
+    else:
+        return _error('authentication required', 401)
+
+    if not live.streams_supported(request.environ):
+        # A sync or gthread worker; the dashboards keep polling instead
+        return _error('live updates need gevent workers', 503)
+    subscription = live.subscribe(_db(), volunteer_email)
+    if subscription is None:
+        # The dashboards keep polling instead
+        return _error('too many live connections', 503)
+
+    dumps = current_app.json.dumps
+
+    def stream():
+        try:
+            yield f'retry: {LIVE_RETRY_MS}\n\n'
+            while True:
+                event = subscription.get(live.LIVE_HEARTBEAT)
+                if event is None:
+                    yield ': keep-alive\n\n'
+                else:
+                    yield f"event: {event['type']}\ndata: {dumps(event)}\n\n"
+        finally:
+            live.unsubscribe(subscription)
+
+    response = current_app.response_class(stream(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@api.route('/donations/bulk', methods=['POST'])
+@_requires_admin_or_token
+def bulk_donations():
+    """Submit many donation line items for one donor with a single insert_many
+
+    Body: {"donor": {name, email, phone, address, city, state, pincode},
+    "donations": [{food_type, quantity, description, expiry_date}, ...],
+    "idempotency_key": "..."}. Every item is validated before anything is
+    written. Retrying a request with the same idempotency_key does not insert
+    its items twice. Needs an admin session or `Authorization: Bearer <token>`
+    with one of API_TOKENS.
+    """
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return _error('expected a JSON object', 400)
+    items = payload.get('donations')
+    if not isinstance(items, list) or not items:
+        return _error('donations must be a non-empty list', 400)
+    if len(items) > API_BULK_MAX_ITEMS:
+        return _error(f'at most {API_BULK_MAX_ITEMS} donations per request', 413)
+
+    try:
+        donor = validate_row(payload.get('donor') or {}, 'donors')
+    except RowError as e:
+        return _error(f'invalid donor: {e}', 400)
+
+    now = datetime.now()
+    key = str(payload.get('idempotency_key') or uuid.uuid4().hex)
+    documents = []
+    errors = []
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors.append({'index': i, 'error': 'expected an object'})
+            continue
+        row = dict(item, donor_email=donor['email'], created_at=now)
+        row.setdefault('pickup_address', donor.get('address', ''))
+        try:
+            document = validate_row(row, 'donations')
+        except RowError as e:
+            errors.append({'index': i, 'error': str(e)})
+            continue
+        # Line items are new donations, whatever status the partner sent
+        document.update(status='pending', updated_at=now, idempotency_key=f'{key}:{i}')
+        documents.append(document)
+    if errors:
+        return _error('invalid donations', 400, invalid=len(errors), details=errors[:MAX_REPORTED_ERRORS])
+
+    db = _db()
+    try:
+        inserted = len(db.donations.insert_many(documents, ordered=False).inserted_ids)
+    except BulkWriteError as e:
+        # Duplicate idempotency keys are items stored by an earlier attempt
+        if any(error['code'] != 11000 for error in e.details['writeErrors']):
+            raise
+        inserted = e.details['nInserted']
+
+    donor.setdefault('created_at', now)
+    db.donors.update_one({'email': donor['email']}, {'$setOnInsert': donor}, upsert=True)
+    if inserted:
+        counters.increment(db.counters, total_donations=inserted, pending_donations=inserted,
+                           monthly={'donations': inserted})
+        live.publish_resync()
+    return jsonify({'inserted': inserted, 'duplicates': len(documents) - inserted}), 201 if inserted else 200
+
+
+def init_app(app, database, analytics_database=None):
+    """Register the API and the ObjectId/datetime-aware JSON provider"""
+    app.json = MongoJSONProvider(app)
+    app.extensions['annasamarpan_db'] = database
+    # Database objects refuse truth testing, so compare with None
+    app.extensions['annasamarpan_analytics_db'] = analytics_database if analytics_database is not None else database
+    app.register_blueprint(api)
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Hot/cold tiering for Annasamarpan
+Completed and expired donations that have not changed for ARCHIVE_AFTER_DAYS
+move, with their assignments, into monthly archive collections
+(`donations_archive_2024_06`, `assignments_archive_2024_06`, by the month the
+donation was created). The hot collections keep only open and recent work,
+so their indexes and documents stay in the WiredTiger cache. Archives use
+zstd block compression.
+
+Each batch copies records into the archive (an idempotent upsert) before
+deleting them from the hot collection, so an interrupted run resumes where it
+stopped. Impact totals survive archiving: the rollups and counter rebuilds
+read the archives too, and volunteers keep their delivery counts in
+`archived_deliveries`. Reads that ask for history go through
+fetch_history_page, which merges the hot collection with every archive.
+
+Usage:
+    python archive.py                  # archive everything eligible now
+    python archive.py --days 180 --rate 500
+    python archive.py --watch 3600     # keep archiving every hour
+    python archive.py --recount        # rebuild volunteers' archived_deliveries
+"""
+
+import argparse
+import os
+import time
+from datetime import datetime, timedelta
+
+from pymongo import ASCENDING, DESCENDING, ReplaceOne
+from pymongo.errors import CollectionInvalid
+
+from pagination import decode_cursor, encode_cursor, keyset_filter
+
+# Completed/expired records untouched for this long are archived
+ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', 90))
+
+# Donations moved per batch (their assignments go with them)
+ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', 500))
+
+# Most documents archived per second, to leave write capacity for the app
+ARCHIVE_MAX_DOCS_PER_SECOND = float(os.environ.get('ARCHIVE_MAX_DOCS_PER_SECOND', 2000))
+
+ARCHIVE_STATUSES = ['completed', 'expired']
+ARCHIVED_KINDS = ('donations', 'assignments')
+
+STATE = 'archive_state'
+STATE_ID = 'archive'
+
+# Cold data is read rarely, so trade some CPU for smaller files
+ARCHIVE_STORAGE = {'wiredTiger': {'configString': 'block_compressor=zstd'}}
+
+# Indexes for the history reads (see indexes.py for the hot collections)
+ARCHIVE_INDEXES = {
+    'donations': [
+        ([('created_at', DESCENDING), ('_id', DESCENDING)], {}),
+        ([('status', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)], {}),
+        ([('donor_email', ASCENDING)], {}),
+    ],
+    'assignments': [
+        ([('volunteer_email', ASCENDING), ('_id', DESCENDING)], {}),
+        ([('donation_id', ASCENDING)], {}),
+    ],
+}
+
+
+def archive_name(kind, month):
+    """Archive collection for a 'YYYY-MM' month"""
+    return f"{kind}_archive_{month.replace('-', '_')}"
+
+
+def archive_names(db, kind, months=None):
+    """Existing archive collections of `kind`, newest month first (only `months` if given)"""
+    prefix = f'{kind}_archive_'
+    names = [name for name in db.list_collection_names() if name.startswith(prefix)]
+    if months is not None:
+        wanted = {archive_name(kind, month) for month in months}
+        names = [name for name in names if name in wanted]
+    return sorted(names, reverse=True)
+
+
+def _month(donation):
+    created = donation.get('created_at')
+    if not isinstance(created, datetime):
+        created = donation.get('updated_at') or datetime.now()
+    return created.strftime('%Y-%m')
+
+
+def _ensure_archive(db, kind, name, ensured):
+    if name in ensured:
+        return
+    try:
+        db.create_collection(name, storageEngine=ARCHIVE_STORAGE)
+    except CollectionInvalid:
+        pass
+    for keys, options in ARCHIVE_INDEXES[kind]:
+        db[name].create_index(keys, **options)
+    ensured.add(name)
+
+
+def _copy(db, kind, documents, month_of, ensured):
+    """Upsert documents into their monthly archives; safe to repeat"""
+    by_month = {}
+    for document in documents:
+        by_month.setdefault(month_of(document), []).append(document)
+    for month, batch in by_month.items():
+        name = archive_name(kind, month)
+        _ensure_archive(db, kind, name, ensured)
+        db[name].bulk_write([ReplaceOne({'_id': d['_id']}, d, upsert=True) for d in batch], ordered=False)
+
+
+def archive_batch(db, cutoff, batch_size=ARCHIVE_BATCH_SIZE, ensured=None):
+    """Move one batch of eligible donations and their assignments; returns (donations, assignments)"""
+    ensured = set() if ensured is None else ensured
+    eligible = {'status': {'$in': ARCHIVE_STATUSES}, 'updated_at': {'$lt': cutoff}}
+    donations = list(db.donations.find(eligible).sort('updated_at', ASCENDING).limit(batch_size))
+    if not donations:
+        return 0, 0
+    months = {d['_id']: _month(d) for d in donations}
+    assignments = list(db.assignments.find({'donation_id': {'$in': list(months)}}))
+
+    _copy(db, 'donations', donations, lambda d: months[d['_id']], ensured)
+    _copy(db, 'assignments', assignments, lambda a: months[a['donation_id']], ensured)
+
+    # Only delete what is still eligible; a donation changed since it was read stays hot
+    db.donations.delete_many({'_id': {'$in': list(months)}, **eligible})
+    kept = {d['_id'] for d in db.donations.find({'_id': {'$in': list(months)}}, {'_id': 1})}
+    if kept:
+        # Drop their archive copies so nothing is counted twice
+        for kind in ARCHIVED_KINDS:
+            field = '_id' if kind == 'donations' else 'donation_id'
+            for month in {months[i] for i in kept}:
+                db[archive_name(kind, month)].delete_many({field: {'$in': list(kept)}})
+    moved = [a for a in assignments if a['donation_id'] not in kept]
+    if moved:
+        db.assignments.delete_many({'_id': {'$in': [a['_id'] for a in moved]}})
+
+    # Volunteers' dashboards count archived deliveries from their own document
+    delivered = {}
+    for assignment in moved:
+        if assignment.get('status') == 'completed':
+            delivered[assignment['volunteer_email']] = delivered.get(assignment['volunteer_email'], 0) + 1
+    for email, count in delivered.items():
+        db.volunteers.update_one({'email': email}, {'$inc': {'archived_deliveries': count}})
+    return len(donations) - len(kept), len(moved)
+
+
+def archive(db, older_than_days=ARCHIVE_AFTER_DAYS, batch_size=ARCHIVE_BATCH_SIZE,
+            max_rate=ARCHIVE_MAX_DOCS_PER_SECOND, now=None):
+    """Archive everything eligible, batch by batch at a bounded rate; returns a report"""
+    now = now or datetime.now()
+    cutoff = now - timedelta(days=older_than_days)
+    started = time.monotonic()
+    ensured = set()
+    donations = assignments = batches = 0
+    while True:
+        moved_donations, moved_assignments = archive_batch(db, cutoff, batch_size, ensured)
+        if not moved_donations and not moved_assignments:
+            break
+        donations += moved_donations
+        assignments += moved_assignments
+        batches += 1
+        # Sleep until the average rate is back under the limit
+        wait = (donations + assignments) / max_rate - (time.monotonic() - started)
+        if wait > 0:
+            time.sleep(wait)
+
+    db[STATE].update_one({'_id': STATE_ID}, {
+        '$set': {'last_run_at': now, 'cutoff': cutoff},
+        '$inc': {'archived_donations': donations, 'archived_assignments': assignments}
+    }, upsert=True)
+    return {'donations': donations, 'assignments': assignments, 'batches': batches,
+            'elapsed_seconds': round(time.monotonic() - started, 2)}
+
+
+def fetch_history_page(db, kind, query, sort, limit, cursor=None, projection=None):
+    """fetch_page across the hot collection and every archive of `kind`
+
+    Each collection contributes its own first `limit + 1` matches after the
+    cursor; the merged page is cut from those, so every read is an index scan.
+    """
+    values = decode_cursor(cursor, sort)
+    if values is not None:
+        query = {'$and': [query, keyset_filter(sort, values)]} if query else keyset_filter(sort, values)
+
+    documents = {}
+    for name in [kind] + archive_names(db, kind):
+        for document in db[name].find(query, projection).sort(sort).limit(limit + 1):
+            # A record caught mid-archive is in both; the hot copy wins
+            documents.setdefault(document['_id'], document)
+
+    ordered = list(documents.values())
+    for field, direction in reversed(sort):
+        ordered.sort(key=lambda d: (d.get(field) is not None, d.get(field)), reverse=direction < 0)
+    next_cursor = encode_cursor(ordered[limit - 1], sort) if len(ordered) > limit else None
+    return ordered[:limit], next_cursor
+
+
+def find_by_ids(db, kind, ids, projection=None):
+    """{_id: document} for `ids`, looking in the archives for any not in the hot collection"""
+    found = {}
+    for name in [kind] + archive_names(db, kind):
+        missing = [i for i in ids if i not in found]
+        if not missing:
+            break
+        found.update((d['_id'], d) for d in db[name].find({'_id': {'$in': missing}}, projection))
+    return found
+
+
+def count_with_history(db, kind, query):
+    """count_documents over the hot collection and its archives"""
+    return sum(db[name].count_documents(query) for name in [kind] + archive_names(db, kind))
+
+
+def recount_archived_deliveries(db):
+    """Rebuild volunteers' archived_deliveries from the archives"""
+    counts = {}
+    for name in archive_names(db, 'assignments'):
+        for row in db[name].aggregate([
+            {'$match': {'status': 'completed'}},
+            {'$group': {'_id': '$volunteer_email', 'count': {'$sum': 1}}}
+        ]):
+            counts[row['_id']] = counts.get(row['_id'], 0) + row['count']
+    db.volunteers.update_many({'email': {'$nin': list(counts)}, 'archived_deliveries': {'$exists': True}},
+                              {'$unset': {'archived_deliveries': ''}})
+    for email, count in counts.items():
+        db.volunteers.update_one({'email': email}, {'$set': {'archived_deliveries': count}})
+    return len(counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Move old completed and expired donations to monthly archives')
+    parser.add_argument('--days', type=int, default=ARCHIVE_AFTER_DAYS, help='archive records untouched this long')
+    parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE)
+    parser.add_argument('--rate', type=float, default=ARCHIVE_MAX_DOCS_PER_SECOND, help='most documents per second')
+    parser.add_argument('--watch', type=float, metavar='SECONDS', help='keep archiving at this interval')
+    parser.add_argument('--recount', action='store_true', help="rebuild volunteers' archived_deliveries")
+    args = parser.parse_args()
+
+    from app import db
+
+    if args.recount:
+        print(f"✅ Recounted archived deliveries for {recount_archived_deliveries(db)} volunteers")
+        return
+
+    while True:
+        report = archive(db, args.days, args.batch_size, args.rate)
+        print(f"🗄️  Archived {report['donations']} donations and {report['assignments']} assignments "
+              f"in {report['batches']} batches ({report['elapsed_seconds']}s)")
+        if not args.watch:
+            break
+        time.sleep(args.watch)
+
+
+if __name__ == '__main__':
+    main()
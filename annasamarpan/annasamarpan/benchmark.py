@@ -0,0 +1,482 @@
+#!/usr/bin/env python3
+"""
+Load-test and benchmark suite for Annasamarpan
+`seed` fills the database with a synthetic dataset generated in vectorized
+chunks (donors and volunteers spread around Indian cities with matching
+pincodes, donations, assignments, recipients) and bulk-inserted. `run` drives
+every main route with concurrent requests and writes p50/p95/p99 latency and
+throughput per route to a JSON baseline that later runs can be compared with.
+
+Usage:
+    python benchmark.py seed --scale 100000 --drop
+    python benchmark.py run --requests 500 --concurrency 16 --output baseline.json
+    python benchmark.py run --url http://localhost:5000 --compare baseline.json
+    python benchmark.py run --mongomock --scale 10000   # in-memory, for CI (pip install mongomock)
+
+A scale of N seeds N donors and N donations, plus N/10 volunteers and N/10
+recipients; every donation that is not pending gets an assignment.
+"""
+
+import argparse
+import json
+import platform
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+from bson.objectid import ObjectId
+
+# Documents generated and inserted per batch
+CHUNK_SIZE = 10000
+
+# Synthetic addresses are scattered around these cities:
+# (city, state, latitude, longitude, first pincode of the area)
+CITIES = [
+    ('Mumbai', 'Maharashtra', 19.0760, 72.8777, 400001),
+    ('Delhi', 'Delhi', 28.6139, 77.2090, 110001),
+    ('Bangalore', 'Karnataka', 12.9716, 77.5946, 560001),
+    ('Kolkata', 'West Bengal', 22.5726, 88.3639, 700001),
+    ('Chennai', 'Tamil Nadu', 13.0827, 80.2707, 600001),
+    ('Hyderabad', 'Telangana', 17.3850, 78.4867, 500001),
+    ('Pune', 'Maharashtra', 18.5204, 73.8567, 411001),
+    ('Ahmedabad', 'Gujarat', 23.0225, 72.5714, 380001),
+    ('Jaipur', 'Rajasthan', 26.9124, 75.7873, 302001),
+    ('Lucknow', 'Uttar Pradesh', 26.8467, 80.9462, 226001),
+]
+CITY_CENTERS = np.array([(lat, lon) for _, _, lat, lon, _ in CITIES])
+CITY_PINCODES = np.array([pincode for *_, pincode in CITIES])
+
+# Spread of addresses around a city centre, in degrees (~9 km)
+CITY_SPREAD = 0.08
+
+FOOD_TYPES = ['cooked_meals', 'raw_vegetables', 'grains_rice', 'fruits', 'dairy_products',
+              'packaged_food', 'bakery_items', 'other']
+DONATION_STATUSES = ['pending', 'assigned', 'completed']
+DONATION_STATUS_WEIGHTS = [0.2, 0.3, 0.5]
+
+# Synthetic records use a reserved domain so they are easy to spot and remove
+EMAIL_DOMAIN = 'bench.annasamarpan.test'
+
+SEEDED_COLLECTIONS = ['donors', 'volunteers', 'recipients', 'donations', 'assignments']
+
+
+def donor_email(i):
+    return f"donor{i}@{EMAIL_DOMAIN}"
+
+
+def volunteer_email(i):
+    return f"volunteer{i}@{EMAIL_DOMAIN}"
+
+
+def _addresses(rng, n):
+    """City index, latitude, longitude and pincode arrays for n addresses"""
+    city = rng.integers(len(CITIES), size=n)
+    latitude = np.round(CITY_CENTERS[city, 0] + rng.normal(0, CITY_SPREAD, n), 6)
+    longitude = np.round(CITY_CENTERS[city, 1] + rng.normal(0, CITY_SPREAD, n), 6)
+    pincode = CITY_PINCODES[city] + rng.integers(0, 100, n)
+    return city, latitude, longitude, pincode
+
+
+def _timestamps(rng, n, now, days=180):
+    """n datetimes spread over the last `days` days"""
+    offsets = rng.integers(0, days * 86400, size=n).astype('timedelta64[s]')
+    return (np.datetime64(now, 's') - offsets).astype('datetime64[us]').tolist()
+
+
+def _people(rng, start, stop, now, prefix, email):
+    n = stop - start
+    city, latitude, longitude, pincode = _addresses(rng, n)
+    phones = rng.integers(7000000000, 9999999999, size=n)
+    created = _timestamps(rng, n, now)
+    return [
+        {
+            'name': f"{prefix} {start + j}",
+            'email': email(start + j),
+            'phone': f"+91 {phones[j]}",
+            'address': f"{j % 500 + 1} Main Road, {CITIES[c][0]}",
+            'city': CITIES[c][0],
+            'state': CITIES[c][1],
+            'pincode': str(pincode[j]),
+            'latitude': float(latitude[j]),
+            'longitude': float(longitude[j]),
+            'location': {'type': 'Point', 'coordinates': [float(longitude[j]), float(latitude[j])]},
+            'created_at': created[j]
+        }
+        for j, c in enumerate(city.tolist())
+    ]
+
+
+def generate_donors(rng, start, stop, now):
+    return _people(rng, start, stop, now, 'Donor', donor_email)
+
+
+def generate_volunteers(rng, start, stop, now):
+    volunteers = _people(rng, start, stop, now, 'Volunteer', volunteer_email)
+    busy = rng.random(len(volunteers)) < 0.2
+    for volunteer, is_busy in zip(volunteers, busy.tolist()):
+        volunteer['availability'] = 'busy' if is_busy else 'available'
+    return volunteers
+
+
+def generate_recipients(rng, start, stop, now):
+    n = stop - start
+    city, _, _, pincode = _addresses(rng, n)
+    family_size = rng.integers(1, 9, size=n)
+    verified = rng.random(n) < 0.7
+    created = _timestamps(rng, n, now)
+    return [
+        {
+            'name': f"Recipient {start + j}",
+            'phone': f"+91 6{start + j:09d}",
+            'address': f"{j % 300 + 1} Colony Road, {CITIES[c][0]}",
+            'city': CITIES[c][0],
+            'state': CITIES[c][1],
+            'pincode': str(pincode[j]),
+            'family_size': int(family_size[j]),
+            'verification_status': 'verified' if verified[j] else 'pending',
+            'created_at': created[j]
+        }
+        for j, c in enumerate(city.tolist())
+    ]
+
+
+def generate_donations(rng, start, stop, now, donor_count, volunteer_count):
+    """A chunk of donations plus assignments for the ones already picked up"""
+    n = stop - start
+    donor = rng.integers(donor_count, size=n)
+    volunteer = rng.integers(volunteer_count, size=n)
+    food = rng.integers(len(FOOD_TYPES), size=n)
+    status = rng.choice(len(DONATION_STATUSES), size=n, p=DONATION_STATUS_WEIGHTS)
+    quantity = rng.integers(5, 100, size=n)
+    created = _timestamps(rng, n, now)
+    # Pending donations still have 1 hour to 7 days left
+    hours_left = rng.integers(1, 168, size=n)
+
+    donations = []
+    assignments = []
+    for j in range(n):
+        donation_status = DONATION_STATUSES[status[j]]
+        donation = {
+            '_id': ObjectId(),
+            'donor_email': donor_email(int(donor[j])),
+            'food_type': FOOD_TYPES[food[j]],
+            'quantity': f"{quantity[j]} meals",
+            'description': 'Synthetic benchmark donation',
+            'pickup_address': f"{j % 500 + 1} Main Road",
+            'expiry_date': (now + timedelta(hours=int(hours_left[j])) if donation_status == 'pending'
+                            else created[j] + timedelta(days=2)),
+            'status': donation_status,
+            'created_at': created[j],
+            'updated_at': created[j]
+        }
+        if donation_status != 'pending':
+            donation['assigned_volunteer'] = volunteer_email(int(volunteer[j]))
+            assignment = {
+                'donation_id': donation['_id'],
+                'volunteer_email': donation['assigned_volunteer'],
+                'status': 'assigned' if donation_status == 'assigned' else 'completed',
+                'assigned_at': created[j] + timedelta(hours=1)
+            }
+            if donation_status == 'completed':
+                assignment['completed_at'] = created[j] + timedelta(hours=3)
+            assignments.append(assignment)
+        donations.append(donation)
+    return donations, assignments
+
+
+def _insert(collection, documents, totals):
+    if documents:
+        collection.insert_many(documents, ordered=False)
+        totals[collection.name] = totals.get(collection.name, 0) + len(documents)
+
+
+def seed(db, scale, chunk_size=CHUNK_SIZE, random_seed=42, drop=False):
+    """Bulk-load a synthetic dataset of the given scale; returns inserted counts"""
+    import counters
+    import indexes
+
+    if drop:
+        for name in SEEDED_COLLECTIONS:
+            db[name].drop()
+    elif db.donors.estimated_document_count():
+        raise SystemExit("❌ The donors collection is not empty; pass --drop to replace its data")
+
+    rng = np.random.default_rng(random_seed)
+    now = datetime.now()
+    volunteer_count = max(scale // 10, 1)
+    recipient_count = max(scale // 10, 1)
+
+    # Unique indexes first, so seeding pays the same write cost production does
+    indexes.ensure_indexes(db)
+
+    totals = {}
+    for start in range(0, scale, chunk_size):
+        stop = min(start + chunk_size, scale)
+        _insert(db.donors, generate_donors(rng, start, stop, now), totals)
+        donations, assignments = generate_donations(rng, start, stop, now, scale, volunteer_count)
+        _insert(db.donations, donations, totals)
+        _insert(db.assignments, assignments, totals)
+    for start in range(0, volunteer_count, chunk_size):
+        _insert(db.volunteers, generate_volunteers(rng, start, min(start + chunk_size, volunteer_count), now), totals)
+    for start in range(0, recipient_count, chunk_size):
+        _insert(db.recipients, generate_recipients(rng, start, min(start + chunk_size, recipient_count), now), totals)
+
+    counters.reconcile(db)
+    return totals
+
+
+class InProcessTransport:
+    """Requests through Flask test clients, one per thread"""
+
+    name = 'in-process'
+
+    def __init__(self, app):
+        self.app = app
+        self.local = threading.local()
+
+    def request(self, method, path, form=None, session=None):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = self.app.test_client()
+        # Reset the session every time so flashed messages do not pile up
+        with client.session_transaction() as flask_session:
+            flask_session.clear()
+            flask_session.update(session or {})
+
+        started = time.perf_counter()
+        response = client.open(path, method=method, data=form)
+        response.close()
+        return time.perf_counter() - started, response.status_code
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HTTPTransport:
+    """Requests over HTTP to a running server (dev server or gunicorn)
+
+    Sessions are signed locally with the app's SECRET_KEY, so the server must
+    use the same one.
+    """
+
+    def __init__(self, app, base_url):
+        self.name = base_url
+        self.base_url = base_url.rstrip('/')
+        self.serializer = app.session_interface.get_signing_serializer(app)
+        self.cookie_name = app.config['SESSION_COOKIE_NAME']
+        self.opener = urllib.request.build_opener(_NoRedirect)
+
+    def request(self, method, path, form=None, session=None):
+        data = urllib.parse.urlencode(form).encode() if form else None
+        http_request = urllib.request.Request(self.base_url + path, data=data, method=method)
+        if session:
+            http_request.add_header('Cookie', f"{self.cookie_name}={self.serializer.dumps(session)}")
+
+        started = time.perf_counter()
+        try:
+            with self.opener.open(http_request, timeout=30) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            # Redirects (with _NoRedirect) and error statuses both land here
+            status = e.code
+        except OSError:
+            status = None
+        return time.perf_counter() - started, status
+
+
+def _spread(i, count):
+    """Deterministic pseudo-random index for request i (safe to call from any thread)"""
+    return (i * 2654435761) % count
+
+
+def build_scenarios(db, requests):
+    """(name, method, build(i) -> (path, form, session)) for each route under test"""
+    volunteer_count = max(db.volunteers.estimated_document_count(), 1)
+    donor_count = max(db.donors.estimated_document_count(), 1)
+    # Each assignment consumes one pending donation
+    pending = [str(d['_id']) for d in db.donations.find({'status': 'pending'}, {'_id': 1}).limit(requests)]
+    admin_session = {'admin_email': 'admin@annasamarpan.com'}
+
+    def donor_form(i):
+        city = CITIES[i % len(CITIES)]
+        return {
+            'name': f"Load Donor {i}",
+            'email': donor_email(_spread(i, donor_count)),
+            'phone': '+91 9000000000',
+            'address': f"{i} Main Road",
+            'city': city[0],
+            'state': city[1],
+            'pincode': str(city[4]),
+            'food_type': FOOD_TYPES[i % len(FOOD_TYPES)],
+            'quantity': '10 meals',
+            'description': 'Load test donation',
+            'expiry_date': (datetime.now() + timedelta(hours=6)).strftime('%Y-%m-%dT%H:%M'),
+            'idempotency_key': ObjectId().binary.hex()
+        }
+
+    scenarios = [
+        ('GET /', 'GET', lambda i: ('/', None, None)),
+        ('GET /impact', 'GET', lambda i: ('/impact', None, None)),
+        ('GET /donor', 'GET', lambda i: ('/donor', None, None)),
+        ('POST /donor', 'POST', lambda i: ('/donor', donor_form(i), None)),
+        ('GET /admin/dashboard', 'GET', lambda i: ('/admin/dashboard', None, admin_session)),
+        ('GET /volunteer/dashboard', 'GET', lambda i: (
+            '/volunteer/dashboard', None,
+            {'volunteer_email': volunteer_email(_spread(i, volunteer_count))})),
+    ]
+    if pending:
+        scenarios.append(('GET /admin/assign-volunteer', 'GET', lambda i: (
+            f"/admin/assign-volunteer/{pending[i % len(pending)]}", None, admin_session)))
+    return scenarios
+
+
+def run_scenario(transport, method, build, requests, concurrency, warmup=0):
+    """Fire `requests` requests with `concurrency` threads; returns a summary dict"""
+    def one(i):
+        path, form, session = build(i)
+        return transport.request(method, path, form, session)
+
+    for i in range(warmup):
+        one(requests + i)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(requests)))
+    wall = time.perf_counter() - started
+
+    latencies = np.array([seconds for seconds, _ in results]) * 1000
+    errors = sum(1 for _, status in results if status is None or status >= 500)
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        'requests': requests,
+        'errors': errors,
+        'throughput_rps': round(requests / wall, 2) if wall else 0.0,
+        'mean_ms': round(float(latencies.mean()), 2),
+        'p50_ms': round(float(p50), 2),
+        'p95_ms': round(float(p95), 2),
+        'p99_ms': round(float(p99), 2),
+        'max_ms': round(float(latencies.max()), 2)
+    }
+
+
+def compare(baseline, current, threshold):
+    """Print p95/throughput changes per route; returns routes whose p95 regressed past threshold %"""
+    regressions = []
+    for name, result in current['routes'].items():
+        before = baseline.get('routes', {}).get(name)
+        if not before:
+            continue
+        p95_change = (result['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100 if before['p95_ms'] else 0.0
+        rps_change = ((result['throughput_rps'] - before['throughput_rps']) / before['throughput_rps'] * 100
+                      if before['throughput_rps'] else 0.0)
+        marker = '⚠️ ' if p95_change > threshold else '   '
+        print(f"{marker}{name:32} p95 {before['p95_ms']:8.1f} -> {result['p95_ms']:8.1f} ms ({p95_change:+.0f}%)  "
+              f"rps {rps_change:+.0f}%")
+        if p95_change > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def _use_mongomock():
+    try:
+        import mongomock
+    except ImportError:
+        raise SystemExit("❌ --mongomock needs the mongomock package (pip install mongomock)")
+    import pymongo
+
+    # Must happen before app.py creates its client
+    pymongo.MongoClient = mongomock.MongoClient
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Seed synthetic data and benchmark Annasamarpan routes')
+    subcommands = parser.add_subparsers(dest='command', required=True)
+
+    seed_parser = subcommands.add_parser('seed', help='bulk-load a synthetic dataset')
+    seed_parser.add_argument('--scale', type=int, default=10000, help='donors and donations to create')
+    seed_parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='documents per insert_many')
+    seed_parser.add_argument('--seed', type=int, default=42, help='random seed')
+    seed_parser.add_argument('--drop', action='store_true', help='drop the seeded collections first')
+
+    run_parser = subcommands.add_parser('run', help='drive the routes and record latency percentiles')
+    run_parser.add_argument('--url', help='benchmark a running server instead of the app in-process')
+    run_parser.add_argument('--mongomock', action='store_true', help='use an in-memory database (implies seeding)')
+    run_parser.add_argument('--scale', type=int, help='seed this many donors/donations before running')
+    run_parser.add_argument('--drop', action='store_true', help='with --scale, drop the seeded collections first')
+    run_parser.add_argument('--requests', type=int, default=200, help='requests per route')
+    run_parser.add_argument('--concurrency', type=int, default=8, help='concurrent clients')
+    run_parser.add_argument('--warmup', type=int, default=5, help='unmeasured requests per route')
+    run_parser.add_argument('--seed', type=int, default=42, help='random seed')
+    run_parser.add_argument('--output', default='benchmark_results.json', help='where to write the results')
+    run_parser.add_argument('--compare', help='earlier results to compare against')
+    run_parser.add_argument('--fail-threshold', type=float, default=20.0,
+                            help='exit 1 if any route p95 is this %% slower than --compare')
+    args = parser.parse_args()
+
+    if args.command == 'run' and args.mongomock:
+        if args.url:
+            parser.error('--mongomock benchmarks the app in-process; drop --url')
+        _use_mongomock()
+        if args.scale is None:
+            args.scale = 10000
+
+    from app import app, db
+
+    if args.command == 'seed' or args.scale:
+        scale = args.scale
+        print(f"🌱 Seeding {scale} donors/donations...")
+        started = time.perf_counter()
+        totals = seed(db, scale, chunk_size=getattr(args, 'chunk_size', CHUNK_SIZE),
+                      random_seed=args.seed, drop=args.drop)
+        elapsed = time.perf_counter() - started
+        inserted = sum(totals.values())
+        print(f"✅ Inserted {inserted} documents in {elapsed:.1f}s ({inserted / elapsed:.0f} docs/sec)")
+        for name, count in totals.items():
+            print(f"   {name}: {count}")
+        if args.command == 'seed':
+            return
+
+    transport = HTTPTransport(app, args.url) if args.url else InProcessTransport(app)
+    results = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'target': transport.name,
+        'database': 'mongomock' if args.mongomock else 'mongodb',
+        'python': platform.python_version(),
+        'concurrency': args.concurrency,
+        'dataset': {name: db[name].estimated_document_count() for name in SEEDED_COLLECTIONS},
+        'routes': {}
+    }
+
+    print(f"🚀 {args.requests} requests per route, concurrency {args.concurrency}, against {transport.name}")
+    for name, method, build in build_scenarios(db, args.requests + args.warmup):
+        result = run_scenario(transport, method, build, args.requests, args.concurrency, args.warmup)
+        results['routes'][name] = result
+        print(f"   {name:32} p50 {result['p50_ms']:7.1f}  p95 {result['p95_ms']:7.1f}  "
+              f"p99 {result['p99_ms']:7.1f} ms  {result['throughput_rps']:7.1f} req/s  "
+              f"{result['errors']} errors")
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"✅ Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"📊 Compared with {args.compare} ({baseline.get('created_at')}):")
+        regressions = compare(baseline, results, args.fail_threshold)
+        if regressions:
+            print(f"❌ p95 regressed more than {args.fail_threshold:.0f}% on: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Streaming bulk import/export for Annasamarpan
+Rows flow through a generator pipeline (read -> validate -> chunk) and are
+written with unordered bulk upserts keyed on email/phone, so memory stays
+constant no matter how large the file is. Exports stream straight from a
+cursor.
+
+Usage:
+    python bulk_io.py import recipients partner_ngo.csv
+    python bulk_io.py import donors roster.ndjson --chunk-size 2000
+    python bulk_io.py export donations donations.csv
+    python bulk_io.py export volunteers -  --format ndjson   # to stdout
+"""
+
+import argparse
+import csv
+import sys
+import time
+from datetime import datetime
+from itertools import islice
+
+from bson import json_util
+from pymongo import UpdateOne
+
+from expiry import parse_expiry
+from geo import make_point
+from pincodes import location_fields
+from search import SEARCH_FIELDS, add_search_terms, refresh_search_terms
+
+# Documents written per bulk_write call
+CHUNK_SIZE = 1000
+
+# Rejected rows reported individually before only counting them
+MAX_REPORTED_ERRORS = 10
+
+
+def _text(value):
+    return str(value).strip() if value is not None else ''
+
+
+def _int(value):
+    return int(float(value))
+
+
+def _float(value):
+    return float(value)
+
+
+def _datetime(value):
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value).strip())
+
+
+# Per collection: upsert key, field types, required fields and defaults
+ENTITIES = {
+    'donors': {
+        'key': 'email',
+        'fields': {'name': _text, 'email': _text, 'phone': _text, 'address': _text, 'city': _text,
+                   'state': _text, 'pincode': _text, 'created_at': _datetime},
+        'required': ['name', 'email'],
+        'defaults': {}
+    },
+    'volunteers': {
+        'key': 'email',
+        'fields': {'name': _text, 'email': _text, 'phone': _text, 'address': _text, 'city': _text,
+                   'state': _text, 'pincode': _text, 'latitude': _float, 'longitude': _float,
+                   'availability': _text, 'created_at': _datetime},
+        'required': ['name', 'email'],
+        'defaults': {'availability': 'available'}
+    },
+    'recipients': {
+        'key': 'phone',
+        'fields': {'name': _text, 'phone': _text, 'address': _text, 'city': _text, 'state': _text,
+                   'pincode': _text, 'family_size': _int, 'verification_status': _text,
+                   'created_at': _datetime},
+        'required': ['name', 'phone'],
+        'defaults': {'verification_status': 'verified'}
+    },
+    'donations': {
+        'key': None,
+        'fields': {'donor_email': _text, 'food_type': _text, 'quantity': _text, 'description': _text,
+                   'pickup_address': _text, 'expiry_date': _text, 'status': _text,
+                   'created_at': _datetime},
+        'required': ['donor_email', 'food_type', 'quantity'],
+        'defaults': {'status': 'pending'}
+    }
+}
+
+
+class RowError(ValueError):
+    pass
+
+
+def detect_format(path, explicit=None):
+    if explicit:
+        return explicit
+    return 'ndjson' if path.endswith(('.ndjson', '.jsonl', '.json')) else 'csv'
+
+
+def read_rows(stream, fmt):
+    """Yield (line_number, row_dict) from a CSV or NDJSON stream"""
+    if fmt == 'csv':
+        for line_number, row in enumerate(csv.DictReader(stream), start=2):
+            yield line_number, row
+    else:
+        for line_number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if line:
+                yield line_number, json_util.loads(line)
+
+
+def validate_row(row, entity, defaults=True):
+    """Coerce a raw row into a document, raising RowError on bad data
+
+    With defaults=False the document holds only the row's own columns (and
+    what is derived from them), for upserts that must not reset the fields a
+    row leaves out.
+    """
+    spec = ENTITIES[entity]
+    document = dict(spec['defaults']) if defaults else {}
+    for field, convert in spec['fields'].items():
+        value = row.get(field)
+        if value is None or value == '':
+            continue
+        try:
+            document[field] = convert(value)
+        except (TypeError, ValueError) as e:
+            raise RowError(f"invalid {field} {value!r}: {e}")
+
+    missing = [field for field in spec['required'] if not document.get(field)]
+    if missing:
+        raise RowError(f"missing {', '.join(missing)}")
+
+    if entity in ('donors', 'volunteers', 'recipients'):
+        point = make_point(document.get('latitude'), document.get('longitude'))
+        if point:
+            document['location'] = point
+        elif document.get('pincode'):
+            document.update(location_fields(document['pincode']))
+    elif entity == 'donations':
+        document['expiry_date'] = parse_expiry(document.get('expiry_date'), document.get('food_type'),
+                                               document.get('created_at'))
+    return add_search_terms(entity, document)
+
+
+def validated(rows, entity, stats):
+    """Generator stage: drop (and count) rows that fail validation"""
+    for line_number, row in rows:
+        stats['read'] += 1
+        try:
+            yield validate_row(row, entity, defaults=False)
+        except RowError as e:
+            stats['rejected'] += 1
+            if stats['rejected'] <= MAX_REPORTED_ERRORS:
+                print(f"❌ line {line_number}: {e}", file=sys.stderr)
+
+
+def chunked(iterable, size):
+    """Generator stage: lists of at most `size` items"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def write_chunk(collection, documents, key, defaults=None):
+    """Upsert (or insert, for unkeyed collections) one chunk; returns docs written
+
+    Upserts $set only the columns a row supplied. The `defaults` apply to new
+    records alone, so re-importing a roster does not reset, say, a volunteer's
+    availability. Rows that leave out a search field get their search_terms
+    recomputed from the stored record afterwards.
+    """
+    defaults = defaults or {}
+    if key is None:
+        now = datetime.now()
+        for document in documents:
+            for field, value in defaults.items():
+                document.setdefault(field, value)
+            document.setdefault('created_at', now)
+            document['updated_at'] = now
+        return len(collection.insert_many(documents, ordered=False).inserted_ids)
+
+    # Last row wins when a key repeats within the chunk
+    documents = {document[key]: document for document in documents}.values()
+
+    search_fields = SEARCH_FIELDS[collection.name][0]
+    now = datetime.now()
+    operations = []
+    partial = []
+    for document in documents:
+        created_at = document.pop('created_at', now)
+        if not all(field in document for field in search_fields):
+            # Terms from the supplied columns alone would drop the stored ones
+            document.pop('search_terms', None)
+            partial.append(document[key])
+        on_insert = {field: value for field, value in defaults.items() if field not in document}
+        operations.append(UpdateOne(
+            {key: document[key]},
+            {'$set': document, '$setOnInsert': dict(on_insert, created_at=created_at)},
+            upsert=True
+        ))
+    result = collection.bulk_write(operations, ordered=False)
+    if partial:
+        refresh_search_terms(collection, collection.name, {key: {'$in': partial}})
+    return result.upserted_count + result.matched_count
+
+
+def import_stream(db, entity, stream, fmt, chunk_size=CHUNK_SIZE):
+    """Stream rows into a collection; returns a stats dict"""
+    stats = {'read': 0, 'rejected': 0, 'written': 0}
+    started = time.perf_counter()
+
+    documents = validated(read_rows(stream, fmt), entity, stats)
+    for chunk in chunked(documents, chunk_size):
+        stats['written'] += write_chunk(db[entity], chunk, ENTITIES[entity]['key'], ENTITIES[entity]['defaults'])
+
+    stats['elapsed_seconds'] = time.perf_counter() - started
+    stats['rows_per_second'] = stats['read'] / stats['elapsed_seconds'] if stats['elapsed_seconds'] else 0.0
+    return stats
+
+
+def export_stream(db, entity, stream, fmt, batch_size=CHUNK_SIZE):
+    """Stream a collection to CSV or NDJSON straight from a cursor; returns rows written"""
+    fields = list(ENTITIES[entity]['fields'])
+    cursor = db[entity].find({}, batch_size=batch_size)
+
+    written = 0
+    if fmt == 'csv':
+        writer = csv.DictWriter(stream, fieldnames=['_id'] + fields, extrasaction='ignore')
+        writer.writeheader()
+        for document in cursor:
+            document['_id'] = str(document['_id'])
+            for field, value in document.items():
+                if isinstance(value, datetime):
+                    document[field] = value.isoformat()
+            writer.writerow(document)
+            written += 1
+    else:
+        for document in cursor:
+            stream.write(json_util.dumps(document, json_options=json_util.RELAXED_JSON_OPTIONS))
+            stream.write('\n')
+            written += 1
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk import/export Annasamarpan data')
+    parser.add_argument('command', choices=['import', 'export'])
+    parser.add_argument('collection', choices=sorted(ENTITIES))
+    parser.add_argument('path', help="file path, or '-' for stdin/stdout")
+    parser.add_argument('--format', choices=['csv', 'ndjson'], help='defaults to the file extension')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='documents per bulk write')
+    parser.add_argument('--no-reconcile', action='store_true',
+                        help='skip rebuilding impact counters after an import')
+    args = parser.parse_args()
+
+    from app import analytics_db, db
+    import counters
+
+    fmt = detect_format(args.path, args.format)
+
+    if args.command == 'import':
+        stream = sys.stdin if args.path == '-' else open(args.path, newline='', encoding='utf-8')
+        with stream:
+            print(f"📥 Importing {args.collection} from {args.path} ({fmt})...", file=sys.stderr)
+            stats = import_stream(db, args.collection, stream, fmt, args.chunk_size)
+        print(f"✅ {stats['written']} written, {stats['rejected']} rejected of {stats['read']} rows "
+              f"in {stats['elapsed_seconds']:.1f}s ({stats['rows_per_second']:.0f} rows/sec)", file=sys.stderr)
+        if not args.no_reconcile:
+            counters.reconcile(db)
+            print("✅ Impact counters rebuilt", file=sys.stderr)
+    else:
+        stream = sys.stdout if args.path == '-' else open(args.path, 'w', newline='', encoding='utf-8')
+        started = time.perf_counter()
+        with stream:
+            # Exports read from a secondary when the database is a replica set
+            written = export_stream(analytics_db, args.collection, stream, fmt, args.chunk_size)
+        elapsed = time.perf_counter() - started
+        rate = written / elapsed if elapsed else 0.0
+        print(f"✅ Exported {written} {args.collection} in {elapsed:.1f}s ({rate:.0f} rows/sec)", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Volunteer claiming for Annasamarpan
+Each volunteer carries an `active_assignments` counter. A claim is a single
+find_one_and_update that only matches an available volunteer below capacity
+and increments the counter in the same operation, so concurrent admins and
+dispatch runs can never book a volunteer past their capacity. Completing an
+assignment releases one slot.
+"""
+
+import os
+
+from pymongo import ReturnDocument, UpdateMany, UpdateOne
+
+# Active assignments a volunteer may hold unless their document sets `capacity`
+VOLUNTEER_CAPACITY = int(os.environ.get('VOLUNTEER_CAPACITY', 3))
+
+
+def spare_capacity_filter(slots=1, default_capacity=VOLUNTEER_CAPACITY):
+    """Match available volunteers with room for `slots` more assignments"""
+    return {
+        'availability': 'available',
+        '$expr': {'$lte': [
+            {'$add': [{'$ifNull': ['$active_assignments', 0]}, slots]},
+            {'$ifNull': ['$capacity', default_capacity]}
+        ]}
+    }
+
+
+def remaining_capacity(volunteer, default_capacity=VOLUNTEER_CAPACITY):
+    return max(volunteer.get('capacity', default_capacity) - volunteer.get('active_assignments', 0), 0)
+
+
+def claim_volunteer(volunteers_collection, query=None, slots=1, default_capacity=VOLUNTEER_CAPACITY):
+    """Atomically take `slots` assignments from the least-loaded volunteer matching `query` with room
+
+    Returns the updated volunteer document, or None if every match is
+    unavailable or full.
+    """
+    query = dict(query or {}, **spare_capacity_filter(slots, default_capacity))
+    return volunteers_collection.find_one_and_update(
+        query,
+        {'$inc': {'active_assignments': slots}},
+        sort=[('active_assignments', 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def release_volunteer(volunteers_collection, email, slots=1):
+    """Give back claimed slots (on completion, or when the donation was taken meanwhile)"""
+    volunteers_collection.update_one(
+        {'email': email, 'active_assignments': {'$gte': slots}},
+        {'$inc': {'active_assignments': -slots}}
+    )
+
+
+def recount_active_assignments(db):
+    """Rebuild every volunteer's counter from the open assignments; returns volunteers changed"""
+    active = {row['_id']: row['count'] for row in db.assignments.aggregate([
+        {'$match': {'status': 'assigned'}},
+        {'$group': {'_id': '$volunteer_email', 'count': {'$sum': 1}}}
+    ])}
+    operations = [UpdateOne({'email': email}, {'$set': {'active_assignments': count}})
+                  for email, count in active.items()]
+    operations.append(UpdateMany(
+        {'email': {'$nin': list(active)}, 'active_assignments': {'$ne': 0}},
+        {'$set': {'active_assignments': 0}}
+    ))
+    return db.volunteers.bulk_write(operations, ordered=False).modified_count
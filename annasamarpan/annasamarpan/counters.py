@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Materialized impact counters for Annasamarpan
+Totals are kept in a small `counters` collection and updated with $inc on every
+write path, so the home, impact and admin pages read a couple of documents
+instead of running count_documents over the raw collections.
+
+Usage:
+    python counters.py    # rebuild all counters from the raw collections
+"""
+
+import os
+import threading
+import time
+from datetime import datetime
+
+from pymongo import UpdateOne
+
+from archive import archive_names, count_with_history
+
+TOTALS_ID = 'totals'
+
+# Fields held on the totals document
+TOTAL_FIELDS = (
+    'total_donations',
+    'pending_donations',
+    'total_volunteers',
+    'total_recipients',
+    'completed_deliveries',
+    'expired_donations'
+)
+
+# Seconds a stats snapshot is served from memory before re-reading
+STATS_CACHE_TTL = float(os.environ.get('STATS_CACHE_TTL', 5))
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def month_id(when=None):
+    """Counter document id for the month containing `when`"""
+    when = when or datetime.now()
+    return f"month:{when.strftime('%Y-%m')}"
+
+
+def increment(counters_collection, when=None, monthly=None, session=None, **totals):
+    """Atomically apply deltas to the totals and (optionally) a monthly bucket"""
+    operations = []
+    totals = {field: delta for field, delta in totals.items() if delta}
+    if totals:
+        operations.append(UpdateOne({'_id': TOTALS_ID}, {'$inc': totals}, upsert=True))
+
+    monthly = {field: delta for field, delta in (monthly or {}).items() if delta}
+    if monthly:
+        operations.append(UpdateOne({'_id': month_id(when)}, {'$inc': monthly}, upsert=True))
+
+    # Both documents in one round trip
+    if operations:
+        counters_collection.bulk_write(operations, ordered=False, session=session)
+    invalidate()
+
+
+def invalidate():
+    """Drop cached snapshots so the next read sees fresh counters"""
+    with _cache_lock:
+        _cache.clear()
+
+
+def get_stats(counters_collection, ttl=STATS_CACHE_TTL):
+    """Totals plus current-month figures, served from a short-TTL cache"""
+    current = month_id()
+    now = time.monotonic()
+    with _cache_lock:
+        cached = _cache.get(current)
+        if cached and cached[0] > now:
+            return dict(cached[1])
+
+    documents = {doc['_id']: doc for doc in counters_collection.find({'_id': {'$in': [TOTALS_ID, current]}})}
+    totals = documents.get(TOTALS_ID, {})
+    month = documents.get(current, {})
+
+    stats = {field: max(totals.get(field, 0), 0) for field in TOTAL_FIELDS}
+    stats['monthly_donations'] = month.get('donations', 0)
+    stats['monthly_deliveries'] = month.get('deliveries', 0)
+
+    with _cache_lock:
+        _cache[current] = (now + ttl, stats)
+    return dict(stats)
+
+
+def reconcile(db):
+    """Rebuild every counter document from the raw collections and their archives"""
+    totals = {
+        'total_donations': count_with_history(db, 'donations', {}),
+        'pending_donations': db.donations.count_documents({'status': 'pending'}),
+        'total_volunteers': db.volunteers.count_documents({}),
+        'total_recipients': db.recipients.count_documents({}),
+        'completed_deliveries': count_with_history(db, 'assignments', {'status': 'completed'}),
+        'expired_donations': count_with_history(db, 'donations', {'status': 'expired'})
+    }
+
+    months = {}
+    for name in ['donations'] + archive_names(db, 'donations'):
+        for row in db[name].aggregate([
+            {'$match': {'created_at': {'$type': 'date'}}},
+            {'$group': {'_id': {'$dateToString': {'format': '%Y-%m', 'date': '$created_at'}}, 'count': {'$sum': 1}}}
+        ]):
+            month = months.setdefault(row['_id'], {})
+            month['donations'] = month.get('donations', 0) + row['count']
+    for name in ['assignments'] + archive_names(db, 'assignments'):
+        for row in db[name].aggregate([
+            {'$match': {'status': 'completed', 'assigned_at': {'$type': 'date'}}},
+            {'$group': {'_id': {'$dateToString': {'format': '%Y-%m', 'date': '$assigned_at'}}, 'count': {'$sum': 1}}}
+        ]):
+            month = months.setdefault(row['_id'], {})
+            month['deliveries'] = month.get('deliveries', 0) + row['count']
+
+    db.counters.replace_one({'_id': TOTALS_ID}, totals, upsert=True)
+    db.counters.delete_many({'_id': {'$regex': '^month:'}})
+    for month, values in months.items():
+        db.counters.replace_one(
+            {'_id': f'month:{month}'},
+            {'donations': values.get('donations', 0), 'deliveries': values.get('deliveries', 0)},
+            upsert=True
+        )
+
+    invalidate()
+    return totals, months
+
+
+if __name__ == '__main__':
+    from app import db
+
+    print("🔄 Rebuilding impact counters...")
+    totals, months = reconcile(db)
+    for field in TOTAL_FIELDS:
+        print(f"   {field}: {totals[field]}")
+    print(f"✅ Counters rebuilt ({len(months)} monthly buckets)")
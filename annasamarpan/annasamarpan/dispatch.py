@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Batch auto-dispatch for Annasamarpan
+Matches every pending donation to an available volunteer in one pass by
+solving a capacity-aware min-cost assignment over a Haversine distance matrix.
+
+Usage:
+    python dispatch.py [--capacity 3] [--max-distance 25] [--dry-run]
+"""
+
+import argparse
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+from bson.objectid import ObjectId
+from pymongo import InsertOne, UpdateOne
+from scipy.optimize import linear_sum_assignment
+
+import claims
+import counters
+import expiry
+from geo import distance_matrix, point_coordinates
+
+# Donations a volunteer may receive in a single dispatch run (never more than
+# their remaining capacity, see claims.py)
+DISPATCH_CAPACITY = int(os.environ.get('DISPATCH_CAPACITY', 3))
+
+# Pairs further apart than this (km) are never matched
+DISPATCH_MAX_DISTANCE_KM = float(os.environ.get('DISPATCH_MAX_DISTANCE_KM', 25))
+
+# Only the nearest volunteers of each donation are kept as candidates, which
+# keeps the cost matrix small when the volunteer pool is large
+DISPATCH_CANDIDATES = int(os.environ.get('DISPATCH_CANDIDATES', 20))
+
+# Donations expiring within this many hours outrank nearer, less urgent ones
+# when there are more donations than volunteer slots
+DISPATCH_URGENCY_HOURS = float(os.environ.get('DISPATCH_URGENCY_HOURS', 48))
+
+# Cost used for pairs that must not be matched
+INFEASIBLE_COST = 1e9
+
+
+def load_pending(db):
+    """Pending donations (soonest expiry first) with pickup coordinates, plus those that have none"""
+    donations = list(db.donations.find({'status': 'pending'}).sort('expiry_date', 1))
+
+    # Donor locations in one round trip for donations without their own point
+    missing = {d['donor_email'] for d in donations if not d.get('location')}
+    donor_locations = {}
+    if missing:
+        for donor in db.donors.find({'email': {'$in': list(missing)}, 'location': {'$exists': True}},
+                                    {'email': 1, 'location': 1}):
+            donor_locations[donor['email']] = donor['location']
+
+    located = []
+    unlocated = []
+    for donation in donations:
+        point = donation.get('location') or donor_locations.get(donation['donor_email'])
+        if point:
+            located.append((donation, point))
+        else:
+            unlocated.append(donation)
+    return located, unlocated
+
+
+def urgency(donations, now=None, horizon_hours=DISPATCH_URGENCY_HOURS):
+    """0..1 per donation: 1 when expiring now, 0 at or beyond the horizon"""
+    now = now or datetime.now()
+    hours_left = np.array([
+        (d['expiry_date'] - now).total_seconds() / 3600 if isinstance(d.get('expiry_date'), datetime)
+        else horizon_hours
+        for d in donations
+    ], dtype=float)
+    return np.clip(1 - hours_left / horizon_hours, 0, 1)
+
+
+def solve_assignment(distances, capacities, max_distance_km=DISPATCH_MAX_DISTANCE_KM, priorities=None):
+    """Min-cost assignment of rows (donations) to columns (volunteers)
+
+    Each volunteer column is repeated `capacity` times so a volunteer can take
+    several donations. `priorities` (0..1 per row) lowers the cost of urgent
+    rows, so when there are fewer slots than donations the urgent ones are
+    matched first; when every row can be matched it does not change the result.
+    Returns a list of (row, column, distance_km) tuples.
+    """
+    if distances.size == 0:
+        return []
+
+    columns = np.repeat(np.arange(distances.shape[1]), capacities)
+    if columns.size == 0:
+        return []
+
+    cost = distances[:, columns]
+    feasible = cost <= max_distance_km
+    if priorities is not None:
+        # Worth up to two maximum-length trips, so urgency dominates distance
+        cost = cost - (2 * max_distance_km * priorities)[:, None]
+    cost = np.where(feasible, cost, INFEASIBLE_COST)
+    rows, slots = linear_sum_assignment(cost)
+
+    matches = []
+    for row, slot in zip(rows, slots):
+        if feasible[row, slot]:
+            column = columns[slot]
+            matches.append((int(row), int(column), float(distances[row, column])))
+    return matches
+
+
+def plan_dispatch(located, volunteers, capacity=DISPATCH_CAPACITY,
+                  max_distance_km=DISPATCH_MAX_DISTANCE_KM, candidates=DISPATCH_CANDIDATES):
+    """Compute (donation, volunteer, distance_km) matches without writing anything"""
+    if not located or not volunteers:
+        return []
+
+    donation_coords = np.array([point_coordinates(point) for _, point in located], dtype=float)
+    volunteer_coords = np.array([point_coordinates(v['location']) for v in volunteers], dtype=float)
+    distances = distance_matrix(donation_coords[:, 0], donation_coords[:, 1],
+                                volunteer_coords[:, 0], volunteer_coords[:, 1])
+
+    # Keep only volunteers that are among the nearest candidates of some donation
+    if distances.shape[1] > candidates:
+        nearest = np.argpartition(distances, candidates - 1, axis=1)[:, :candidates]
+        keep = np.unique(nearest)
+        distances = distances[:, keep]
+        volunteers = [volunteers[i] for i in keep]
+
+    capacities = np.array([min(capacity, claims.remaining_capacity(v)) for v in volunteers])
+    priorities = urgency([donation for donation, _ in located])
+    matches = solve_assignment(distances, capacities, max_distance_km, priorities)
+    return [(located[row][0], volunteers[column], distance) for row, column, distance in matches]
+
+
+def commit_dispatch(db, matches):
+    """Claim volunteers, take the donations and write the assignments; returns the matches committed
+
+    The plan was computed from a snapshot, so concurrent admins or dispatch
+    runs may have claimed a volunteer's slots or taken a donation since.
+    Volunteers are claimed atomically (one update per volunteer), donations are
+    only taken while still pending, and slots for donations lost to someone
+    else are released again.
+    """
+    if not matches:
+        return []
+
+    by_volunteer = {}
+    for match in matches:
+        by_volunteer.setdefault(match[1]['email'], []).append(match)
+
+    claimed = []
+    for email, volunteer_matches in by_volunteer.items():
+        if claims.claim_volunteer(db.volunteers, {'email': email}, slots=len(volunteer_matches)):
+            claimed.extend(volunteer_matches)
+    if not claimed:
+        return []
+
+    now = datetime.now()
+    run_id = ObjectId()
+    db.donations.bulk_write([
+        UpdateOne(
+            {'_id': donation['_id'], 'status': 'pending'},
+            {'$set': {'status': 'assigned', 'assigned_volunteer': volunteer['email'],
+                      'dispatch_run': run_id, 'updated_at': now}}
+        )
+        for donation, volunteer, _ in claimed
+    ], ordered=False)
+    ids = [donation['_id'] for donation, _, _ in claimed]
+    taken = {d['_id'] for d in db.donations.find({'_id': {'$in': ids}, 'dispatch_run': run_id}, {'_id': 1})}
+    committed = [match for match in claimed if match[0]['_id'] in taken]
+
+    # Release the slots of donations that were assigned elsewhere meanwhile
+    lost = {}
+    for donation, volunteer, _ in claimed:
+        if donation['_id'] not in taken:
+            lost[volunteer['email']] = lost.get(volunteer['email'], 0) + 1
+    for email, slots in lost.items():
+        claims.release_volunteer(db.volunteers, email, slots)
+
+    if committed:
+        db.assignments.bulk_write([
+            InsertOne({
+                'donation_id': donation['_id'],
+                'volunteer_email': volunteer['email'],
+                'status': 'assigned',
+                'assigned_at': now,
+                'distance_km': round(distance, 2)
+            })
+            for donation, volunteer, distance in committed
+        ], ordered=False)
+        counters.increment(db.counters, pending_donations=-len(committed))
+    return committed
+
+
+def batch_dispatch(db, capacity=DISPATCH_CAPACITY, max_distance_km=DISPATCH_MAX_DISTANCE_KM,
+                   dry_run=False, notify=None):
+    """Match all pending donations to available volunteers and report the result"""
+    started = time.perf_counter()
+
+    # Expired donations leave the pending set before planning
+    expired = 0 if dry_run else expiry.sweep(db)
+    located, unlocated = load_pending(db)
+    volunteers = list(db.volunteers.find(
+        {'availability': 'available', 'location': {'$exists': True}},
+        {'name': 1, 'email': 1, 'location': 1, 'capacity': 1, 'active_assignments': 1}
+    ))
+
+    matches = plan_dispatch(located, volunteers, capacity, max_distance_km)
+    if not dry_run:
+        matches = commit_dispatch(db, matches)
+        if notify:
+            for donation, volunteer, _ in matches:
+                notify(volunteer['email'], donation)
+
+    elapsed = time.perf_counter() - started
+    pending = len(located) + len(unlocated)
+    return {
+        'pending': pending,
+        'assigned': len(matches),
+        'unassigned': pending - len(matches),
+        'without_location': len(unlocated),
+        'expired': expired,
+        'volunteers': len(volunteers),
+        'total_distance_km': round(sum(distance for _, _, distance in matches), 2),
+        'elapsed_seconds': round(elapsed, 3),
+        'donations_per_second': round(pending / elapsed, 1) if elapsed > 0 else 0.0,
+        'dry_run': dry_run
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Assign all pending donations to volunteers')
+    parser.add_argument('--capacity', type=int, default=DISPATCH_CAPACITY,
+                        help='donations per volunteer in this run')
+    parser.add_argument('--max-distance', type=float, default=DISPATCH_MAX_DISTANCE_KM,
+                        help='maximum pickup distance in km')
+    parser.add_argument('--dry-run', action='store_true', help='plan without writing')
+    args = parser.parse_args()
+
+    from app import db, send_volunteer_notification
+
+    print("🚚 Dispatching pending donations...")
+    report = batch_dispatch(db, args.capacity, args.max_distance, args.dry_run,
+                            notify=send_volunteer_notification)
+
+    print(f"✅ Assigned {report['assigned']} of {report['pending']} pending donations "
+          f"to {report['volunteers']} available volunteers")
+    print(f"   Unassigned: {report['unassigned']} ({report['without_location']} without pickup coordinates)")
+    print(f"   Expired before dispatch: {report['expired']}")
+    print(f"   Total travel distance: {report['total_distance_km']} km")
+    print(f"   Throughput: {report['donations_per_second']} donations/sec "
+          f"in {report['elapsed_seconds']}s")
+    if report['dry_run']:
+        print("ℹ️  Dry run - nothing was written")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Expiry handling for Annasamarpan donations
+`expiry_date` is stored as a datetime and indexed with status, so the pending
+donations that expire soonest come first straight from the index. The sweeper
+marks pending donations whose expiry has passed as `expired`, which takes them
+out of the pending set that dispatch and the admin dashboard work from.
+
+Usage:
+    python expiry.py             # mark expired donations once
+    python expiry.py --watch 60  # keep sweeping every minute
+"""
+
+import argparse
+import os
+import time
+from datetime import datetime, timedelta
+
+import counters
+
+# Assumed shelf life when a donor leaves the expiry blank
+SHELF_LIFE = {
+    'cooked_meals': timedelta(hours=4),
+    'dairy_products': timedelta(days=1),
+    'bakery_items': timedelta(days=2),
+    'fruits': timedelta(days=3),
+    'raw_vegetables': timedelta(days=3),
+    'packaged_food': timedelta(days=90),
+    'grains_rice': timedelta(days=180),
+}
+DEFAULT_SHELF_LIFE = timedelta(days=1)
+
+# Seconds between sweeps in --watch mode
+EXPIRY_SWEEP_INTERVAL = float(os.environ.get('EXPIRY_SWEEP_INTERVAL', 60))
+
+
+def parse_expiry(value, food_type=None, base=None):
+    """Expiry as a datetime from a form/import value
+
+    Accepts datetimes, 'YYYY-MM-DDTHH:MM' (good until that moment) and
+    'YYYY-MM-DD' (good until the end of that day). Blank or unreadable values
+    fall back to the food type's shelf life from `base` (default: now).
+    """
+    if isinstance(value, datetime):
+        return value
+    text = str(value).strip() if value is not None else ''
+    if text:
+        try:
+            if len(text) == 10:
+                return datetime.strptime(text, '%Y-%m-%d') + timedelta(days=1, microseconds=-1)
+            return datetime.fromisoformat(text)
+        except ValueError:
+            pass
+    return (base or datetime.now()) + SHELF_LIFE.get(food_type, DEFAULT_SHELF_LIFE)
+
+
+def pending_queue(donations_collection, limit=10, now=None, projection=None):
+    """Pending, unexpired donations, soonest expiry first (served by the status+expiry index)"""
+    now = now or datetime.now()
+    return list(donations_collection.find(
+        {'status': 'pending', 'expiry_date': {'$gte': now}}, projection
+    ).sort('expiry_date', 1).limit(limit))
+
+
+def sweep(db, now=None):
+    """Mark pending donations past their expiry as expired; returns how many"""
+    now = now or datetime.now()
+    result = db.donations.update_many(
+        {'status': 'pending', 'expiry_date': {'$lt': now}},
+        {'$set': {'status': 'expired', 'expired_at': now, 'updated_at': now}}
+    )
+    if result.modified_count:
+        counters.increment(db.counters, pending_donations=-result.modified_count,
+                           expired_donations=result.modified_count)
+    return result.modified_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mark expired pending donations')
+    parser.add_argument('--watch', type=float, nargs='?', const=EXPIRY_SWEEP_INTERVAL, metavar='SECONDS',
+                        help=f'keep sweeping (default every {EXPIRY_SWEEP_INTERVAL:.0f}s)')
+    args = parser.parse_args()
+
+    from app import db
+
+    while True:
+        expired = sweep(db)
+        if expired or not args.watch:
+            print(f"✅ Marked {expired} donations as expired")
+        if not args.watch:
+            break
+        time.sleep(args.watch)
+
+
+if __name__ == '__main__':
+    main()
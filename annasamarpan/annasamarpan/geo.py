@@ -0,0 +1,181 @@
+"""
+Geospatial helpers for Annasamarpan
+Volunteer locations are stored as GeoJSON points with a 2dsphere index so the
+nearest available volunteers can be found without scanning the collection.
+"""
+
+import math
+
+import numpy as np
+from pymongo.errors import OperationFailure
+
+EARTH_RADIUS_KM = 6371
+
+# Grid cell size (in degrees) used by the in-process fallback index
+GRID_CELL_DEGREES = 0.1
+
+
+def make_point(latitude, longitude):
+    """Build a GeoJSON point, or None when the coordinates are missing"""
+    if latitude is None or longitude is None:
+        return None
+    latitude = float(latitude)
+    longitude = float(longitude)
+    # The registration form defaults both fields to 0 when left empty
+    if latitude == 0 and longitude == 0:
+        return None
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None
+    return {'type': 'Point', 'coordinates': [longitude, latitude]}
+
+
+def point_coordinates(point):
+    """Return (latitude, longitude) for a GeoJSON point"""
+    longitude, latitude = point['coordinates']
+    return latitude, longitude
+
+
+def haversine_km(lat, lon, lats, lons):
+    """Vectorized Haversine distance from one point to arrays of points"""
+    lat = np.radians(lat)
+    lon = np.radians(lon)
+    lats = np.radians(np.asarray(lats, dtype=float))
+    lons = np.radians(np.asarray(lons, dtype=float))
+
+    a = (np.sin((lats - lat) / 2) ** 2 +
+         np.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def distance_matrix(lats1, lons1, lats2, lons2):
+    """Pairwise Haversine distances (km) between two sets of points"""
+    lats1 = np.asarray(lats1, dtype=float)[:, None]
+    lons1 = np.asarray(lons1, dtype=float)[:, None]
+    return haversine_km(lats1, lons1, np.asarray(lats2, dtype=float)[None, :],
+                        np.asarray(lons2, dtype=float)[None, :])
+
+
+def backfill_volunteer_locations(volunteers_collection):
+    """Add GeoJSON locations to volunteers registered with plain lat/long fields"""
+    updated = 0
+    cursor = volunteers_collection.find(
+        {'location': {'$exists': False}},
+        {'latitude': 1, 'longitude': 1}
+    )
+    for volunteer in cursor:
+        point = make_point(volunteer.get('latitude'), volunteer.get('longitude'))
+        if point:
+            volunteers_collection.update_one({'_id': volunteer['_id']}, {'$set': {'location': point}})
+            updated += 1
+    return updated
+
+
+class VolunteerGrid:
+    """In-process grid index over volunteer coordinates
+
+    Used when the database cannot answer $nearSphere queries (no 2dsphere
+    index yet, or an in-memory test database).
+    """
+
+    def __init__(self, volunteers, cell_degrees=GRID_CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        self.volunteers = []
+        self.cells = {}
+        lats = []
+        lons = []
+        for volunteer in volunteers:
+            point = volunteer.get('location')
+            if not point:
+                continue
+            lat, lon = point_coordinates(point)
+            self.cells.setdefault(self._cell(lat, lon), []).append(len(self.volunteers))
+            self.volunteers.append(volunteer)
+            lats.append(lat)
+            lons.append(lon)
+        self.lats = np.array(lats, dtype=float)
+        self.lons = np.array(lons, dtype=float)
+
+    def _cell(self, lat, lon):
+        return (math.floor(lat / self.cell_degrees), math.floor(lon / self.cell_degrees))
+
+    def _ring(self, center, radius):
+        """Indexes of volunteers in cells exactly `radius` cells away from center"""
+        row, col = center
+        found = []
+        for r in range(row - radius, row + radius + 1):
+            for c in range(col - radius, col + radius + 1):
+                if max(abs(r - row), abs(c - col)) == radius:
+                    found.extend(self.cells.get((r, c), ()))
+        return found
+
+    def nearest(self, lat, lon, k, max_distance_km=None):
+        """Return up to k (volunteer, distance_km) pairs ordered by distance"""
+        if not self.volunteers:
+            return []
+
+        # A cell is at least this many km across in latitude; longitude cells
+        # shrink towards the poles, which only makes the bound more conservative
+        cell_km = self.cell_degrees * 111.0 * max(math.cos(math.radians(abs(lat) + self.cell_degrees)), 0.01)
+        center = self._cell(lat, lon)
+
+        candidates = []
+        radius = 0
+        while True:
+            # Once the rings cover more cells than are occupied, scanning every
+            # volunteer directly is cheaper than walking empty cells
+            if (2 * radius + 1) ** 2 > 4 * len(self.cells):
+                candidates = list(range(len(self.volunteers)))
+                break
+            candidates.extend(self._ring(center, radius))
+            # Anything outside the rings searched so far is at least this far away
+            covered_km = radius * cell_km
+            if len(candidates) >= k:
+                distances = haversine_km(lat, lon, self.lats[candidates], self.lons[candidates])
+                if np.sort(distances)[k - 1] <= covered_km:
+                    break
+            if max_distance_km is not None and covered_km > max_distance_km:
+                break
+            if len(candidates) == len(self.volunteers):
+                break
+            radius += 1
+
+        if not candidates:
+            return []
+        distances = haversine_km(lat, lon, self.lats[candidates], self.lons[candidates])
+        order = np.argsort(distances, kind='stable')
+        results = []
+        for i in order[:k]:
+            distance = float(distances[i])
+            if max_distance_km is not None and distance > max_distance_km:
+                break
+            results.append((self.volunteers[candidates[i]], distance))
+        return results
+
+
+def find_nearest_volunteers(volunteers_collection, latitude, longitude, k=5,
+                            max_distance_km=None, query=None):
+    """Find the k nearest volunteers matching `query`, ranked by Haversine distance"""
+    query = dict(query or {})
+    point = {'type': 'Point', 'coordinates': [float(longitude), float(latitude)]}
+
+    near = {'$geometry': point}
+    if max_distance_km is not None:
+        near['$maxDistance'] = max_distance_km * 1000
+
+    try:
+        volunteers = list(volunteers_collection.find(
+            dict(query, location={'$nearSphere': near})
+        ).limit(k))
+    except (OperationFailure, NotImplementedError):
+        # No 2dsphere index (or a backend without geo support): use the grid
+        candidates = volunteers_collection.find(dict(query, location={'$exists': True}))
+        return VolunteerGrid(candidates).nearest(latitude, longitude, k, max_distance_km)
+
+    if not volunteers:
+        return []
+
+    # Re-rank the candidates in one vectorized pass so callers get distances
+    coordinates = np.array([point_coordinates(v['location']) for v in volunteers], dtype=float)
+    distances = haversine_km(latitude, longitude, coordinates[:, 0], coordinates[:, 1])
+    order = np.argsort(distances, kind='stable')
+    return [(volunteers[i], float(distances[i])) for i in order]
@@ -0,0 +1,81 @@
+"""
+Gunicorn configuration for Annasamarpan
+All settings can be overridden with environment variables.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+
+# gevent, gthread or sync. Live dashboard streams (/api/v1/events) stay open
+# for as long as a dashboard does, so they are only served by gevent workers;
+# under gthread or sync they answer 503 and the dashboards poll instead
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gevent')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+# Connections per gevent worker, open event streams included (see LIVE_MAX_SUBSCRIBERS)
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+
+if worker_class == 'gevent':
+    # Patch before on_starting imports the app (and with it pymongo and ssl)
+    from gevent import monkey
+
+    monkey.patch_all()
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+# Recycle workers periodically to bound memory growth
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 100))
+
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'false').lower() == 'true'
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+errorlog = os.environ.get('GUNICORN_ERROR_LOG', '-')
+
+# Run the outbox email workers inside each web worker (otherwise run `python outbox.py`)
+OUTBOX_INPROCESS = os.environ.get('OUTBOX_INPROCESS', 'false').lower() == 'true'
+
+
+def on_starting(server):
+    """Create indexes once in the master, then drop its client before forking"""
+    # Metric files from a previous run would be summed into /metrics
+    metrics_dir = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if metrics_dir:
+        os.makedirs(metrics_dir, exist_ok=True)
+        for name in os.listdir(metrics_dir):
+            if name.endswith('.db'):
+                os.remove(os.path.join(metrics_dir, name))
+
+    if worker_class != 'gevent':
+        print(f"⚠️  {worker_class} workers do not serve live dashboard streams; "
+              "set GUNICORN_WORKER_CLASS=gevent for live updates")
+
+    import app
+
+    app.ensure_indexes()
+    app.close_client()
+
+
+def post_fork(server, worker):
+    """Give each worker its own MongoClient and background threads"""
+    import app
+
+    # A client inherited from a preloaded master is discarded; get_client()
+    # opens a fresh one (with its own pool) on the worker's first query
+    app.close_client()
+    if OUTBOX_INPROCESS:
+        app.start_outbox_worker()
+
+
+def child_exit(server, worker):
+    """Drop a dead worker's live gauges from the shared metrics directory"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,76 @@
+"""
+Connection pool health for Annasamarpan
+PoolStats is registered on the MongoClient and keeps running counts of pool
+events, so /readyz can report pool usage without querying the server.
+"""
+
+import threading
+
+from pymongo import monitoring
+
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    """Thread-safe counters for MongoClient connection pool events"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counts = {
+                'pools': 0,
+                'pool_clears': 0,
+                'connections_created': 0,
+                'connections_closed': 0,
+                'checkouts_started': 0,
+                'checkouts': 0,
+                'checkins': 0,
+                'checkout_failures': 0
+            }
+
+    def _bump(self, key):
+        with self._lock:
+            self.counts[key] += 1
+
+    def snapshot(self):
+        """Current counters plus derived open/in-use/waiting figures"""
+        with self._lock:
+            counts = dict(self.counts)
+        counts['open_connections'] = counts['connections_created'] - counts['connections_closed']
+        counts['in_use'] = counts['checkouts'] - counts['checkins']
+        counts['waiting'] = max(counts['checkouts_started'] - counts['checkouts'] - counts['checkout_failures'], 0)
+        return counts
+
+    def pool_created(self, event):
+        self._bump('pools')
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._bump('pool_clears')
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._bump('connections_created')
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._bump('connections_closed')
+
+    def connection_check_out_started(self, event):
+        self._bump('checkouts_started')
+
+    def connection_check_out_failed(self, event):
+        self._bump('checkout_failures')
+
+    def connection_checked_out(self, event):
+        self._bump('checkouts')
+
+    def connection_checked_in(self, event):
+        self._bump('checkins')
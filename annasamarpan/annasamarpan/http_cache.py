@@ -0,0 +1,165 @@
+"""
+HTTP response caching and compression for Annasamarpan
+`cached` keeps rendered pages in an in-process LRU keyed on the endpoint and a
+version (e.g. the impact counters), answers conditional requests with 304, and
+stores each page pre-compressed. `init_app` gzip/brotli-compresses the other
+text responses.
+
+Brotli is used when the `brotli` package is installed (pip install brotli);
+otherwise responses are gzip-compressed.
+"""
+
+import functools
+import gzip
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from flask import current_app, make_response, request, session
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+PAGE_CACHE_ENABLED = os.environ.get('PAGE_CACHE_ENABLED', 'true').lower() == 'true'
+PAGE_CACHE_SIZE = int(os.environ.get('PAGE_CACHE_SIZE', 128))
+
+# Responses smaller than this are not worth compressing
+COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 500))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+COMPRESSIBLE_TYPES = ('text/html', 'text/plain', 'text/css', 'application/json', 'application/javascript')
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+
+def choose_encoding():
+    """Best encoding the client accepts, or None for identity"""
+    offers = ['br', 'gzip'] if brotli else ['gzip']
+    return request.accept_encodings.best_match(offers)
+
+
+class CachedPage:
+    """A rendered page plus its lazily built compressed variants"""
+
+    def __init__(self, body, mimetype):
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = hashlib.md5(body).hexdigest()
+        self.last_modified = datetime.now(timezone.utc).replace(microsecond=0)
+        self.variants = {}
+
+    def encoded(self, encoding):
+        if encoding is None:
+            return self.body
+        if encoding not in self.variants:
+            # Two threads may both compress on a miss; the results are identical
+            self.variants[encoding] = compress(self.body, encoding)
+        return self.variants[encoding]
+
+
+class PageCache:
+    """Thread-safe LRU of CachedPage entries"""
+
+    def __init__(self, max_entries=PAGE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            page = self.entries.get(key)
+            if page is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return page
+
+    def put(self, key, page):
+        with self.lock:
+            self.entries[key] = page
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+page_cache = PageCache()
+
+
+def _version_key(version):
+    if version is None:
+        return None
+    return hashlib.md5(repr(version()).encode()).hexdigest()
+
+
+def cached(version=None):
+    """Serve GET responses of a view from the page cache
+
+    `version` returns the data the page depends on (e.g. the impact stats); a
+    different value renders and caches the page again. Pages without it are
+    cached until the process restarts. Requests with pending flash messages
+    always render, since base.html shows them.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if not PAGE_CACHE_ENABLED or request.method != 'GET' or session.get('_flashes'):
+                return view(*args, **kwargs)
+
+            key = (request.endpoint, tuple(sorted(kwargs.items())), _version_key(version))
+            page = page_cache.get(key)
+            if page is None:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                page = CachedPage(response.get_data(), response.mimetype)
+                page_cache.put(key, page)
+
+            encoding = choose_encoding()
+            response = current_app.response_class(page.encoded(encoding), mimetype=page.mimetype)
+            if encoding:
+                response.headers['Content-Encoding'] = encoding
+            response.vary.add('Accept-Encoding')
+            response.set_etag(page.etag, weak=True)
+            response.last_modified = page.last_modified
+            # Browsers revalidate every time, so flashed messages are never hidden
+            response.cache_control.no_cache = True
+            return response.make_conditional(request)
+        return wrapper
+    return decorator
+
+
+def _compress_response(response):
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or not response.mimetype.startswith(COMPRESSIBLE_TYPES)):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding()
+    data = response.get_data()
+    if encoding is None or len(data) < COMPRESS_MIN_SIZE:
+        return response
+
+    response.set_data(compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def init_app(app):
+    """Compress text responses that the page cache has not already encoded"""
+    app.after_request(_compress_response)
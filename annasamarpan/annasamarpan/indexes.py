@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Index management for Annasamarpan
+INDEXES declares every index the application relies on. ensure_indexes applies
+them idempotently (at startup and from this script), and verify_indexes runs
+explain() on each query shape the routes issue and reports any COLLSCAN.
+
+Usage:
+    python indexes.py            # create missing indexes
+    python indexes.py --verify   # also fail if any route query scans a collection
+"""
+
+import argparse
+import os
+import sys
+from datetime import datetime
+
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, TEXT
+from pymongo.errors import OperationFailure
+
+from search import SEARCH_FIELDS
+
+# Create indexes when the application starts
+ENSURE_INDEXES_ON_STARTUP = os.environ.get('ENSURE_INDEXES_ON_STARTUP', 'true').lower() == 'true'
+
+
+def search_indexes(collection_name):
+    """Prefix key index and weighted text index for admin search"""
+    weights = SEARCH_FIELDS[collection_name][1]
+    return [
+        ([('search_terms', ASCENDING)], {}),
+        ([(field, TEXT) for field in weights], {'weights': weights, 'name': 'search_text'}),
+    ]
+
+
+# collection -> [(keys, options)]
+INDEXES = {
+    'donors': [
+        ([('email', ASCENDING)], {'unique': True}),
+        *search_indexes('donors'),
+    ],
+    'volunteers': [
+        ([('email', ASCENDING)], {'unique': True}),
+        ([('location', GEOSPHERE)], {}),
+        ([('availability', ASCENDING), ('pincode', ASCENDING)], {}),
+        ([('availability', ASCENDING), ('city', ASCENDING)], {}),
+        # least-loaded claim when no nearby/pincode/city candidate has room
+        ([('availability', ASCENDING), ('active_assignments', ASCENDING)], {}),
+        # newest-first lists with keyset cursors (dashboard, /api/v1/admin/volunteers)
+        ([('created_at', DESCENDING), ('_id', DESCENDING)], {}),
+        *search_indexes('volunteers'),
+    ],
+    'recipients': [
+        ([('phone', ASCENDING)], {}),
+        # /admin/recipients: filter (status or city) + sort (newest or name)
+        ([('created_at', DESCENDING), ('_id', DESCENDING)], {}),
+        ([('verification_status', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)], {}),
+        ([('city', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)], {}),
+        ([('name', ASCENDING), ('_id', ASCENDING)], {}),
+        ([('verification_status', ASCENDING), ('name', ASCENDING), ('_id', ASCENDING)], {}),
+        ([('city', ASCENDING), ('name', ASCENDING), ('_id', ASCENDING)], {}),
+        *search_indexes('recipients'),
+    ],
+    'donations': [
+        ([('idempotency_key', ASCENDING)], {
+            'unique': True,
+            'partialFilterExpression': {'idempotency_key': {'$type': 'string'}}
+        }),
+        ([('status', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)], {}),
+        # dispatch priority queue and expiry sweeps
+        ([('status', ASCENDING), ('expiry_date', ASCENDING)], {}),
+        ([('created_at', DESCENDING), ('_id', DESCENDING)], {}),
+        ([('donor_email', ASCENDING)], {}),
+        ([('updated_at', ASCENDING)], {}),
+        # archiver: completed/expired donations untouched since the cutoff
+        ([('status', ASCENDING), ('updated_at', ASCENDING)], {}),
+        *search_indexes('donations'),
+    ],
+    'assignments': [
+        ([('volunteer_email', ASCENDING), ('_id', DESCENDING)], {}),
+        ([('status', ASCENDING), ('assigned_at', DESCENDING)], {}),
+        ([('donation_id', ASCENDING)], {}),
+    ],
+    'admins': [
+        ([('email', ASCENDING)], {'unique': True}),
+    ],
+    'email_outbox': [
+        ([('status', ASCENDING), ('next_attempt_at', ASCENDING)], {}),
+        # Only messages a worker is sending carry a claim token
+        ([('claim_token', ASCENDING)], {'partialFilterExpression': {'claim_token': {'$type': 'string'}}}),
+    ],
+    'impact_daily': [
+        ([('month', ASCENDING)], {}),
+    ],
+    'impact_monthly': [
+        ([('month', ASCENDING)], {}),
+    ],
+}
+
+
+# Unique indexes that write paths rely on for correctness, not only speed:
+# they back duplicate suppression for retried and concurrent submissions
+REQUIRED_UNIQUE_INDEXES = {
+    'donations': [[('idempotency_key', ASCENDING)]],
+}
+
+
+def missing_required_indexes(db, required=REQUIRED_UNIQUE_INDEXES):
+    """'collection.field' for each required unique index that does not exist"""
+    missing = []
+    for collection_name, key_lists in required.items():
+        existing = {tuple(map(tuple, info['key']))
+                    for info in db[collection_name].index_information().values() if info.get('unique')}
+        for keys in key_lists:
+            if tuple(keys) not in existing:
+                missing.append(f"{collection_name}.{'_'.join(field for field, _ in keys)}")
+    return missing
+
+
+def ensure_indexes(db, registry=INDEXES):
+    """Create every registered index; returns (created_names, errors)"""
+    created = []
+    errors = []
+    for collection_name, indexes in registry.items():
+        collection = db[collection_name]
+        for keys, options in indexes:
+            try:
+                created.append(f"{collection_name}.{collection.create_index(keys, **options)}")
+            except OperationFailure as e:
+                # e.g. duplicates blocking a unique index, or conflicting options
+                errors.append(f"{collection_name} {keys}: {e}")
+    return created, errors
+
+
+def query_shapes():
+    """(collection, filter, sort) for each query the routes issue"""
+    now = datetime.now()
+    email = 'someone@example.com'
+    return [
+        # /donor, /admin/assign-volunteer
+        ('donors', {'email': email}, None),
+        # /volunteer/dashboard
+        ('volunteers', {'email': email}, None),
+        ('assignments', {'volunteer_email': email}, [('_id', DESCENDING)]),
+        # /volunteer/assignments/<id>/complete
+        ('assignments', {'_id': 0, 'volunteer_email': email, 'status': 'assigned'}, None),
+        # /admin
+        ('admins', {'email': email, 'password': 'x'}, None),
+        # /admin/dashboard
+        ('donations', {}, [('created_at', DESCENDING)]),
+        ('volunteers', {}, [('created_at', DESCENDING)]),
+        # /admin/recipients
+        ('recipients', {}, [('created_at', DESCENDING), ('_id', DESCENDING)]),
+        ('recipients', {'verification_status': 'verified'}, [('created_at', DESCENDING), ('_id', DESCENDING)]),
+        ('recipients', {'city': 'Mumbai'}, [('name', ASCENDING), ('_id', ASCENDING)]),
+        # /admin/assign-volunteer, /admin/dispatch
+        ('volunteers', {'availability': 'available', 'location': {'$nearSphere': {
+            '$geometry': {'type': 'Point', 'coordinates': [72.84, 19.05]}}}}, None),
+        ('volunteers', {'availability': 'available', 'pincode': '400050'}, None),
+        ('volunteers', {'availability': 'available', 'city': 'Mumbai'}, None),
+        ('volunteers', {'availability': 'available'}, [('active_assignments', ASCENDING)]),
+        ('donations', {'status': 'pending'}, [('expiry_date', ASCENDING)]),
+        ('donations', {'status': 'pending', 'expiry_date': {'$gte': now}}, [('expiry_date', ASCENDING)]),
+        ('donations', {'status': 'pending', 'expiry_date': {'$lt': now}}, None),
+        ('donors', {'email': {'$in': [email]}, 'location': {'$exists': True}}, None),
+        # /api/v1
+        ('donations', {}, [('created_at', DESCENDING), ('_id', DESCENDING)]),
+        ('donations', {'status': 'pending'}, [('created_at', DESCENDING), ('_id', DESCENDING)]),
+        ('volunteers', {}, [('created_at', DESCENDING), ('_id', DESCENDING)]),
+        # /api/v1/admin/search
+        ('donors', {'search_terms': {'$elemMatch': {'$gte': 'ravi', '$lt': 'ravi\uffff'}}}, None),
+        ('volunteers', {'search_terms': {'$elemMatch': {'$gte': '98201', '$lt': '98201\uffff'}}}, None),
+        ('recipients', {'$and': [{'search_terms': {'$elemMatch': {'$gte': 'ravi', '$lt': 'ravi\uffff'}}},
+                                 {'search_terms': {'$elemMatch': {'$gte': 'mum', '$lt': 'mum\uffff'}}}]}, None),
+        ('donations', {'$text': {'$search': 'rice'}}, None),
+        # counters reconcile
+        ('assignments', {'status': 'completed'}, None),
+        # archiver
+        ('donations', {'status': {'$in': ['completed', 'expired']}, 'updated_at': {'$lt': now}},
+         [('updated_at', ASCENDING)]),
+        ('assignments', {'donation_id': {'$in': [0]}}, None),
+        # impact rollups
+        ('donations', {'updated_at': {'$gt': now}}, None),
+        ('impact_daily', {'month': {'$in': [now.strftime('%Y-%m')]}}, None),
+        ('impact_monthly', {'month': {'$gte': now.strftime('%Y-%m')}}, None),
+        # outbox workers
+        ('email_outbox', {'status': 'queued', 'next_attempt_at': {'$lte': now}}, [('next_attempt_at', ASCENDING)]),
+        ('email_outbox', {'status': 'sending', 'locked_at': {'$lt': now}}, [('next_attempt_at', ASCENDING)]),
+        ('email_outbox', {'claim_token': 'token'}, None),
+    ]
+
+
+def plan_stages(plan):
+    """All stage names in an explain() plan tree"""
+    stages = []
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            stages.append(plan['stage'])
+        for value in plan.values():
+            stages.extend(plan_stages(value))
+    elif isinstance(plan, list):
+        for value in plan:
+            stages.extend(plan_stages(value))
+    return stages
+
+
+def verify_indexes(db, shapes=None):
+    """explain() every query shape; returns [(collection, filter, stages)] that COLLSCAN"""
+    scans = []
+    for collection_name, query, sort in shapes or query_shapes():
+        cursor = db[collection_name].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        stages = plan_stages(cursor.limit(1).explain()['queryPlanner']['winningPlan'])
+        if 'COLLSCAN' in stages:
+            scans.append((collection_name, query, stages))
+    return scans
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Create and verify MongoDB indexes')
+    parser.add_argument('--verify', action='store_true',
+                        help='explain every route query and fail on collection scans')
+    args = parser.parse_args()
+
+    from app import db
+
+    print("🗂️  Ensuring indexes...")
+    created, errors = ensure_indexes(db)
+    print(f"✅ {len(created)} indexes in place")
+    for error in errors:
+        print(f"❌ {error}")
+
+    if args.verify:
+        print("🔍 Verifying query plans...")
+        scans = verify_indexes(db)
+        for collection_name, query, stages in scans:
+            print(f"❌ COLLSCAN on {collection_name}: {query} ({' > '.join(stages)})")
+        if scans:
+            sys.exit(1)
+        print(f"✅ All {len(query_shapes())} route query shapes use an index")
+
+    if errors:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -8,6 +8,12 @@ from pymongo import MongoClient
 from datetime import datetime, timedelta
 import os
 from dotenv import load_dotenv
+from pincodes import backfill_locations
+from search import backfill_search_terms
+from indexes import ensure_indexes
+from counters import reconcile
+from claims import recount_active_assignments
+from rollups import refresh as refresh_rollups
 
 # Load environment variables
 load_dotenv()
@@ -137,6 +143,7 @@ def init_database():
     
     print(f"✅ Created {len(demo_volunteers)} demo volunteers")
     
+    
     # Create demo recipients
     demo_recipients = [
         {
@@ -180,7 +187,12 @@ def init_database():
             db.recipients.insert_one(recipient)
     
     print(f"✅ Created {len(demo_recipients)} demo recipients")
-    
+
+    # GeoJSON locations for proximity matching: volunteers' own coordinates,
+    # otherwise the pincode centroid
+    located = backfill_locations(db)
+    print(f"✅ Backfilled {located} locations")
+
     # Create demo donations
     demo_donations = [
         {
@@ -189,9 +201,11 @@ def init_database():
             'quantity': '25 meals',
             'description': 'Freshly cooked dal, rice, and vegetables from our restaurant. Prepared this morning and ready for pickup.',
             'pickup_address': '123 MG Road, Bandra West, Mumbai',
-            'expiry_date': (datetime.now() + timedelta(hours=4)).strftime('%Y-%m-%d'),
+            'expiry_date': datetime.now() + timedelta(hours=4),
             'status': 'completed',
-            'created_at': datetime.now() - timedelta(days=2)
+            'created_at': datetime.now() - timedelta(days=2),
+            # Watermark field for the incremental impact rollups
+            'updated_at': datetime.now() - timedelta(days=1)
         },
         {
             'donor_email': 'rajesh.kumar@email.com',
@@ -199,9 +213,10 @@ def init_database():
             'quantity': '10 kg',
             'description': 'Fresh vegetables including potatoes, onions, tomatoes, and leafy greens. Excess from our grocery store.',
             'pickup_address': '456 Park Street, Salt Lake, Kolkata',
-            'expiry_date': (datetime.now() + timedelta(days=3)).strftime('%Y-%m-%d'),
+            'expiry_date': datetime.now() + timedelta(days=3),
             'status': 'assigned',
-            'created_at': datetime.now() - timedelta(hours=6)
+            'created_at': datetime.now() - timedelta(hours=6),
+            'updated_at': datetime.now() - timedelta(hours=4)
         },
         {
             'donor_email': 'anita.patel@email.com',
@@ -209,9 +224,10 @@ def init_database():
             'quantity': '15 kg',
             'description': 'Rice, wheat flour, and pulses. Unopened packages from our pantry cleanup.',
             'pickup_address': '789 Brigade Road, MG Road, Bangalore',
-            'expiry_date': (datetime.now() + timedelta(days=30)).strftime('%Y-%m-%d'),
+            'expiry_date': datetime.now() + timedelta(days=30),
             'status': 'pending',
-            'created_at': datetime.now() - timedelta(hours=2)
+            'created_at': datetime.now() - timedelta(hours=2),
+            'updated_at': datetime.now() - timedelta(hours=2)
         }
     ]
     
@@ -252,9 +268,34 @@ def init_database():
             })
             if not existing_assignment:
                 db.assignments.insert_one(assignment)
+                # The donation names its volunteer, as the assign route records it
+                db.donations.update_one({'_id': assignment['donation_id']},
+                                        {'$set': {'assigned_volunteer': assignment['volunteer_email']}})
     
     print(f"✅ Created {len(demo_assignments)} demo assignments")
     
+    # Prefix keys for the admin search
+    keyed = backfill_search_terms(db)
+    print(f"✅ Added search keys to {keyed} records")
+    
+    # Volunteers' open assignment counts, which dispatch balances load with
+    recount_active_assignments(db)
+    print("✅ Active assignment counts rebuilt")
+    
+    # Rebuild impact counters from the seeded data
+    reconcile(db)
+    print("✅ Impact counters rebuilt")
+    
+    # Build the impact trend rollups from scratch
+    refresh_rollups(db, full=True)
+    print("✅ Impact rollups rebuilt")
+    
+    # Create the indexes the application queries rely on
+    created, errors = ensure_indexes(db)
+    print(f"✅ {len(created)} indexes in place")
+    for error in errors:
+        print(f"❌ {error}")
+    
     # Print summary
     print("\n📊 Database Summary:")
     print(f"   Donors: {db.donors.count_documents({})}")
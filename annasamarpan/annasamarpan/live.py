@@ -0,0 +1,248 @@
+"""
+Live dashboard updates for Annasamarpan
+One change-stream watcher thread per process follows `donations` and
+`assignments`. It fans each change out, through an in-process broker, to the
+Server-Sent Event streams of connected dashboards. Admins receive every
+change; volunteers only receive changes for their own email. However many
+dashboards are open, the database serves one change stream per process.
+
+Change streams need a replica set (a single-node one is enough, see README).
+Without one the watcher stands down, and the app's own write paths publish to
+the broker instead. That only reaches dashboards connected to the same
+process, and misses writes made by the CLI tools.
+"""
+
+import os
+import queue
+import sys
+import threading
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+LIVE_COLLECTIONS = ('donations', 'assignments')
+
+# Open event streams per process. Under gevent each is a greenlet and a socket,
+# so this bounds memory and file descriptors; stay under the worker's
+# GUNICORN_WORKER_CONNECTIONS so pages and the API still get connections
+LIVE_MAX_SUBSCRIBERS = int(os.environ.get(
+    'LIVE_MAX_SUBSCRIBERS', int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000)) // 2))
+
+# Seconds between keep-alive comments on an idle stream
+LIVE_HEARTBEAT = float(os.environ.get('LIVE_HEARTBEAT_SECONDS', 15))
+
+# Undelivered events kept per stream before it is told to resync instead
+LIVE_QUEUE_SIZE = 100
+
+# Fields sent with each change; enough for the dashboards to patch themselves
+EVENT_FIELDS = {
+    'donations': ('donor_email', 'food_type', 'quantity', 'description', 'status', 'assigned_volunteer',
+                  'expiry_date', 'created_at'),
+    'assignments': ('donation_id', 'volunteer_email', 'status', 'assigned_at', 'completed_at'),
+}
+
+# The server cannot run change streams (standalone mongod)
+CHANGE_STREAMS_UNSUPPORTED = {40573}
+# The resume token fell off the oplog; changes were missed
+CHANGE_STREAM_HISTORY_LOST = {280, 286}
+
+RESYNC = {'type': 'resync'}
+
+
+def make_event(collection, operation, document_id, document=None):
+    """Change event for the dashboards, addressed to the volunteer it concerns (if any)"""
+    document = document or {}
+    event = {
+        'type': 'change',
+        'collection': collection,
+        'operation': operation,
+        'id': document_id,
+        'document': {field: document[field] for field in EVENT_FIELDS[collection] if field in document}
+    }
+    volunteer_email = document.get('volunteer_email' if collection == 'assignments' else 'assigned_volunteer')
+    if volunteer_email:
+        event['volunteer_email'] = volunteer_email
+    return event
+
+
+class Subscription:
+    """One event stream; admins (volunteer_email None) see every change"""
+
+    def __init__(self, volunteer_email=None):
+        self.volunteer_email = volunteer_email
+        self.queue = queue.Queue(maxsize=LIVE_QUEUE_SIZE)
+
+    def wants(self, event):
+        return (self.volunteer_email is None or event['type'] != 'change'
+                or event.get('volunteer_email') == self.volunteer_email)
+
+    def get(self, timeout):
+        """Next event, or None after `timeout` seconds without one"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class Broker:
+    """Fans events out to the subscriptions of this process"""
+
+    def __init__(self, max_subscribers=LIVE_MAX_SUBSCRIBERS):
+        self.max_subscribers = max_subscribers
+        self.subscribers = set()
+        self.lock = threading.Lock()
+
+    def subscribe(self, volunteer_email=None):
+        """New subscription, or None when the process is at its limit"""
+        with self.lock:
+            if len(self.subscribers) >= self.max_subscribers:
+                return None
+            subscription = Subscription(volunteer_email)
+            self.subscribers.add(subscription)
+            return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscribers.discard(subscription)
+
+    def publish(self, event):
+        """Queue an event for every interested subscriber; returns how many"""
+        with self.lock:
+            subscribers = list(self.subscribers)
+        delivered = 0
+        for subscription in subscribers:
+            if not subscription.wants(event):
+                continue
+            try:
+                subscription.queue.put_nowait(event)
+            except queue.Full:
+                # A stalled client gets one resync instead of an unbounded backlog
+                with subscription.queue.mutex:
+                    subscription.queue.queue.clear()
+                subscription.queue.put_nowait(RESYNC)
+            delivered += 1
+        return delivered
+
+
+class ChangeWatcher:
+    """Background thread publishing donation and assignment changes to the broker"""
+
+    def __init__(self, database, broker, collections=LIVE_COLLECTIONS):
+        self.database = database
+        self.broker = broker
+        self.collections = collections
+        self.active = False      # a change stream is open right now
+        self.supported = True    # False once the server refused change streams
+        self.thread = None
+        self.pid = None
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+
+    def ensure_started(self):
+        """Start the thread in this process (again after fork, or if it died)"""
+        if not self.supported:
+            return
+        if self.thread is not None and self.pid == os.getpid() and self.thread.is_alive():
+            return
+        with self.lock:
+            if self.thread is None or self.pid != os.getpid() or not self.thread.is_alive():
+                self.active = False
+                self.pid = os.getpid()
+                self.thread = threading.Thread(target=self.run, name='change-watcher', daemon=True)
+                self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+
+    def pipeline(self):
+        fields = {f'fullDocument.{field}': 1
+                  for collection in self.collections for field in EVENT_FIELDS[collection]}
+        return [
+            # Deletes come from the archiver moving old records, which dashboards don't show
+            {'$match': {'ns.coll': {'$in': list(self.collections)},
+                        'operationType': {'$in': ['insert', 'update', 'replace']}}},
+            {'$project': dict(fields, operationType=1, ns=1, documentKey=1)}
+        ]
+
+    def run(self):
+        resume_token = None
+        delay = 1
+        while not self.stopping.is_set():
+            try:
+                with self.database.watch(self.pipeline(), full_document='updateLookup',
+                                         resume_after=resume_token, max_await_time_ms=1000) as stream:
+                    self.active = True
+                    delay = 1
+                    while stream.alive and not self.stopping.is_set():
+                        change = stream.try_next()
+                        if change is not None:
+                            self.broker.publish(make_event(change['ns']['coll'], change['operationType'],
+                                                           change['documentKey']['_id'], change.get('fullDocument')))
+                        resume_token = stream.resume_token
+            except NotImplementedError:
+                self.supported = False
+            except OperationFailure as e:
+                if e.code in CHANGE_STREAMS_UNSUPPORTED:
+                    self.supported = False
+                elif e.code in CHANGE_STREAM_HISTORY_LOST:
+                    # Start from now; dashboards reload what they may have missed
+                    resume_token = None
+                    self.broker.publish(RESYNC)
+            except PyMongoError:
+                pass
+            self.active = False
+            if not self.supported:
+                print("ℹ️  Change streams need a replica set; live updates fall back to in-process events")
+                break
+            self.stopping.wait(delay)
+            delay = min(delay * 2, 30)
+
+
+broker = Broker()
+_watcher = None
+_watcher_lock = threading.Lock()
+
+
+def streams_supported(environ):
+    """True when an open stream does not hold a thread from a fixed pool
+
+    Streams stay open for as long as a dashboard does, so they are only served
+    by gevent workers (one greenlet each) and the development server (one
+    thread per request). Sync and gthread workers would run out of threads
+    after a few dashboards.
+    """
+    monkey = sys.modules.get('gevent.monkey')
+    if monkey is not None and monkey.is_module_patched('socket'):
+        return True
+    return environ.get('SERVER_SOFTWARE', '').startswith('Werkzeug/')
+
+
+def subscribe(database, volunteer_email=None):
+    """Subscribe to live changes, starting this process's watcher on first use"""
+    global _watcher
+    if _watcher is None:
+        with _watcher_lock:
+            if _watcher is None:
+                _watcher = ChangeWatcher(database, broker)
+    _watcher.ensure_started()
+    return broker.subscribe(volunteer_email)
+
+
+def unsubscribe(subscription):
+    broker.unsubscribe(subscription)
+
+
+def streaming():
+    """True while a change stream is delivering every write"""
+    return _watcher is not None and _watcher.active
+
+
+def publish(collection, operation, document):
+    """Publish a write made by this process, unless the change stream will deliver it"""
+    if not streaming():
+        broker.publish(make_event(collection, operation, document.get('_id'), document))
+
+
+def publish_resync():
+    """Tell dashboards to reload after a batch of writes (dispatch, bulk submissions)"""
+    if not streaming():
+        broker.publish(RESYNC)
@@ -0,0 +1,154 @@
+"""
+Request and database metrics for Annasamarpan
+A pymongo CommandListener attributes every MongoDB command to the Flask request
+that issued it, and request hooks time each endpoint. Everything is exported
+in Prometheus text format from /metrics.
+
+Under gunicorn, set PROMETHEUS_MULTIPROC_DIR to a writable directory so that
+/metrics aggregates all worker processes instead of whichever one answers.
+/metrics answers logged-in admins and scrapers sending one of METRICS_TOKENS.
+"""
+
+import hmac
+import os
+import time
+from contextvars import ContextVar
+
+from flask import Response, request, session
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter,
+                               Histogram, generate_latest, multiprocess)
+from pymongo import monitoring
+
+# Comma-separated bearer tokens for Prometheus scrapers
+METRICS_TOKENS = [token.strip() for token in os.environ.get('METRICS_TOKENS', '').split(',') if token.strip()]
+
+REQUEST_LATENCY = Histogram(
+    'annasamarpan_request_duration_seconds', 'HTTP request latency by endpoint',
+    ['endpoint', 'method']
+)
+REQUESTS = Counter(
+    'annasamarpan_requests_total', 'HTTP requests by endpoint and status',
+    ['endpoint', 'method', 'status']
+)
+QUERIES_PER_REQUEST = Histogram(
+    'annasamarpan_db_commands_per_request', 'MongoDB commands issued while serving one request',
+    ['endpoint'], buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144)
+)
+DB_TIME_PER_REQUEST = Histogram(
+    'annasamarpan_db_seconds_per_request', 'Total MongoDB command time while serving one request',
+    ['endpoint']
+)
+COMMAND_LATENCY = Histogram(
+    'annasamarpan_db_command_duration_seconds', 'MongoDB command latency by command name',
+    ['command']
+)
+COMMAND_FAILURES = Counter(
+    'annasamarpan_db_command_failures_total', 'Failed MongoDB commands by command name',
+    ['command']
+)
+SMTP_SEND_LATENCY = Histogram(
+    'annasamarpan_smtp_send_duration_seconds', 'Time to hand one notification email to the SMTP server',
+    ['outcome']
+)
+
+# Per-request accumulator; None outside of a request (e.g. background workers)
+_current_request = ContextVar('annasamarpan_request_metrics', default=None)
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """Times MongoDB commands and charges them to the active request"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event)
+
+    def failed(self, event):
+        COMMAND_FAILURES.labels(event.command_name).inc()
+        self._record(event)
+
+    def _record(self, event):
+        seconds = event.duration_micros / 1e6
+        COMMAND_LATENCY.labels(event.command_name).observe(seconds)
+        current = _current_request.get()
+        if current is not None:
+            current['commands'] += 1
+            current['db_seconds'] += seconds
+
+
+def observe_smtp_send(seconds, success=True):
+    """Callback for the outbox workers"""
+    SMTP_SEND_LATENCY.labels('sent' if success else 'failed').observe(seconds)
+
+
+def _endpoint():
+    return request.endpoint or 'unmatched'
+
+
+def _start_request():
+    _current_request.set({'started': time.perf_counter(), 'commands': 0, 'db_seconds': 0.0})
+
+
+def _finish_request(response):
+    current = _current_request.get()
+    if current is None:
+        return response
+    _current_request.set(None)
+
+    endpoint = _endpoint()
+    elapsed = time.perf_counter() - current['started']
+    REQUEST_LATENCY.labels(endpoint, request.method).observe(elapsed)
+    REQUESTS.labels(endpoint, request.method, str(response.status_code)).inc()
+    QUERIES_PER_REQUEST.labels(endpoint).observe(current['commands'])
+    DB_TIME_PER_REQUEST.labels(endpoint).observe(current['db_seconds'])
+
+    # Per-response breakdown visible in browser dev tools
+    response.headers['Server-Timing'] = (
+        f"app;dur={elapsed * 1000:.1f}, "
+        f"db;dur={current['db_seconds'] * 1000:.1f};desc=\"{current['commands']} commands\""
+    )
+    return response
+
+
+def _teardown_request(exc):
+    # Requests that raised never reach after_request
+    current = _current_request.get()
+    if current is not None and exc is not None:
+        _current_request.set(None)
+        endpoint = _endpoint()
+        REQUEST_LATENCY.labels(endpoint, request.method).observe(time.perf_counter() - current['started'])
+        REQUESTS.labels(endpoint, request.method, '500').inc()
+        QUERIES_PER_REQUEST.labels(endpoint).observe(current['commands'])
+        DB_TIME_PER_REQUEST.labels(endpoint).observe(current['db_seconds'])
+
+
+def _authorized():
+    """An admin session or `Authorization: Bearer <token>` with one of METRICS_TOKENS"""
+    if session.get('admin_email'):
+        return True
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    return scheme.lower() == 'bearer' and any(
+        hmac.compare_digest(token.encode(), allowed.encode()) for allowed in METRICS_TOKENS)
+
+
+def metrics_view():
+    """Prometheus text exposition of all metrics"""
+    if not _authorized():
+        # Endpoint names, traffic and database timings are not for the public
+        return Response('authentication required\n', 401, {'WWW-Authenticate': 'Bearer'},
+                        content_type='text/plain')
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
+
+
+def init_app(app):
+    """Install request timing hooks and the /metrics endpoint"""
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_teardown_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Data migrations for Annasamarpan
+Each migration is idempotent and safe to re-run.
+
+Usage:
+    python migrations.py
+"""
+
+from datetime import datetime
+from itertools import islice
+
+from bson.objectid import ObjectId
+from pymongo import UpdateOne
+
+from claims import recount_active_assignments
+from expiry import parse_expiry
+from pincodes import backfill_locations
+from rollups import STATE as ROLLUP_STATE, STATE_ID as ROLLUP_STATE_ID
+from search import backfill_search_terms
+
+# Writes sent per bulk_write call
+BATCH_SIZE = 1000
+
+
+def normalize_assignment_donation_ids(db):
+    """Store assignments.donation_id as an ObjectId
+
+    Older assignments created from the admin dashboard stored the donation id as
+    a string, which never matched donations._id in joins.
+    """
+    converted = 0
+    batch = []
+    for assignment in db.assignments.find({'donation_id': {'$type': 'string'}}, {'donation_id': 1}):
+        if not ObjectId.is_valid(assignment['donation_id']):
+            continue
+        batch.append(UpdateOne(
+            {'_id': assignment['_id']},
+            {'$set': {'donation_id': ObjectId(assignment['donation_id'])}}
+        ))
+        if len(batch) >= BATCH_SIZE:
+            converted += db.assignments.bulk_write(batch, ordered=False).modified_count
+            batch = []
+    if batch:
+        converted += db.assignments.bulk_write(batch, ordered=False).modified_count
+    return converted
+
+
+def normalize_expiry_dates(db):
+    """Store donations.expiry_date as a datetime
+
+    The donor form used to save the raw date string (or nothing), which can't
+    be ordered or compared for dispatch priority and expiry sweeps.
+    """
+    converted = 0
+    batch = []
+    for donation in db.donations.find({'expiry_date': {'$not': {'$type': 'date'}}},
+                                      {'expiry_date': 1, 'food_type': 1, 'created_at': 1}):
+        expires = parse_expiry(donation.get('expiry_date'), donation.get('food_type'), donation.get('created_at'))
+        batch.append(UpdateOne({'_id': donation['_id']}, {'$set': {'expiry_date': expires}}))
+        if len(batch) >= BATCH_SIZE:
+            converted += db.donations.bulk_write(batch, ordered=False).modified_count
+            batch = []
+    if batch:
+        converted += db.donations.bulk_write(batch, ordered=False).modified_count
+    return converted
+
+
+def backfill_updated_at(db):
+    """Give donations written before updated_at existed their last change time
+
+    Archiving and the incremental rollups select donations by updated_at, so
+    without it old completed and expired donations were never archived. The
+    first of the donation's completed_at, its completing assignment's
+    completed_at, expired_at and created_at is used.
+    """
+    updated = 0
+    donations = db.donations.find({'updated_at': {'$exists': False}},
+                                  {'created_at': 1, 'completed_at': 1, 'expired_at': 1})
+    while True:
+        chunk = list(islice(donations, BATCH_SIZE))
+        if not chunk:
+            break
+        completed = {}
+        for assignment in db.assignments.find({'donation_id': {'$in': [d['_id'] for d in chunk]},
+                                               'completed_at': {'$type': 'date'}},
+                                              {'donation_id': 1, 'completed_at': 1}):
+            latest = completed.get(assignment['donation_id'])
+            if latest is None or assignment['completed_at'] > latest:
+                completed[assignment['donation_id']] = assignment['completed_at']
+        batch = []
+        for donation in chunk:
+            changed = (donation.get('completed_at') or completed.get(donation['_id'])
+                       or donation.get('expired_at') or donation.get('created_at'))
+            if not isinstance(changed, datetime):
+                changed = datetime.now()
+            batch.append(UpdateOne({'_id': donation['_id'], 'updated_at': {'$exists': False}},
+                                   {'$set': {'updated_at': changed}}))
+        updated += db.donations.bulk_write(batch, ordered=False).modified_count
+    if updated:
+        # Their old buckets may be stale and an incremental refresh would skip
+        # them (updated_at is before the watermark), so rebuild once
+        db[ROLLUP_STATE].delete_one({'_id': ROLLUP_STATE_ID})
+    return updated
+
+
+MIGRATIONS = [
+    normalize_assignment_donation_ids,
+    normalize_expiry_dates,
+    backfill_updated_at,
+    recount_active_assignments,
+    backfill_locations,
+    backfill_search_terms,
+]
+
+
+def run_migrations(db):
+    """Apply every migration in order"""
+    for migration in MIGRATIONS:
+        changed = migration(db)
+        print(f"✅ {migration.__name__}: {changed} documents updated")
+
+
+if __name__ == '__main__':
+    from app import db
+
+    print("🔧 Running data migrations...")
+    run_migrations(db)
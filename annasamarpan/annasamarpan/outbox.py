@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Email outbox for Annasamarpan
+Request handlers only insert messages into the `email_outbox` collection. A pool
+of worker threads claims queued messages in batches, sends them over long-lived
+SMTP connections, retries failures with exponential backoff and records the
+delivery status on each message.
+
+Usage:
+    python outbox.py [--workers 2]
+"""
+
+import argparse
+import os
+import smtplib
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+
+from pymongo import UpdateOne
+
+# Messages claimed by a worker per round trip
+OUTBOX_BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE', 20))
+
+# Worker threads, each holding its own SMTP connection
+OUTBOX_WORKERS = int(os.environ.get('OUTBOX_WORKERS', 2))
+
+# Seconds an idle worker waits before polling again
+OUTBOX_POLL_INTERVAL = float(os.environ.get('OUTBOX_POLL_INTERVAL', 1))
+
+# Attempts before a message is marked failed
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', 5))
+
+# First retry delay in seconds; doubled after every failed attempt
+OUTBOX_RETRY_BASE = float(os.environ.get('OUTBOX_RETRY_BASE', 30))
+
+# Messages stuck in `sending` longer than this (a crashed worker) are requeued
+OUTBOX_LOCK_TIMEOUT = timedelta(seconds=int(os.environ.get('OUTBOX_LOCK_TIMEOUT', 300)))
+
+# Idle SMTP connections older than this are closed and reopened
+SMTP_IDLE_TIMEOUT = float(os.environ.get('SMTP_IDLE_TIMEOUT', 60))
+
+
+def enqueue(outbox_collection, recipient, subject, body, sender=None):
+    """Queue an email for background delivery and return its id"""
+    now = datetime.now()
+    result = outbox_collection.insert_one({
+        'to': recipient,
+        'sender': sender,
+        'subject': subject,
+        'body': body,
+        'status': 'queued',
+        'attempts': 0,
+        'next_attempt_at': now,
+        'created_at': now
+    })
+    return result.inserted_id
+
+
+def smtp_settings(config):
+    """SMTP settings from a Flask-style config mapping"""
+    return {
+        'host': config.get('MAIL_SERVER', 'smtp.gmail.com'),
+        'port': int(config.get('MAIL_PORT', 587)),
+        'use_tls': config.get('MAIL_USE_TLS', True),
+        'username': config.get('MAIL_USERNAME'),
+        'password': config.get('MAIL_PASSWORD'),
+        'timeout': float(config.get('MAIL_TIMEOUT', 30))
+    }
+
+
+class SMTPConnection:
+    """One reusable SMTP session, reopened when it goes stale or drops"""
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.smtp = None
+        self.last_used = 0
+
+    def _open(self):
+        settings = self.settings
+        smtp = smtplib.SMTP(settings['host'], settings['port'], timeout=settings['timeout'])
+        if settings['use_tls']:
+            smtp.starttls()
+        if settings['username'] and settings['password']:
+            smtp.login(settings['username'], settings['password'])
+        return smtp
+
+    def get(self):
+        if self.smtp and time.monotonic() - self.last_used > SMTP_IDLE_TIMEOUT:
+            self.close()
+        if self.smtp is None:
+            self.smtp = self._open()
+        return self.smtp
+
+    def send(self, message):
+        try:
+            self.get().send_message(message)
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            # The server dropped an idle connection: reconnect once and retry
+            self.close()
+            self.get().send_message(message)
+        self.last_used = time.monotonic()
+
+    def close(self):
+        if self.smtp is not None:
+            try:
+                self.smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.smtp = None
+
+
+def build_message(document, default_sender):
+    message = EmailMessage()
+    message['Subject'] = document['subject']
+    message['From'] = document.get('sender') or default_sender
+    message['To'] = document['to']
+    message.set_content(document['body'])
+    return message
+
+
+def claim_batch(outbox_collection, worker_id, batch_size=OUTBOX_BATCH_SIZE):
+    """Claim up to batch_size due messages for one worker in three round trips
+
+    The due messages are tagged with a fresh claim token by a single
+    update_many, which re-checks that each one is still due, so messages that
+    another worker claimed in between are skipped. The batch is then read
+    back by its token.
+    """
+    now = datetime.now()
+    due = {
+        '$or': [
+            {'status': 'queued', 'next_attempt_at': {'$lte': now}},
+            {'status': 'sending', 'locked_at': {'$lt': now - OUTBOX_LOCK_TIMEOUT}}
+        ]
+    }
+    candidates = [document['_id'] for document in
+                  outbox_collection.find(due, {'_id': 1}).sort('next_attempt_at', 1).limit(batch_size)]
+    if not candidates:
+        return []
+    claim_token = uuid.uuid4().hex
+    outbox_collection.update_many(
+        dict(due, _id={'$in': candidates}),
+        {'$set': {'status': 'sending', 'locked_at': now, 'locked_by': worker_id, 'claim_token': claim_token}}
+    )
+    return list(outbox_collection.find({'claim_token': claim_token}).sort('next_attempt_at', 1))
+
+
+def retry_delay(attempts):
+    """Backoff before the next attempt, after `attempts` failures"""
+    return timedelta(seconds=OUTBOX_RETRY_BASE * (2 ** (attempts - 1)))
+
+
+def deliver_batch(outbox_collection, connection, documents, default_sender, on_attempt=None):
+    """Send claimed messages and record the outcome of each with one bulk_write
+
+    on_attempt(seconds, success) is called after every send, e.g. for metrics.
+    """
+    updates = []
+    for document in documents:
+        started = time.perf_counter()
+        try:
+            connection.send(build_message(document, default_sender))
+        except Exception as e:
+            attempts = document.get('attempts', 0) + 1
+            failed = attempts >= OUTBOX_MAX_ATTEMPTS
+            updates.append(UpdateOne({'_id': document['_id']}, {
+                '$set': {
+                    'status': 'failed' if failed else 'queued',
+                    'attempts': attempts,
+                    'last_error': str(e),
+                    'next_attempt_at': datetime.now() + retry_delay(attempts)
+                },
+                '$unset': {'locked_at': '', 'locked_by': '', 'claim_token': ''}
+            }))
+            print(f"Error sending email to {document['to']}: {e}")
+            if on_attempt:
+                on_attempt(time.perf_counter() - started, False)
+            # Drop a possibly broken connection before the next message
+            connection.close()
+            continue
+
+        if on_attempt:
+            on_attempt(time.perf_counter() - started, True)
+        updates.append(UpdateOne({'_id': document['_id']}, {
+            '$set': {
+                'status': 'sent',
+                'attempts': document.get('attempts', 0) + 1,
+                'sent_at': datetime.now()
+            },
+            '$unset': {'locked_at': '', 'locked_by': '', 'claim_token': '', 'last_error': ''}
+        }))
+
+    if updates:
+        outbox_collection.bulk_write(updates, ordered=False)
+    return updates
+
+
+class OutboxWorkerPool:
+    """Background threads draining the outbox over pooled SMTP connections"""
+
+    def __init__(self, outbox_collection, config, workers=OUTBOX_WORKERS,
+                 poll_interval=OUTBOX_POLL_INTERVAL, on_attempt=None):
+        self.outbox = outbox_collection
+        self.settings = smtp_settings(config)
+        self.default_sender = config.get('MAIL_DEFAULT_SENDER') or config.get('MAIL_USERNAME')
+        if not self.default_sender:
+            # Otherwise every message would fail to send, only once it is claimed
+            raise RuntimeError("MAIL_DEFAULT_SENDER (or MAIL_USERNAME) must be set to send queued emails")
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.on_attempt = on_attempt
+        self.stopping = threading.Event()
+        self.threads = []
+
+    def _run(self, worker_id):
+        connection = SMTPConnection(self.settings)
+        try:
+            while not self.stopping.is_set():
+                try:
+                    batch = claim_batch(self.outbox, worker_id)
+                    if batch:
+                        deliver_batch(self.outbox, connection, batch, self.default_sender, self.on_attempt)
+                        continue
+                except Exception as e:
+                    print(f"Outbox worker {worker_id} error: {e}")
+                self.stopping.wait(self.poll_interval)
+        finally:
+            connection.close()
+
+    def start(self):
+        for n in range(self.workers):
+            worker_id = f"{os.getpid()}-{n}"
+            thread = threading.Thread(target=self._run, args=(worker_id,),
+                                      name=f"outbox-{worker_id}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        return self
+
+    def stop(self, timeout=10):
+        self.stopping.set()
+        for thread in self.threads:
+            thread.join(timeout)
+        self.threads = []
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Deliver queued emails from the outbox')
+    parser.add_argument('--workers', type=int, default=OUTBOX_WORKERS, help='worker threads')
+    args = parser.parse_args()
+
+    from app import app, outbox_collection
+    import metrics
+
+    try:
+        pool = OutboxWorkerPool(outbox_collection, app.config, workers=args.workers,
+                                on_attempt=metrics.observe_smtp_send).start()
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    print(f"📬 Outbox worker running with {args.workers} SMTP connection(s). Press Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("🛑 Stopping outbox worker...")
+        pool.stop()
@@ -0,0 +1,53 @@
+"""
+Keyset (cursor) pagination helpers for Annasamarpan
+Pages continue from the sort values of the last document shown instead of
+using skip(), so every page is an index range scan no matter how deep it is.
+"""
+
+import base64
+import binascii
+
+from bson import json_util
+
+
+def encode_cursor(document, sort):
+    """Opaque cursor token holding the sort values of `document`"""
+    values = [document.get(field) for field, _ in sort]
+    return base64.urlsafe_b64encode(json_util.dumps(values).encode()).decode()
+
+
+def decode_cursor(token, sort):
+    """Sort values from a cursor token, or None if it is missing or invalid"""
+    if not token:
+        return None
+    try:
+        values = json_util.loads(base64.urlsafe_b64decode(token.encode()).decode())
+    except (ValueError, TypeError, binascii.Error):
+        return None
+    if not isinstance(values, list) or len(values) != len(sort):
+        return None
+    return values
+
+
+def keyset_filter(sort, values):
+    """Filter matching documents that come strictly after `values` in `sort` order"""
+    clauses = []
+    for i, (field, direction) in enumerate(sort):
+        clause = {sort[j][0]: values[j] for j in range(i)}
+        clause[field] = {'$lt' if direction < 0 else '$gt': values[i]}
+        clauses.append(clause)
+    return {'$or': clauses}
+
+
+def fetch_page(collection, query, sort, limit, cursor=None, projection=None):
+    """One page of documents plus the cursor token for the next page (or None)
+
+    `sort` must end with `_id` so the order is total.
+    """
+    values = decode_cursor(cursor, sort)
+    if values is not None:
+        query = {'$and': [query, keyset_filter(sort, values)]} if query else keyset_filter(sort, values)
+
+    documents = list(collection.find(query, projection).sort(sort).limit(limit + 1))
+    next_cursor = encode_cursor(documents[limit - 1], sort) if len(documents) > limit else None
+    return documents[:limit], next_cursor
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Offline pincode geocoding for Annasamarpan
+Pincode centroids are held in sorted numpy arrays and found by binary search,
+so donors, recipients and volunteers get approximate coordinates in
+microseconds without an external geocoding service. Pincodes missing from the
+table fall back to the centroid of their sorting district (first three digits)
+and are stored with location_source 'pincode_district'; pincodes whose district
+is missing too get no location, and dispatch matches those records by pincode
+and city instead.
+
+`data/pincodes.csv` is only a sample: a few dozen centroids in the demo cities.
+Build a complete table from the India Post pincode directory (a CSV with
+pincode, latitude and longitude columns, one row per post office); the
+resulting .npy file is memory-mapped on load and preferred over the CSV.
+
+Usage:
+    python pincodes.py lookup 400050
+    python pincodes.py build all_india_pincode.csv data/pincodes.npy
+    python pincodes.py backfill
+"""
+
+import argparse
+import csv
+import os
+import threading
+import time
+
+import numpy as np
+from pymongo import UpdateOne
+
+from geo import backfill_volunteer_locations, make_point
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+# Table used for lookups (default: data/pincodes.npy if built, else data/pincodes.csv)
+PINCODE_DATA = os.environ.get('PINCODE_DATA')
+
+# Writes sent per bulk_write call when backfilling
+BATCH_SIZE = 1000
+
+# float32 keeps centroids to about a metre, so results are rounded to 5 decimals
+DTYPE = np.dtype([('pincode', '<i4'), ('latitude', '<f4'), ('longitude', '<f4')])
+
+
+# Bundled sample table (see the module docstring)
+SAMPLE_PATH = os.path.join(DATA_DIR, 'pincodes.csv')
+
+# location_source values for exact and district-level matches
+EXACT = 'pincode'
+DISTRICT = 'pincode_district'
+
+
+def default_path():
+    built = os.path.join(DATA_DIR, 'pincodes.npy')
+    return built if os.path.exists(built) else SAMPLE_PATH
+
+
+def parse_pincode(value):
+    """Six-digit pincode as an int, or None"""
+    text = str(value).replace(' ', '').strip() if value is not None else ''
+    if len(text) != 6 or not text.isdigit() or text[0] == '0':
+        return None
+    return int(text)
+
+
+def read_source(stream):
+    """Yield (pincode, latitude, longitude) from a CSV, skipping rows without usable coordinates"""
+    for row in csv.DictReader(stream):
+        row = {key.strip().lower(): value for key, value in row.items() if key}
+        pincode = parse_pincode(row.get('pincode'))
+        try:
+            point = make_point(row.get('latitude'), row.get('longitude'))
+        except ValueError:
+            # Directory rows use "NA" for offices without coordinates
+            continue
+        if pincode and point:
+            longitude, latitude = point['coordinates']
+            yield pincode, latitude, longitude
+
+
+class PincodeIndex:
+    """Sorted pincode keys with parallel centroid arrays"""
+
+    def __init__(self, table):
+        self.table = table
+        self.keys = table['pincode']
+        self.latitudes = table['latitude']
+        self.longitudes = table['longitude']
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build from (pincode, latitude, longitude) rows; repeated pincodes are averaged"""
+        rows = list(rows)
+        if not rows:
+            return cls(np.zeros(0, dtype=DTYPE))
+        pincodes, latitudes, longitudes = (np.array(column) for column in zip(*rows))
+        keys, inverse, counts = np.unique(pincodes, return_inverse=True, return_counts=True)
+        table = np.zeros(len(keys), dtype=DTYPE)
+        table['pincode'] = keys
+        table['latitude'] = np.bincount(inverse, weights=latitudes) / counts
+        table['longitude'] = np.bincount(inverse, weights=longitudes) / counts
+        return cls(table)
+
+    @classmethod
+    def load(cls, path):
+        if path.endswith('.npy'):
+            return cls(np.load(path, mmap_mode='r'))
+        with open(path, newline='', encoding='utf-8') as stream:
+            return cls.from_rows(read_source(stream))
+
+    def save(self, path):
+        np.save(path, np.asarray(self.table))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def resolve(self, pincode, district_fallback=True):
+        """((latitude, longitude), EXACT or DISTRICT) for a pincode, or (None, None)"""
+        key = parse_pincode(pincode)
+        if key is None or not len(self.keys):
+            return None, None
+        i = int(np.searchsorted(self.keys, key))
+        if i < len(self.keys) and self.keys[i] == key:
+            return (round(float(self.latitudes[i]), 5), round(float(self.longitudes[i]), 5)), EXACT
+        if not district_fallback:
+            return None, None
+
+        # Every pincode of a sorting district shares its first three digits
+        first = key // 1000 * 1000
+        start, stop = np.searchsorted(self.keys, [first, first + 1000])
+        if start == stop:
+            return None, None
+        return (round(float(self.latitudes[start:stop].mean()), 5),
+                round(float(self.longitudes[start:stop].mean()), 5)), DISTRICT
+
+    def lookup(self, pincode, district_fallback=True):
+        """(latitude, longitude) centroid for a pincode, or None"""
+        return self.resolve(pincode, district_fallback)[0]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """Process-wide index, loaded on first use"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                path = PINCODE_DATA or default_path()
+                if path == SAMPLE_PATH:
+                    print("ℹ️  Using the sample pincode table; most pincodes resolve to their district "
+                          "or not at all (see `python pincodes.py build`)")
+                _index = PincodeIndex.load(path)
+    return _index
+
+
+def location_fields(pincode):
+    """{'location', 'location_source'} for a record placed by its pincode, or {} if unknown"""
+    found, source = get_index().resolve(pincode)
+    if not found:
+        return {}
+    return {'location': make_point(*found), 'location_source': source}
+
+
+def backfill_locations(db, index=None):
+    """Give donors, recipients and volunteers without coordinates their pincode centroid
+
+    Volunteers' own latitude/longitude are applied first and always win.
+    Returns the number of documents updated.
+    """
+    index = index or get_index()
+    updated = backfill_volunteer_locations(db.volunteers)
+    for name in ('donors', 'recipients', 'volunteers'):
+        batch = []
+        for document in db[name].find({'location': {'$exists': False}, 'pincode': {'$nin': [None, '']}},
+                                      {'pincode': 1}):
+            found, source = index.resolve(document['pincode'])
+            if not found:
+                continue
+            batch.append(UpdateOne(
+                {'_id': document['_id'], 'location': {'$exists': False}},
+                {'$set': {'location': make_point(*found), 'location_source': source}}
+            ))
+            if len(batch) >= BATCH_SIZE:
+                updated += db[name].bulk_write(batch, ordered=False).modified_count
+                batch = []
+        if batch:
+            updated += db[name].bulk_write(batch, ordered=False).modified_count
+    return updated
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline pincode geocoding')
+    commands = parser.add_subparsers(dest='command', required=True)
+    lookup = commands.add_parser('lookup', help='print the centroid of pincodes')
+    lookup.add_argument('pincodes', nargs='+')
+    build = commands.add_parser('build', help='compile a pincode directory CSV into a .npy table')
+    build.add_argument('source')
+    build.add_argument('output', nargs='?', default=os.path.join(DATA_DIR, 'pincodes.npy'))
+    commands.add_parser('backfill', help='add locations to records that have only a pincode')
+    args = parser.parse_args()
+
+    if args.command == 'lookup':
+        index = get_index()
+        for pincode in args.pincodes:
+            started = time.perf_counter()
+            found, source = index.resolve(pincode)
+            elapsed = (time.perf_counter() - started) * 1e6
+            if found:
+                print(f"📍 {pincode}: {found[0]:.4f}, {found[1]:.4f} [{source}] ({elapsed:.1f} µs)")
+            else:
+                print(f"❌ {pincode}: not found")
+    elif args.command == 'build':
+        started = time.perf_counter()
+        with open(args.source, newline='', encoding='utf-8') as stream:
+            index = PincodeIndex.from_rows(read_source(stream))
+        index.save(args.output)
+        print(f"✅ Wrote {len(index)} pincodes to {args.output} in {time.perf_counter() - started:.1f}s")
+    else:
+        from app import db
+
+        print("📍 Backfilling locations from pincodes...")
+        print(f"✅ Updated {backfill_locations(db)} documents")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Read routing for Annasamarpan
+Statistics, dashboards, search and exports read through an analytics handle
+that prefers secondaries (`secondaryPreferred` with `maxStalenessSeconds`), so
+they stop competing with donation writes on the primary. Writes, assignment
+claims and everything else keep the default primary handle. After a user
+writes, their session reads from the primary until any secondary that could
+serve them has caught up, so post-submit redirects always show their change.
+Against a standalone server the analytics handle simply reads the primary.
+
+The `local` command starts a throwaway multi-member replica set, and `bench`
+runs the mixed route benchmark with routing off and on and reports the reads
+each member served.
+
+Usage:
+    python replicas.py local --members 3 --dbpath /tmp/annasamarpan-rs
+    python replicas.py status
+    python replicas.py bench --requests 200 --concurrency 8
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+from pymongo import MongoClient
+from pymongo.read_preferences import SecondaryPreferred
+
+# Send analytics and dashboard reads to secondaries
+READ_ROUTING = os.environ.get('READ_ROUTING', 'true').lower() == 'true'
+
+# Most a secondary may lag before it stops serving reads (MongoDB's minimum is 90)
+MAX_STALENESS_SECONDS = max(int(os.environ.get('MONGO_MAX_STALENESS_SECONDS', 90)), 90)
+
+# After a write, the session reads from the primary for this long
+PRIMARY_STICKY_SECONDS = int(os.environ.get('PRIMARY_STICKY_SECONDS', MAX_STALENESS_SECONDS))
+
+STICKY_KEY = 'read_primary_until'
+
+# Server commands counted as reads / writes when comparing members
+READ_COMMANDS = ('find', 'getMore', 'aggregate', 'count', 'distinct')
+WRITE_COMMANDS = ('insert', 'update', 'delete', 'findAndModify')
+
+
+def analytics_read_preference():
+    return SecondaryPreferred(max_staleness=MAX_STALENESS_SECONDS)
+
+
+def analytics_database(database):
+    """The same database, read through secondaries when one is fresh enough"""
+    return database.with_options(read_preference=analytics_read_preference())
+
+
+def note_write(session):
+    """Pin this user's reads to the primary so the next pages show their write"""
+    session[STICKY_KEY] = time.time() + PRIMARY_STICKY_SECONDS
+
+
+def prefers_primary(session):
+    return session.get(STICKY_KEY, 0) > time.time()
+
+
+def member_counters(client):
+    """{host: {'state', 'reads', 'writes'}} from serverStatus on every replica set member"""
+    members = {}
+    for member in client.admin.command('replSetGetStatus')['members']:
+        host, port = member['name'].rsplit(':', 1)
+        with MongoClient(host, int(port), directConnection=True, serverSelectionTimeoutMS=2000) as direct:
+            commands = direct.admin.command('serverStatus')['metrics']['commands']
+        members[member['name']] = {
+            'state': member['stateStr'],
+            'reads': sum(commands.get(name, {}).get('total', 0) for name in READ_COMMANDS),
+            'writes': sum(commands.get(name, {}).get('total', 0) for name in WRITE_COMMANDS),
+        }
+    return members
+
+
+def counter_deltas(before, after):
+    return {host: {'state': after[host]['state'],
+                   'reads': after[host]['reads'] - before.get(host, {}).get('reads', 0),
+                   'writes': after[host]['writes'] - before.get(host, {}).get('writes', 0)}
+            for host in after}
+
+
+def start_local(members, dbpath, port=27017, replica_set='rs0'):
+    """Start `members` mongod processes as one replica set; returns (processes, uri)"""
+    if not shutil.which('mongod'):
+        raise SystemExit("❌ mongod is not on PATH")
+    processes = []
+    hosts = []
+    for i in range(members):
+        path = os.path.join(dbpath, f'member{i}')
+        os.makedirs(path, exist_ok=True)
+        hosts.append(f'localhost:{port + i}')
+        processes.append(subprocess.Popen(
+            ['mongod', '--replSet', replica_set, '--port', str(port + i), '--dbpath', path,
+             '--bind_ip', 'localhost', '--quiet', '--logpath', os.path.join(path, 'mongod.log')]))
+
+    with MongoClient('localhost', port, directConnection=True, serverSelectionTimeoutMS=30000) as seed:
+        if seed.admin.command('hello').get('setName') is None:
+            seed.admin.command('replSetInitiate', {
+                '_id': replica_set,
+                'members': [{'_id': i, 'host': host} for i, host in enumerate(hosts)]
+            })
+    uri = f"mongodb://{','.join(hosts)}/?replicaSet={replica_set}"
+    with MongoClient(uri, serverSelectionTimeoutMS=60000) as client:
+        client.admin.command('ping')
+    return processes, uri
+
+
+def bench(requests, concurrency, scale):
+    """Run the mixed route benchmark with routing off, then on; returns per-member deltas"""
+    import benchmark
+    import replicas
+    from app import app, db, get_client
+
+    client = get_client()
+    if 'setName' not in client.admin.command('hello'):
+        raise SystemExit("❌ MONGO_URI must point at a replica set (see `python replicas.py local`)")
+    if scale:
+        print(f"🌱 Seeding {scale} donors/donations...")
+        benchmark.seed(db, scale, drop=True)
+        # Let the secondaries catch up before measuring
+        time.sleep(2)
+
+    transport = benchmark.InProcessTransport(app)
+    results = {}
+    for routing in (False, True):
+        # The app reads the flag from the imported module, not this script
+        replicas.READ_ROUTING = routing
+        before = member_counters(client)
+        for name, method, build in benchmark.build_scenarios(db, requests):
+            benchmark.run_scenario(transport, method, build, requests, concurrency)
+        results['routed' if routing else 'primary only'] = counter_deltas(before, member_counters(client))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replica set read routing')
+    commands = parser.add_subparsers(dest='command', required=True)
+    local = commands.add_parser('local', help='run a local replica set until interrupted')
+    local.add_argument('--members', type=int, default=3)
+    local.add_argument('--dbpath', default='/tmp/annasamarpan-rs')
+    local.add_argument('--port', type=int, default=27017)
+    commands.add_parser('status', help='show members and how reads are routed')
+    bench_parser = commands.add_parser('bench', help='compare primary load with routing off and on')
+    bench_parser.add_argument('--requests', type=int, default=200, help='requests per route')
+    bench_parser.add_argument('--concurrency', type=int, default=8)
+    bench_parser.add_argument('--scale', type=int, help='seed this many donors/donations first (drops data)')
+    args = parser.parse_args()
+
+    if args.command == 'local':
+        processes, uri = start_local(args.members, args.dbpath, args.port)
+        print(f"✅ Replica set of {args.members} members running")
+        print(f"   export MONGO_URI=\"{uri}\"")
+        try:
+            for process in processes:
+                process.wait()
+        except KeyboardInterrupt:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.wait()
+        return
+
+    if args.command == 'status':
+        from app import get_client
+
+        print(f"🔀 Read routing {'on' if READ_ROUTING else 'off'}: secondaryPreferred, "
+              f"maxStalenessSeconds={MAX_STALENESS_SECONDS}, primary for {PRIMARY_STICKY_SECONDS}s after a write")
+        for host, member in member_counters(get_client()).items():
+            print(f"   {host:24} {member['state']:10} {member['reads']:>10} reads {member['writes']:>10} writes")
+        return
+
+    print(f"🚀 Mixed benchmark, {args.requests} requests per route, routing off then on...")
+    results = bench(args.requests, args.concurrency, args.scale)
+    for label, members in results.items():
+        reads = sum(member['reads'] for member in members.values()) or 1
+        primary = sum(member['reads'] for member in members.values() if member['state'] == 'PRIMARY')
+        print(f"📊 {label}: primary served {primary} of {reads} reads ({primary / reads:.0%})")
+        for host, member in members.items():
+            print(f"   {host:24} {member['state']:10} {member['reads']:>8} reads {member['writes']:>8} writes")
+    routed = results['routed']
+    if not any(member['reads'] for member in routed.values() if member['state'] == 'SECONDARY'):
+        print("❌ No reads reached a secondary")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Impact rollups for Annasamarpan
+Donations are summarised per day, city and food type into `impact_daily`, and
+those into `impact_monthly`, with $merge pipelines. Archived donations (see
+archive.py) are included, so trends keep their history. Each refresh only
+recomputes the days touched by donations whose `updated_at` is newer than the
+stored watermark, so trend charts read a few small documents instead of
+scanning raw donations.
+
+Meals are counted from quantities written as "<n> meals"; other units (kg,
+packets) count as donations but not meals. Donations are bucketed by the day
+they were created, and `delivered` counts those that have since been completed.
+
+Usage:
+    python rollups.py             # incremental refresh since the last watermark
+    python rollups.py --full      # rebuild every bucket
+    python rollups.py --watch 300 # refresh every 5 minutes
+"""
+
+import argparse
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from archive import archive_names
+
+DAILY = 'impact_daily'
+MONTHLY = 'impact_monthly'
+STATE = 'rollup_state'
+STATE_ID = 'impact'
+
+# Re-read this much before the watermark so writes in flight during the last
+# refresh are not missed (recomputing a bucket is idempotent)
+ROLLUP_OVERLAP = timedelta(seconds=int(os.environ.get('ROLLUP_OVERLAP_SECONDS', 300)))
+
+# Months of history shown on the impact page, and how long it is cached
+TRENDS_MONTHS = 12
+TRENDS_CACHE_TTL = float(os.environ.get('TRENDS_CACHE_TTL', 60))
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def _day_ranges(days):
+    """created_at filter covering each 'YYYY-MM-DD' day"""
+    ranges = []
+    for day in sorted(days):
+        start = datetime.strptime(day, '%Y-%m-%d')
+        ranges.append({'created_at': {'$gte': start, '$lt': start + timedelta(days=1)}})
+    return {'$or': ranges}
+
+
+def daily_pipeline(match, now, archives=()):
+    """Recompute the day/city/food_type buckets of the matched donations into impact_daily
+
+    `archives` are donation archive collections whose matches count too.
+    """
+    meals_match = {'$regexFind': {
+        'input': {'$toString': {'$ifNull': ['$quantity', '']}},
+        'regex': r'^\s*(\d+)\s*meal',
+        'options': 'i'
+    }}
+    return [
+        {'$match': match},
+        *({'$unionWith': {'coll': name, 'pipeline': [{'$match': match}]}} for name in archives),
+        {'$lookup': {'from': 'donors', 'localField': 'donor_email', 'foreignField': 'email', 'as': 'donor'}},
+        {'$project': {
+            'day': {'$dateToString': {'format': '%Y-%m-%d', 'date': '$created_at'}},
+            'city': {'$ifNull': [{'$arrayElemAt': ['$donor.city', 0]}, 'Unknown']},
+            'food_type': {'$ifNull': ['$food_type', 'other']},
+            'delivered': {'$cond': [{'$eq': ['$status', 'completed']}, 1, 0]},
+            'meals': {'$let': {
+                'vars': {'found': meals_match},
+                'in': {'$cond': [
+                    {'$eq': ['$$found', None]}, 0,
+                    # A typo like "99999999999 meals" must not fail the whole $merge
+                    {'$convert': {'input': {'$arrayElemAt': ['$$found.captures', 0]},
+                                  'to': 'long', 'onError': 0, 'onNull': 0}}
+                ]}
+            }}
+        }},
+        {'$group': {
+            '_id': {'day': '$day', 'city': '$city', 'food_type': '$food_type'},
+            'donations': {'$sum': 1},
+            'delivered': {'$sum': '$delivered'},
+            'meals_donated': {'$sum': '$meals'},
+            'meals_delivered': {'$sum': {'$multiply': ['$meals', '$delivered']}}
+        }},
+        {'$set': {
+            'day': '$_id.day',
+            'month': {'$substrCP': ['$_id.day', 0, 7]},
+            'city': '$_id.city',
+            'food_type': '$_id.food_type',
+            'refreshed_at': now
+        }},
+        {'$merge': {'into': DAILY, 'on': '_id', 'whenMatched': 'replace', 'whenNotMatched': 'insert'}}
+    ]
+
+
+def monthly_pipeline(months, now):
+    """Roll the daily buckets of the given months up into impact_monthly"""
+    match = {'month': {'$in': sorted(months)}} if months is not None else {}
+    return [
+        {'$match': match},
+        {'$group': {
+            '_id': {'month': '$month', 'city': '$city', 'food_type': '$food_type'},
+            'donations': {'$sum': '$donations'},
+            'delivered': {'$sum': '$delivered'},
+            'meals_donated': {'$sum': '$meals_donated'},
+            'meals_delivered': {'$sum': '$meals_delivered'}
+        }},
+        {'$set': {
+            'month': '$_id.month',
+            'city': '$_id.city',
+            'food_type': '$_id.food_type',
+            'refreshed_at': now
+        }},
+        {'$merge': {'into': MONTHLY, 'on': '_id', 'whenMatched': 'replace', 'whenNotMatched': 'insert'}}
+    ]
+
+
+def refresh(db, full=False, now=None):
+    """Bring the rollups up to date; returns (days_recomputed, months_recomputed)
+
+    days/months are None after a full rebuild.
+    """
+    now = now or datetime.now()
+    state = db[STATE].find_one({'_id': STATE_ID})
+
+    if full or not state:
+        db[DAILY].delete_many({})
+        db[MONTHLY].delete_many({})
+        db.donations.aggregate(daily_pipeline({'created_at': {'$type': 'date'}}, now,
+                                              archive_names(db, 'donations')))
+        db[DAILY].aggregate(monthly_pipeline(None, now))
+        days = months = None
+    else:
+        since = state['watermark'] - ROLLUP_OVERLAP
+        days = [row['_id'] for row in db.donations.aggregate([
+            {'$match': {'updated_at': {'$gt': since}, 'created_at': {'$type': 'date'}}},
+            {'$group': {'_id': {'$dateToString': {'format': '%Y-%m-%d', 'date': '$created_at'}}}}
+        ])]
+        months = sorted({day[:7] for day in days})
+        if days:
+            # Archived donations of those days are part of the same buckets
+            db.donations.aggregate(daily_pipeline(_day_ranges(days), now, archive_names(db, 'donations', months)))
+            db[DAILY].aggregate(monthly_pipeline(months, now))
+
+    # Only advance the watermark once both levels are written
+    db[STATE].update_one({'_id': STATE_ID}, {'$set': {'watermark': now}}, upsert=True)
+    invalidate()
+    return days, months
+
+
+def invalidate():
+    with _cache_lock:
+        _cache.clear()
+
+
+def get_trends(db, months=TRENDS_MONTHS, ttl=TRENDS_CACHE_TTL):
+    """Monthly series plus city and food type breakdowns for the last `months` months"""
+    now = time.monotonic()
+    with _cache_lock:
+        cached = _cache.get(months)
+        if cached and cached[0] > now:
+            return cached[1]
+
+    first_day = datetime.now().replace(day=1)
+    for _ in range(months - 1):
+        first_day = (first_day - timedelta(days=1)).replace(day=1)
+    since = first_day.strftime('%Y-%m')
+
+    fields = ('donations', 'delivered', 'meals_donated', 'meals_delivered')
+    by_month, by_city, by_food_type = {}, {}, {}
+    for doc in db[MONTHLY].find({'month': {'$gte': since}}, {'_id': 0, 'refreshed_at': 0}):
+        for key, groups in ((doc['month'], by_month), (doc['city'], by_city), (doc['food_type'], by_food_type)):
+            totals = groups.setdefault(key, dict.fromkeys(fields, 0))
+            for field in fields:
+                totals[field] += doc.get(field, 0)
+
+    def ranked(groups, label):
+        return sorted(({label: key, **totals} for key, totals in groups.items()),
+                      key=lambda row: row['donations'], reverse=True)
+
+    trends = {
+        'months': [{'month': month, **by_month[month]} for month in sorted(by_month)],
+        'cities': ranked(by_city, 'city'),
+        'food_types': ranked(by_food_type, 'food_type')
+    }
+    with _cache_lock:
+        _cache[months] = (now + ttl, trends)
+    return trends
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Refresh the impact rollup collections')
+    parser.add_argument('--full', action='store_true', help='rebuild every bucket from scratch')
+    parser.add_argument('--watch', type=float, metavar='SECONDS', help='keep refreshing at this interval')
+    args = parser.parse_args()
+
+    from app import db
+
+    full = args.full
+    while True:
+        started = time.perf_counter()
+        days, months = refresh(db, full=full)
+        elapsed = time.perf_counter() - started
+        if days is None:
+            print(f"✅ Rebuilt impact rollups in {elapsed:.1f}s")
+        else:
+            print(f"✅ Refreshed {len(days)} days across {len(months)} months in {elapsed:.1f}s")
+        if not args.watch:
+            break
+        full = False
+        time.sleep(args.watch)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Multi-pickup route batching for Annasamarpan
+Pending donations whose pickups are close together and that expire within the
+same window are grouped into batches. Each batch goes to one nearby volunteer
+with spare capacity, along with an ordered route: nearest-neighbour from the
+volunteer's location, improved with 2-opt, optionally ending at a drop-off
+point. Every donation in the batch gets its own assignment carrying the shared
+route, so completing deliveries works as before.
+
+Usage:
+    python routing.py [--radius 2] [--max-stops 5] [--dry-run]
+"""
+
+import argparse
+import os
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from bson.objectid import ObjectId
+from pymongo import InsertOne, UpdateOne
+
+import claims
+import counters
+import expiry
+from dispatch import DISPATCH_MAX_DISTANCE_KM, load_pending
+from geo import VolunteerGrid, haversine_km, point_coordinates
+
+# Pickups within this many km of a batch's first pickup may join it
+ROUTE_RADIUS_KM = float(os.environ.get('ROUTE_RADIUS_KM', 2))
+
+# Pickups in one batch expire at most this many hours apart
+ROUTE_EXPIRY_WINDOW = timedelta(hours=float(os.environ.get('ROUTE_EXPIRY_WINDOW_HOURS', 6)))
+
+# Largest and smallest batch; single pickups are left to regular dispatch
+ROUTE_MAX_STOPS = int(os.environ.get('ROUTE_MAX_STOPS', 5))
+ROUTE_MIN_STOPS = 2
+
+# Nearest volunteers considered for each batch
+ROUTE_CANDIDATES = int(os.environ.get('ROUTE_CANDIDATES', 10))
+
+# Optional "lat,lon" where every route ends (e.g. the distribution centre)
+ROUTE_DROP_OFF = os.environ.get('ROUTE_DROP_OFF')
+
+
+def parse_drop_off(value):
+    """(lat, lon) from a 'lat,lon' string, or None"""
+    if not value:
+        return None
+    lat, lon = (float(part) for part in value.split(','))
+    return lat, lon
+
+
+def cluster_pickups(located, radius_km=ROUTE_RADIUS_KM, window=ROUTE_EXPIRY_WINDOW,
+                    max_stops=ROUTE_MAX_STOPS, now=None):
+    """Group located donations into batches; returns lists of indexes into `located`
+
+    The soonest-expiring unbatched donation seeds each batch, which then takes
+    the nearest unbatched pickups within `radius_km` whose expiry is within
+    `window` of the seed's.
+    """
+    if not located:
+        return []
+
+    now = now or datetime.now()
+    coords = np.array([point_coordinates(point) for _, point in located], dtype=float)
+    # Donations without an expiry batch with each other, after the dated ones
+    expiries = np.array([
+        (d['expiry_date'] - now).total_seconds() if isinstance(d.get('expiry_date'), datetime) else 1e12
+        for d, _ in located
+    ], dtype=float)
+    window_seconds = window.total_seconds()
+
+    free = np.ones(len(located), dtype=bool)
+    batches = []
+    for seed in np.argsort(expiries, kind='stable'):
+        if not free[seed]:
+            continue
+        free[seed] = False
+        candidates = np.flatnonzero(free & (np.abs(expiries - expiries[seed]) <= window_seconds))
+        if candidates.size:
+            distances = haversine_km(coords[seed, 0], coords[seed, 1],
+                                     coords[candidates, 0], coords[candidates, 1])
+            near = np.flatnonzero(distances <= radius_km)
+            near = near[np.argsort(distances[near], kind='stable')][:max_stops - 1]
+            candidates = candidates[near]
+            free[candidates] = False
+        batches.append([int(seed)] + candidates.tolist())
+    return batches
+
+
+def plan_route(start, pickups, distance, end=None):
+    """Order `pickups` [(lat, lon)] starting from `start` and finishing at `end` if given
+
+    Returns (order, legs_km, total_km): order indexes into `pickups`, and
+    legs_km[i] is the distance to the i-th stop (the drop-off leg comes last).
+    """
+    stops = len(pickups)
+    nodes = [start] + list(pickups) + ([end] if end else [])
+    cost = [[distance(a[0], a[1], b[0], b[1]) for b in nodes] for a in nodes]
+
+    # Nearest neighbour from the start
+    path = [0]
+    remaining = set(range(1, stops + 1))
+    while remaining:
+        here = path[-1]
+        nearest = min(remaining, key=lambda node: (cost[here][node], node))
+        path.append(nearest)
+        remaining.remove(nearest)
+    if end:
+        path.append(stops + 1)
+
+    # 2-opt: reverse path[i..j] while that shortens the route; the start (and
+    # the drop-off) stay fixed, an open route may end at any pickup
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1, stops):
+            for j in range(i + 1, stops + 1):
+                before, first, last = path[i - 1], path[i], path[j]
+                delta = cost[before][last] - cost[before][first]
+                if j + 1 < len(path):
+                    after = path[j + 1]
+                    delta += cost[first][after] - cost[last][after]
+                if delta < -1e-9:
+                    path[i:j + 1] = path[i:j + 1][::-1]
+                    improved = True
+
+    legs = [cost[path[k - 1]][path[k]] for k in range(1, len(path))]
+    return [node - 1 for node in path[1:stops + 1]], legs, sum(legs)
+
+
+def build_route(volunteer, stops, distance, drop_off=None):
+    """Route document for a volunteer collecting `stops` [(donation, point)] in order"""
+    start = point_coordinates(volunteer['location'])
+    coords = [point_coordinates(point) for _, point in stops]
+    order, legs, total = plan_route(start, coords, distance, drop_off)
+    route = {
+        'id': ObjectId(),
+        'stops': [{
+            'donation_id': stops[i][0]['_id'],
+            'pickup_address': stops[i][0].get('pickup_address'),
+            'latitude': coords[i][0],
+            'longitude': coords[i][1],
+            'leg_km': round(leg, 2)
+        } for i, leg in zip(order, legs)],
+        'total_km': round(total, 2)
+    }
+    if drop_off:
+        route['drop_off'] = {'latitude': drop_off[0], 'longitude': drop_off[1], 'leg_km': round(legs[-1], 2)}
+    return route
+
+
+def plan_batches(located, volunteers, distance, radius_km=ROUTE_RADIUS_KM, window=ROUTE_EXPIRY_WINDOW,
+                 max_stops=ROUTE_MAX_STOPS, max_distance_km=DISPATCH_MAX_DISTANCE_KM, drop_off=None):
+    """Compute (volunteer, stops, route) batches without writing anything
+
+    Each batch goes to the nearest candidate with room for all of it, or is
+    trimmed to the candidate with the most room. Capacities come from the
+    snapshot in `volunteers` and are claimed for real by commit_batches.
+    """
+    if not located or not volunteers:
+        return []
+
+    grid = VolunteerGrid(volunteers)
+    room = {v['email']: claims.remaining_capacity(v) for v in volunteers}
+    batches = []
+    for members in cluster_pickups(located, radius_km, window, max_stops):
+        if len(members) < ROUTE_MIN_STOPS:
+            continue
+        coords = np.array([point_coordinates(located[i][1]) for i in members], dtype=float)
+        lat, lon = coords.mean(axis=0)
+        candidates = [v for v, _ in grid.nearest(lat, lon, ROUTE_CANDIDATES, max_distance_km)
+                      if room[v['email']] >= ROUTE_MIN_STOPS]
+        if not candidates:
+            continue
+        volunteer = next((v for v in candidates if room[v['email']] >= len(members)),
+                         max(candidates, key=lambda v: room[v['email']]))
+        # Members are seed first, then nearest, so trimming keeps the most urgent
+        stops = [located[i] for i in members[:room[volunteer['email']]]]
+        room[volunteer['email']] -= len(stops)
+        batches.append((volunteer, stops, build_route(volunteer, stops, distance, drop_off)))
+    return batches
+
+
+def commit_batches(db, batches, distance, drop_off=None):
+    """Claim volunteers, take the donations and write one assignment per stop; returns batches committed
+
+    Like dispatch.commit_dispatch: each volunteer is claimed atomically for the
+    whole batch, donations are only taken while still pending, and slots for
+    donations lost to someone else are released. A batch that lost stops is
+    re-routed over the ones it kept.
+    """
+    claimed = [batch for batch in batches
+               if claims.claim_volunteer(db.volunteers, {'email': batch[0]['email']}, slots=len(batch[1]))]
+    if not claimed:
+        return []
+
+    now = datetime.now()
+    run_id = ObjectId()
+    db.donations.bulk_write([
+        UpdateOne(
+            {'_id': donation['_id'], 'status': 'pending'},
+            {'$set': {'status': 'assigned', 'assigned_volunteer': volunteer['email'],
+                      'dispatch_run': run_id, 'updated_at': now}}
+        )
+        for volunteer, stops, _ in claimed for donation, _ in stops
+    ], ordered=False)
+    ids = [donation['_id'] for _, stops, _ in claimed for donation, _ in stops]
+    taken = {d['_id'] for d in db.donations.find({'_id': {'$in': ids}, 'dispatch_run': run_id}, {'_id': 1})}
+
+    committed = []
+    for volunteer, stops, route in claimed:
+        kept = [stop for stop in stops if stop[0]['_id'] in taken]
+        if len(kept) < len(stops):
+            claims.release_volunteer(db.volunteers, volunteer['email'], len(stops) - len(kept))
+            if not kept:
+                continue
+            route = build_route(volunteer, kept, distance, drop_off)
+        committed.append((volunteer, kept, route))
+
+    operations = []
+    for volunteer, _, route in committed:
+        for number, stop in enumerate(route['stops'], 1):
+            operations.append(InsertOne({
+                'donation_id': stop['donation_id'],
+                'volunteer_email': volunteer['email'],
+                'status': 'assigned',
+                'assigned_at': now,
+                'distance_km': stop['leg_km'],
+                'route': dict(route, stop=number)
+            }))
+    if operations:
+        db.assignments.bulk_write(operations, ordered=False)
+        counters.increment(db.counters, pending_donations=-len(operations))
+    return committed
+
+
+def batch_routes(db, distance, radius_km=ROUTE_RADIUS_KM, max_stops=ROUTE_MAX_STOPS,
+                 drop_off=None, dry_run=False, notify=None):
+    """Batch nearby pending pickups onto volunteers and report the result"""
+    started = time.perf_counter()
+
+    expired = 0 if dry_run else expiry.sweep(db)
+    located, unlocated = load_pending(db)
+    volunteers = list(db.volunteers.find(
+        {'availability': 'available', 'location': {'$exists': True}},
+        {'name': 1, 'email': 1, 'location': 1, 'capacity': 1, 'active_assignments': 1}
+    ))
+
+    planning_started = time.perf_counter()
+    batches = plan_batches(located, volunteers, distance, radius_km, max_stops=max_stops, drop_off=drop_off)
+    planning = time.perf_counter() - planning_started
+
+    if not dry_run:
+        batches = commit_batches(db, batches, distance, drop_off)
+        if notify:
+            for volunteer, stops, _ in batches:
+                for donation, _ in stops:
+                    notify(volunteer['email'], donation)
+
+    batched = sum(len(stops) for _, stops, _ in batches)
+    return {
+        'pending': len(located) + len(unlocated),
+        'routes': len(batches),
+        'batched': batched,
+        'without_location': len(unlocated),
+        'expired': expired,
+        'volunteers': len({volunteer['email'] for volunteer, _, _ in batches}),
+        'total_route_km': round(sum(route['total_km'] for _, _, route in batches), 2),
+        'planning_seconds': round(planning, 3),
+        'elapsed_seconds': round(time.perf_counter() - started, 3),
+        'dry_run': dry_run
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Batch nearby pending pickups into volunteer routes')
+    parser.add_argument('--radius', type=float, default=ROUTE_RADIUS_KM,
+                        help='km from the first pickup that other pickups may join a route')
+    parser.add_argument('--max-stops', type=int, default=ROUTE_MAX_STOPS, help='pickups per route')
+    parser.add_argument('--drop-off', default=ROUTE_DROP_OFF, metavar='LAT,LON',
+                        help='where every route ends')
+    parser.add_argument('--dry-run', action='store_true', help='plan without writing')
+    args = parser.parse_args()
+
+    from app import calculate_distance, db, send_volunteer_notification
+
+    print("🗺️  Planning pickup routes...")
+    report = batch_routes(db, calculate_distance, args.radius, args.max_stops,
+                          parse_drop_off(args.drop_off), args.dry_run, notify=send_volunteer_notification)
+
+    print(f"✅ Batched {report['batched']} of {report['pending']} pending donations "
+          f"into {report['routes']} routes for {report['volunteers']} volunteers")
+    print(f"   Without pickup coordinates: {report['without_location']}")
+    print(f"   Expired before planning: {report['expired']}")
+    print(f"   Total route distance: {report['total_route_km']} km")
+    print(f"   Planning time: {report['planning_seconds']}s ({report['elapsed_seconds']}s overall)")
+    if report['dry_run']:
+        print("ℹ️  Dry run - nothing was written")
+
+
+if __name__ == '__main__':
+    main()
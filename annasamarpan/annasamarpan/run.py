@@ -6,26 +6,40 @@ This script starts the Flask development server
 
 import os
 import sys
-from app import app
+from app import app, get_client, MONGO_URI, ensure_indexes, start_outbox_worker
 
 if __name__ == '__main__':
-    # Check if MongoDB is running
-    try:
-        from pymongo import MongoClient
-        client = MongoClient('mongodb://localhost:27017/')
-        client.admin.command('ping')
-        print("✅ MongoDB connection successful")
-    except Exception as e:
-        print("❌ MongoDB connection failed!")
-        print("Please make sure MongoDB is running on localhost:27017")
-        print("Error:", str(e))
-        sys.exit(1)
+    # With debug=True the reloader runs this script again in a child process
+    # (WERKZEUG_RUN_MAIN=true), which serves the requests and is restarted on
+    # every code change. One-time setup stays in the watching parent; the
+    # outbox worker lives in the child that serves
+    serving = os.environ.get('WERKZEUG_RUN_MAIN') == 'true'
     
-    # Start the Flask application
-    print("🚀 Starting Annasamarpan application...")
-    print("📱 Access the application at: http://localhost:5000")
-    print("🔑 Admin login: admin@annasamarpan.com / admin123")
-    print("🛑 Press Ctrl+C to stop the server")
+    if not serving:
+        # Check if MongoDB is running (using the application's own client)
+        try:
+            get_client().admin.command('ping')
+            print("✅ MongoDB connection successful")
+        except Exception as e:
+            print("❌ MongoDB connection failed!")
+            print(f"Please make sure MongoDB is running at {MONGO_URI}")
+            print("Error:", str(e))
+            sys.exit(1)
+        
+        # Create any missing indexes
+        ensure_indexes()
+        
+        # Start the Flask application
+        print("🚀 Starting Annasamarpan application...")
+        print("📱 Access the application at: http://localhost:5000")
+        print("🔑 Admin login: admin@annasamarpan.com / admin123")
+        print("🛑 Press Ctrl+C to stop the server")
+    else:
+        # Deliver queued notification emails in the background
+        try:
+            start_outbox_worker()
+        except RuntimeError as e:
+            print(f"⚠️  {e}; notification emails stay queued until it is")
     
     app.run(
         host='0.0.0.0',
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Admin search for Annasamarpan
+Finds donors, volunteers, recipients and donations by name, phone, email,
+pincode, city or free text without scanning collections. Every searchable
+record carries `search_terms`, an array of normalized keys (lowercase name
+words, email, phone digits, pincode, city) with a multikey index, so a prefix
+such as "98201" or "ravi" is an index range scan. Words in addresses and
+descriptions go through each collection's text index. Hits from both are
+merged, ranked by relevance and returned with the matches highlighted.
+
+Usage:
+    python search.py "ravi kumar"
+    python search.py 400050 --collections donors recipients
+    python search.py --backfill
+"""
+
+import argparse
+import re
+import time
+
+from markupsafe import Markup, escape
+from pymongo import UpdateOne
+
+SEARCH_COLLECTIONS = ('donors', 'volunteers', 'recipients', 'donations')
+
+# Candidates fetched per collection and per lookup; refine the query for more
+SEARCH_CANDIDATES = 100
+
+# Query words considered; longer queries are cut off
+SEARCH_MAX_TOKENS = 5
+
+# Writes sent per bulk_write call when backfilling
+BATCH_SIZE = 1000
+
+# collection -> (fields indexed as search_terms, text index weights, fields returned)
+SEARCH_FIELDS = {
+    'donors': (('name', 'email', 'phone', 'pincode', 'city'),
+               {'name': 10, 'city': 5, 'address': 1},
+               ('name', 'email', 'phone', 'address', 'city', 'pincode', 'created_at')),
+    'volunteers': (('name', 'email', 'phone', 'pincode', 'city'),
+                   {'name': 10, 'city': 5, 'address': 1},
+                   ('name', 'email', 'phone', 'address', 'city', 'pincode', 'availability', 'created_at')),
+    'recipients': (('name', 'phone', 'pincode', 'city'),
+                   {'name': 10, 'city': 5, 'address': 1},
+                   ('name', 'phone', 'address', 'city', 'pincode', 'verification_status', 'created_at')),
+    'donations': (('donor_email', 'food_type'),
+                  {'food_type': 5, 'description': 2, 'pickup_address': 1},
+                  ('donor_email', 'food_type', 'quantity', 'description', 'pickup_address', 'status',
+                   'created_at')),
+}
+
+# Relevance of a key hit per query word, comparable to the text index scores
+EXACT_TERM_SCORE = 10.0
+PREFIX_TERM_SCORE = 6.0
+
+WORD = re.compile(r"[^\W_]+(?:[@.+'-][^\W_]+)*")
+
+
+def _digits(value):
+    return ''.join(c for c in str(value) if c.isdigit())
+
+
+def search_terms(collection_name, document):
+    """Normalized keys that prefix lookups match for one document"""
+    terms = set()
+    for field in SEARCH_FIELDS[collection_name][0]:
+        value = document.get(field)
+        if not value:
+            continue
+        value = str(value).strip().lower()
+        if field == 'phone':
+            digits = _digits(value)
+            terms.add(digits)
+            # Numbers saved with a country code are also found by the local number
+            if len(digits) > 10:
+                terms.add(digits[-10:])
+        elif field in ('email', 'donor_email'):
+            terms.add(value)
+            terms.add(value.split('@')[0])
+        else:
+            terms.add(value)
+            terms.update(WORD.findall(value.replace('_', ' ')))
+    terms.discard('')
+    return sorted(terms)
+
+
+def add_search_terms(collection_name, document):
+    """Set `search_terms` on a document about to be written; returns it"""
+    document['search_terms'] = search_terms(collection_name, document)
+    return document
+
+
+def tokenize(query):
+    """Lowercase query words; a phone number typed with spaces stays one word"""
+    query = query.strip().lower()
+    if len(_digits(query)) >= 6 and not re.search(r'[^\d\s+()-]', query):
+        return [_digits(query)]
+    return WORD.findall(query)[:SEARCH_MAX_TOKENS]
+
+
+def _prefix_range(token):
+    # Every string starting with `token` sorts in [token, token + U+FFFF); $elemMatch
+    # makes one array element satisfy both bounds (and keeps the index bounds tight)
+    return {'search_terms': {'$elemMatch': {'$gte': token, '$lt': token + '\uffff'}}}
+
+
+def _key_hits(collection, tokens, projection):
+    """Documents whose keys start with every query word, scored by exactness"""
+    query = {'$and': [_prefix_range(token) for token in tokens]} if len(tokens) > 1 else _prefix_range(tokens[0])
+    hits = []
+    for document in collection.find(query, dict(projection, search_terms=1)).limit(SEARCH_CANDIDATES):
+        terms = set(document.pop('search_terms', ()))
+        score = sum(EXACT_TERM_SCORE if token in terms else PREFIX_TERM_SCORE for token in tokens)
+        hits.append((score / len(tokens), document))
+    return hits
+
+
+def _text_hits(collection, tokens, projection):
+    """Documents matching the words through the text index, with its scores"""
+    projection = dict(projection, score={'$meta': 'textScore'})
+    cursor = collection.find({'$text': {'$search': ' '.join(tokens)}}, projection)
+    return [(document.pop('score'), document)
+            for document in cursor.sort([('score', {'$meta': 'textScore'})]).limit(SEARCH_CANDIDATES)]
+
+
+def highlight(value, tokens):
+    """HTML of `value` with the words matching the query wrapped in <mark>"""
+    text = str(value)
+    digits = _digits(text)
+    # The local number (last ten digits) is a search key too, see search_terms
+    if not text.isdigit() and any(token.isdigit() and (digits.startswith(token) or digits[-10:].startswith(token))
+                                  for token in tokens):
+        # Formatted phone numbers: the digits matched, mark the whole value
+        return Markup('<mark>{}</mark>').format(text)
+
+    parts = []
+    last = 0
+    for match in WORD.finditer(text):
+        word = match.group().lower()
+        # Also catch stemmed text matches ("meals" finds "meal")
+        length = max((len(token) for token in tokens if word.startswith(token)
+                      or (len(word) >= 3 and token.startswith(word))), default=0)
+        if not length:
+            continue
+        length = min(length, len(word))
+        start = match.start()
+        parts.append(escape(text[last:start]))
+        parts.append(Markup('<mark>{}</mark>').format(text[start:start + length]))
+        last = start + length
+    if not parts:
+        return None
+    parts.append(escape(text[last:]))
+    return Markup('').join(parts)
+
+
+def search(db, query, collections=SEARCH_COLLECTIONS):
+    """Ranked hits across `collections`, best first
+
+    Each hit is {collection, _id, score, document, highlights}; `highlights`
+    maps field names to HTML with the matches marked.
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return []
+    results = []
+    for name in collections:
+        fields = SEARCH_FIELDS[name][2]
+        projection = {field: 1 for field in fields}
+        scores = {}
+        documents = {}
+        for score, document in _key_hits(db[name], tokens, projection) + _text_hits(db[name], tokens, projection):
+            # Found by both lookups: the scores add up
+            scores[document['_id']] = scores.get(document['_id'], 0) + score
+            documents[document['_id']] = document
+        for document_id, document in documents.items():
+            highlights = {}
+            for field in fields:
+                if isinstance(document.get(field), str) and document[field]:
+                    marked = highlight(document[field], tokens)
+                    if marked:
+                        highlights[field] = str(marked)
+            results.append({'collection': name, '_id': document_id, 'score': round(scores[document_id], 3),
+                            'document': document, 'highlights': highlights})
+    # Newest first among equal scores
+    results.sort(key=lambda hit: hit['_id'], reverse=True)
+    results.sort(key=lambda hit: hit['score'], reverse=True)
+    return results
+
+
+def refresh_search_terms(collection, collection_name, query):
+    """Recompute search_terms for the matching records; returns how many changed"""
+    fields = SEARCH_FIELDS[collection_name][0]
+    updated = 0
+    batch = []
+    for document in collection.find(query, {field: 1 for field in fields}):
+        batch.append(UpdateOne({'_id': document['_id']},
+                               {'$set': {'search_terms': search_terms(collection_name, document)}}))
+        if len(batch) >= BATCH_SIZE:
+            updated += collection.bulk_write(batch, ordered=False).modified_count
+            batch = []
+    if batch:
+        updated += collection.bulk_write(batch, ordered=False).modified_count
+    return updated
+
+
+def backfill_search_terms(db):
+    """Compute search_terms for records written before search existed"""
+    return sum(refresh_search_terms(db[name], name, {'search_terms': {'$exists': False}})
+               for name in SEARCH_COLLECTIONS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Search donors, volunteers, recipients and donations')
+    parser.add_argument('query', nargs='?')
+    parser.add_argument('--collections', nargs='+', choices=SEARCH_COLLECTIONS, default=SEARCH_COLLECTIONS)
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--backfill', action='store_true', help='add search keys to existing records')
+    args = parser.parse_args()
+
+    from app import db
+
+    if args.backfill:
+        print("🔎 Backfilling search keys...")
+        print(f"✅ Updated {backfill_search_terms(db)} documents")
+    if not args.query:
+        return
+
+    started = time.perf_counter()
+    results = search(db, args.query, args.collections)
+    elapsed = (time.perf_counter() - started) * 1000
+    print(f"🔎 {len(results)} results for {args.query!r} in {elapsed:.1f} ms")
+    for hit in results[:args.limit]:
+        document = hit['document']
+        label = document.get('name') or document.get('food_type', '')
+        print(f"  {hit['score']:6.2f}  {hit['collection']:<10}  {label}  {hit['_id']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Shared fixtures for the Annasamarpan tests
+The app runs against an in-memory mongomock client, so no MongoDB server is
+needed (pip install -r requirements-dev.txt). Tests of aggregation pipelines
+mongomock cannot run use `server_db`, which needs TEST_MONGO_URI.
+"""
+
+import os
+import sys
+import uuid
+
+import pytest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+
+@pytest.fixture
+def app_module(monkeypatch):
+    """The app module with a fresh in-memory database"""
+    mongomock = pytest.importorskip('mongomock')
+    import app as app_module
+    import counters
+    import rollups
+
+    monkeypatch.setattr(app_module, 'MongoClient', mongomock.MongoClient)
+    monkeypatch.setattr(app_module, '_analytics_db', None)
+    app_module.close_client()
+    counters.invalidate()
+    rollups.invalidate()
+    app_module.app.config.update(TESTING=True)
+    yield app_module
+    app_module.close_client()
+
+
+@pytest.fixture
+def db(app_module):
+    return app_module.get_db()
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+@pytest.fixture
+def server_db():
+    """A throwaway database on the MongoDB server at TEST_MONGO_URI"""
+    uri = os.environ.get('TEST_MONGO_URI')
+    if not uri:
+        pytest.skip('TEST_MONGO_URI is not set')
+    from pymongo import MongoClient
+
+    client = MongoClient(uri, serverSelectionTimeoutMS=5000)
+    name = f'annasamarpan_test_{uuid.uuid4().hex[:8]}'
+    yield client[name]
+    client.drop_database(name)
+    client.close()
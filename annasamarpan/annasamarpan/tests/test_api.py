@@ -0,0 +1,66 @@
+from datetime import datetime
+
+import pytest
+from bson.objectid import ObjectId
+
+import api
+
+BULK = {
+    'idempotency_key': 'caterer-1',
+    'donor': {'name': 'City Caterers', 'email': 'ops@caterers.in', 'phone': '9800000000',
+              'address': '12 Hill Road', 'city': 'Mumbai', 'state': 'MH', 'pincode': '400050'},
+    'donations': [{'food_type': 'cooked_meals', 'quantity': '40 meals', 'description': 'Veg biryani'},
+                  {'food_type': 'bakery', 'quantity': '10 kg', 'description': 'Bread'}],
+}
+
+
+def test_jsonify_uses_orjson_for_compact_output(app_module, monkeypatch):
+    orjson = pytest.importorskip('orjson')
+    calls = []
+
+    def dumps(obj, **kwargs):
+        calls.append(kwargs['option'])
+        return orjson.dumps(obj, **kwargs)
+
+    monkeypatch.setattr(api, 'orjson', type('orjson', (), {
+        'dumps': staticmethod(dumps), 'OPT_NON_STR_KEYS': orjson.OPT_NON_STR_KEYS,
+        'OPT_SORT_KEYS': orjson.OPT_SORT_KEYS}))
+    document_id = ObjectId()
+    with app_module.app.test_request_context('/'):
+        response = app_module.app.json.response({'b': document_id, 'a': datetime(2024, 6, 1, 9, 30)})
+
+    assert calls and calls[0] & orjson.OPT_SORT_KEYS
+    assert response.get_data(as_text=True) == f'{{"a":"2024-06-01T09:30:00","b":"{document_id}"}}\n'
+
+
+def test_indented_output_falls_back_to_json(app_module):
+    with app_module.app.test_request_context('/'):
+        assert app_module.app.json.dumps({'a': 1}, indent=2) == '{\n  "a": 1\n}'
+
+
+def test_bulk_submission_requires_authentication(client, db):
+    assert client.post('/api/v1/donations/bulk', json=BULK).status_code == 401
+    response = client.post('/api/v1/donations/bulk', json=BULK, headers={'Authorization': 'Bearer wrong'})
+    assert response.status_code == 401
+    assert db.donations.count_documents({}) == 0
+
+
+def test_bulk_submission_with_partner_token(client, db, monkeypatch):
+    monkeypatch.setattr(api, 'API_TOKENS', ['partner-secret'])
+    headers = {'Authorization': 'Bearer partner-secret'}
+
+    response = client.post('/api/v1/donations/bulk', json=BULK, headers=headers)
+    assert response.status_code == 201
+    assert response.get_json() == {'inserted': 2, 'duplicates': 0}
+
+    # A retry with the same idempotency key stores nothing new
+    db.donations.create_index('idempotency_key', unique=True)
+    response = client.post('/api/v1/donations/bulk', json=BULK, headers=headers)
+    assert response.get_json() == {'inserted': 0, 'duplicates': 2}
+    assert db.donations.count_documents({}) == 2
+
+
+def test_bulk_submission_with_admin_session(client, db):
+    with client.session_transaction() as session:
+        session['admin_email'] = 'admin@annasamarpan.com'
+    assert client.post('/api/v1/donations/bulk', json=BULK).status_code == 201
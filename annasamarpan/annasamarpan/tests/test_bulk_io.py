@@ -0,0 +1,42 @@
+import io
+
+import bulk_io
+
+
+def _import(db, entity, text):
+    return bulk_io.import_stream(db, entity, io.StringIO(text), 'csv')
+
+
+def test_reimport_updates_supplied_columns_and_keeps_the_rest(db):
+    _import(db, 'volunteers', 'name,email,city,availability\nAsha Rao,asha@x,Pune,unavailable\n')
+    created_at = db.volunteers.find_one()['created_at']
+
+    stats = _import(db, 'volunteers', 'name,email,phone\nAsha R,asha@x,9820123456\nRavi,ravi@x,\n')
+
+    assert (stats['read'], stats['rejected'], stats['written']) == (2, 0, 2)
+    asha = db.volunteers.find_one({'email': 'asha@x'})
+    # Left out of the second file: neither reset to the default nor dropped
+    assert asha['availability'] == 'unavailable' and asha['city'] == 'Pune'
+    assert asha['name'] == 'Asha R' and asha['created_at'] == created_at
+    # Search keys cover the stored record, not only the columns of the last file
+    assert {'pune', 'asha r', '9820123456', 'asha@x'} <= set(asha['search_terms'])
+    # New records still get the defaults
+    assert db.volunteers.find_one({'email': 'ravi@x'})['availability'] == 'available'
+
+
+def test_an_explicit_column_overrides_the_stored_value(db):
+    _import(db, 'recipients', 'name,phone,verification_status\nShelter,022 2640 1234,pending\n')
+    _import(db, 'recipients', 'name,phone,verification_status\nShelter,022 2640 1234,verified\n')
+    assert db.recipients.find_one()['verification_status'] == 'verified'
+
+
+def test_unkeyed_rows_are_inserted_with_defaults(db):
+    stats = _import(db, 'donations', 'donor_email,food_type,quantity\nd@x,fruits,5 kg\nd@x,,\n')
+    assert (stats['written'], stats['rejected']) == (1, 1)
+    donation = db.donations.find_one()
+    assert donation['status'] == 'pending' and donation['expiry_date'] > donation['created_at']
+
+
+def test_api_validation_still_fills_defaults():
+    assert bulk_io.validate_row({'name': 'A', 'email': 'a@x'}, 'volunteers')['availability'] == 'available'
+    assert 'availability' not in bulk_io.validate_row({'name': 'A', 'email': 'a@x'}, 'volunteers', defaults=False)
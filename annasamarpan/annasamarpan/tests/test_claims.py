@@ -0,0 +1,83 @@
+import claims
+from geo import make_point
+
+
+def _volunteer(email, active=0, **fields):
+    return {'email': email, 'availability': 'available', 'active_assignments': active, **fields}
+
+
+def test_stale_snapshots_cannot_overbook_a_volunteer(db):
+    db.volunteers.insert_one(_volunteer('v@x', active=2))
+    # Two admins both read the volunteer with one free slot...
+    snapshots = [db.volunteers.find_one({'email': 'v@x'}) for _ in range(2)]
+    assert all(claims.remaining_capacity(v) == 1 for v in snapshots)
+
+    # ...but only the first claim gets it
+    assert claims.claim_volunteer(db.volunteers, {'email': 'v@x'})['active_assignments'] == 3
+    assert claims.claim_volunteer(db.volunteers, {'email': 'v@x'}) is None
+    assert db.volunteers.find_one({'email': 'v@x'})['active_assignments'] == 3
+
+
+def test_repeated_claims_stop_at_capacity(db):
+    db.volunteers.insert_many([_volunteer('a@x'), _volunteer('b@x', capacity=1)])
+    taken = [claims.claim_volunteer(db.volunteers) for _ in range(6)]
+
+    assert sorted(v['email'] for v in taken if v) == ['a@x', 'a@x', 'a@x', 'b@x']
+    assert taken[-2:] == [None, None]
+    assert {v['email']: v['active_assignments'] for v in db.volunteers.find()} == {'a@x': 3, 'b@x': 1}
+
+
+def test_least_loaded_available_volunteer_is_claimed(db):
+    db.volunteers.insert_many([_volunteer('busy@x', active=2), _volunteer('idle@x', active=0),
+                               dict(_volunteer('away@x'), availability='unavailable')])
+    assert claims.claim_volunteer(db.volunteers)['email'] == 'idle@x'
+    assert claims.claim_volunteer(db.volunteers)['email'] == 'idle@x'
+    assert claims.claim_volunteer(db.volunteers, {'email': 'away@x'}) is None
+
+
+def test_multi_slot_claims_need_room_for_every_slot(db):
+    db.volunteers.insert_one(_volunteer('v@x', active=1))
+    assert claims.claim_volunteer(db.volunteers, {'email': 'v@x'}, slots=3) is None
+    assert claims.claim_volunteer(db.volunteers, {'email': 'v@x'}, slots=2)['active_assignments'] == 3
+
+
+def test_release_never_goes_below_zero(db):
+    db.volunteers.insert_one(_volunteer('v@x', active=2))
+    claims.release_volunteer(db.volunteers, 'v@x', slots=3)
+    assert db.volunteers.find_one()['active_assignments'] == 2
+    claims.release_volunteer(db.volunteers, 'v@x', slots=2)
+    claims.release_volunteer(db.volunteers, 'v@x')
+    assert db.volunteers.find_one()['active_assignments'] == 0
+
+
+def test_recount_rebuilds_counters_from_open_assignments(db):
+    db.volunteers.insert_many([_volunteer('a@x', active=7), _volunteer('b@x', active=1), _volunteer('c@x')])
+    db.assignments.insert_many([
+        {'volunteer_email': 'a@x', 'status': 'assigned'},
+        {'volunteer_email': 'a@x', 'status': 'assigned'},
+        {'volunteer_email': 'a@x', 'status': 'completed'},
+        {'volunteer_email': 'b@x', 'status': 'completed'},
+    ])
+    assert claims.recount_active_assignments(db) == 2
+    assert {v['email']: v['active_assignments'] for v in db.volunteers.find()} == {'a@x': 2, 'b@x': 0, 'c@x': 0}
+
+
+def test_assignment_skips_a_full_nearest_volunteer(app_module, db, monkeypatch):
+    # Candidates are the two nearest; the least loaded of them with room wins
+    monkeypatch.setattr(app_module, 'NEAREST_VOLUNTEERS', 2)
+    db.volunteers.insert_many([
+        _volunteer('near@x', active=3, location=make_point(19.070, 72.870)),
+        _volunteer('next@x', active=1, location=make_point(19.080, 72.880)),
+        _volunteer('far@x', location=make_point(28.61, 77.21)),
+    ])
+    with app_module.app.app_context():
+        volunteer, distance = app_module.claim_volunteer_for_donation(
+            {'location': make_point(19.071, 72.871)})
+    assert volunteer['email'] == 'next@x' and distance < 2
+    assert db.volunteers.find_one({'email': 'near@x'})['active_assignments'] == 3
+
+    # Without coordinates the donor's pincode decides
+    db.volunteers.insert_one(_volunteer('local@x', pincode='400050'))
+    with app_module.app.app_context():
+        volunteer, distance = app_module.claim_volunteer_for_donation({}, {'pincode': '400050'})
+    assert (volunteer['email'], distance) == ('local@x', None)
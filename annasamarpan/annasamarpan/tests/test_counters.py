@@ -0,0 +1,54 @@
+from datetime import datetime
+
+import counters
+
+
+def test_increment_updates_totals_and_month(db):
+    when = datetime(2024, 6, 15)
+    counters.increment(db.counters, when=when, monthly={'donations': 1},
+                       total_donations=1, pending_donations=1)
+    counters.increment(db.counters, when=when, pending_donations=-1, completed_deliveries=1,
+                       monthly={'deliveries': 1})
+
+    totals = db.counters.find_one({'_id': counters.TOTALS_ID})
+    assert (totals['total_donations'], totals['pending_donations'], totals['completed_deliveries']) == (1, 0, 1)
+    assert db.counters.find_one({'_id': 'month:2024-06'}) == {'_id': 'month:2024-06', 'donations': 1,
+                                                              'deliveries': 1}
+
+
+def test_zero_deltas_write_nothing(db):
+    counters.increment(db.counters, total_donations=0, monthly={'donations': 0})
+    assert db.counters.count_documents({}) == 0
+
+
+def test_stats_are_cached_until_invalidated(db):
+    counters.increment(db.counters, total_volunteers=2)
+    assert counters.get_stats(db.counters, ttl=60)['total_volunteers'] == 2
+
+    db.counters.update_one({'_id': counters.TOTALS_ID}, {'$inc': {'total_volunteers': 5}})
+    assert counters.get_stats(db.counters, ttl=60)['total_volunteers'] == 2
+    counters.invalidate()
+    assert counters.get_stats(db.counters, ttl=60)['total_volunteers'] == 7
+
+
+def test_reconcile_rebuilds_from_raw_collections(db):
+    june, july = datetime(2024, 6, 3), datetime(2024, 7, 9)
+    db.donations.insert_many([
+        {'status': 'pending', 'created_at': june},
+        {'status': 'completed', 'created_at': june},
+        {'status': 'expired', 'created_at': july},
+    ])
+    db.assignments.insert_one({'status': 'completed', 'assigned_at': july})
+    db.volunteers.insert_many([{'email': 'a@x'}, {'email': 'b@x'}])
+    db.recipients.insert_one({'name': 'Shelter'})
+    # Drifted counters are overwritten
+    counters.increment(db.counters, total_donations=40, monthly={'donations': 9})
+
+    totals, months = counters.reconcile(db)
+
+    assert totals == {'total_donations': 3, 'pending_donations': 1, 'total_volunteers': 2,
+                      'total_recipients': 1, 'completed_deliveries': 1, 'expired_donations': 1}
+    assert months == {'2024-06': {'donations': 2}, '2024-07': {'donations': 1, 'deliveries': 1}}
+    assert db.counters.find_one({'_id': 'month:2024-06'}) == {'_id': 'month:2024-06', 'donations': 2,
+                                                              'deliveries': 0}
+    assert counters.get_stats(db.counters)['total_donations'] == 3
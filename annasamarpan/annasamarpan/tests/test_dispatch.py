@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+from bson.objectid import ObjectId
+
+import counters
+import dispatch
+from geo import make_point
+
+
+def test_volunteers_take_up_to_their_capacity():
+    # Three donations next to volunteer 0 (two slots); volunteer 1 is 10 km further
+    distances = np.array([[1.0, 11.0], [2.0, 12.0], [3.0, 13.0]])
+    matches = dispatch.solve_assignment(distances, np.array([2, 2]), max_distance_km=25)
+
+    assert sorted(column for _, column, _ in matches) == [0, 0, 1]
+    assert sorted(row for row, _, _ in matches) == [0, 1, 2]
+    # Whichever donation overflows to volunteer 1 adds 10 km
+    assert sum(distance for _, _, distance in matches) == 1.0 + 2.0 + 3.0 + 10.0
+
+
+def test_pairs_beyond_the_distance_limit_are_never_matched():
+    distances = np.array([[5.0, 40.0], [30.0, 50.0]])
+    matches = dispatch.solve_assignment(distances, np.array([1, 1]), max_distance_km=25)
+    assert matches == [(0, 0, 5.0)]
+    assert dispatch.solve_assignment(distances, np.array([0, 0])) == []
+    assert dispatch.solve_assignment(np.empty((0, 2)), np.array([1, 1])) == []
+
+
+def test_urgent_donations_win_the_last_slot():
+    # One slot; donation 0 is nearer, donation 1 expires soon
+    distances = np.array([[2.0], [20.0]])
+    assert dispatch.solve_assignment(distances, np.array([1]), max_distance_km=25) == [(0, 0, 2.0)]
+    matches = dispatch.solve_assignment(distances, np.array([1]), max_distance_km=25,
+                                        priorities=np.array([0.0, 0.9]))
+    assert matches == [(1, 0, 20.0)]
+
+
+def test_urgency_scales_with_time_to_expiry():
+    now = datetime(2024, 6, 1, 12)
+    donations = [{'expiry_date': now}, {'expiry_date': now + timedelta(hours=24)},
+                 {'expiry_date': now + timedelta(days=7)}, {}]
+    assert dispatch.urgency(donations, now, horizon_hours=48).tolist() == [1.0, 0.5, 0.0, 0.0]
+
+
+def _plan(db, emails, donations):
+    volunteers = [{'email': email, 'availability': 'available', 'active_assignments': 0, 'capacity': 3,
+                   'location': make_point(19.07, 72.87)} for email in emails]
+    db.volunteers.insert_many(volunteers)
+    db.donations.insert_many(donations)
+    return volunteers
+
+
+def test_commit_releases_slots_of_donations_taken_meanwhile(db):
+    donations = [{'_id': ObjectId(), 'status': 'pending', 'donor_email': 'd@x'} for _ in range(3)]
+    [volunteer] = _plan(db, ['v@x'], donations)
+    counters.increment(db.counters, pending_donations=3)
+    matches = [(donation, volunteer, 1.5) for donation in donations]
+    # Another admin assigns the second donation after the plan was made
+    db.donations.update_one({'_id': donations[1]['_id']}, {'$set': {'status': 'assigned'}})
+
+    committed = dispatch.commit_dispatch(db, matches)
+
+    assert [donation['_id'] for donation, _, _ in committed] == [donations[0]['_id'], donations[2]['_id']]
+    assert db.volunteers.find_one({'email': 'v@x'})['active_assignments'] == 2
+    assert sorted(a['donation_id'] for a in db.assignments.find()) == sorted([donations[0]['_id'],
+                                                                              donations[2]['_id']])
+    assert db.donations.find_one({'_id': donations[1]['_id']}).get('assigned_volunteer') is None
+    assert db.counters.find_one({'_id': counters.TOTALS_ID})['pending_donations'] == 1
+
+
+def test_commit_skips_volunteers_filled_since_the_plan(db):
+    donations = [{'_id': ObjectId(), 'status': 'pending', 'donor_email': 'd@x'} for _ in range(3)]
+    full, free = _plan(db, ['full@x', 'free@x'], donations)
+    db.volunteers.update_one({'email': 'full@x'}, {'$set': {'active_assignments': 2}})
+
+    committed = dispatch.commit_dispatch(db, [(donations[0], full, 1.0), (donations[1], full, 1.0),
+                                              (donations[2], free, 1.0)])
+
+    assert [volunteer['email'] for _, volunteer, _ in committed] == ['free@x']
+    assert db.volunteers.find_one({'email': 'full@x'})['active_assignments'] == 2
+    assert db.donations.count_documents({'status': 'pending'}) == 2
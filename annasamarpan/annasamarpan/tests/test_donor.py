@@ -0,0 +1,48 @@
+import pytest
+
+import counters
+import indexes
+
+FORM = {'name': 'Asha', 'email': 'asha@example.com', 'phone': '9800000000', 'address': '12 MG Road',
+        'city': 'Bengaluru', 'state': 'KA', 'pincode': '560001', 'food_type': 'cooked_meals',
+        'quantity': '20 meals', 'description': 'Rice and dal'}
+
+
+def _totals(db):
+    counters.invalidate()
+    return counters.get_stats(db.counters)
+
+
+def test_retried_submission_is_stored_once(client, db):
+    # No unique index here: the upsert alone suppresses the duplicate
+    form = dict(FORM, idempotency_key='form-token-1')
+    for _ in range(3):
+        assert client.post('/donor', data=form).status_code == 302
+
+    assert db.donations.count_documents({}) == 1
+    assert db.donors.count_documents({}) == 1
+    stats = _totals(db)
+    assert (stats['total_donations'], stats['pending_donations']) == (1, 1)
+    donation = db.donations.find_one()
+    assert donation['idempotency_key'] == 'form-token-1'
+    assert donation['status'] == 'pending' and donation['updated_at'] == donation['created_at']
+
+
+def test_new_submissions_from_the_same_donor(client, db):
+    client.post('/donor', data=dict(FORM, idempotency_key='a'))
+    client.post('/donor', data=dict(FORM, idempotency_key='b'))
+    client.post('/donor', data=FORM)
+
+    assert db.donations.count_documents({}) == 3
+    assert db.donors.count_documents({}) == 1
+    assert _totals(db)['total_donations'] == 3
+
+
+def test_startup_fails_without_the_idempotency_index(app_module, db, monkeypatch):
+    monkeypatch.setattr(indexes, 'ENSURE_INDEXES_ON_STARTUP', False)
+    with pytest.raises(RuntimeError, match='donations.idempotency_key'):
+        app_module.ensure_indexes()
+
+    db.donations.create_index('idempotency_key', unique=True)
+    app_module.ensure_indexes()
+    assert indexes.missing_required_indexes(db) == []
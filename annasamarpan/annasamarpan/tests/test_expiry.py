@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import counters
+import expiry
+
+BASE = datetime(2024, 6, 1, 9, 30)
+
+
+@pytest.mark.parametrize('value,expected', [
+    (datetime(2024, 6, 2, 18), datetime(2024, 6, 2, 18)),
+    ('2024-06-02T18:15', datetime(2024, 6, 2, 18, 15)),
+    # A bare date is good until the end of that day
+    ('2024-06-02', datetime(2024, 6, 2, 23, 59, 59, 999999)),
+    (' 2024-06-02 ', datetime(2024, 6, 2, 23, 59, 59, 999999)),
+])
+def test_explicit_expiry_values(value, expected):
+    assert expiry.parse_expiry(value, 'cooked_meals', BASE) == expected
+
+
+@pytest.mark.parametrize('value', [None, '', '   ', 'tomorrow', '2024-13-45'])
+def test_blank_or_unreadable_values_use_the_shelf_life(value):
+    assert expiry.parse_expiry(value, 'cooked_meals', BASE) == BASE + timedelta(hours=4)
+    assert expiry.parse_expiry(value, 'grains_rice', BASE) == BASE + timedelta(days=180)
+    assert expiry.parse_expiry(value, 'unknown', BASE) == BASE + expiry.DEFAULT_SHELF_LIFE
+
+
+def test_sweep_expires_only_overdue_pending_donations(db):
+    now = datetime(2024, 6, 1, 12)
+    db.donations.insert_many([
+        {'_id': 'overdue', 'status': 'pending', 'expiry_date': now - timedelta(minutes=1)},
+        {'_id': 'due-later', 'status': 'pending', 'expiry_date': now + timedelta(minutes=1)},
+        {'_id': 'assigned', 'status': 'assigned', 'expiry_date': now - timedelta(hours=1)},
+        {'_id': 'no-expiry', 'status': 'pending'},
+    ])
+    counters.increment(db.counters, pending_donations=3)
+
+    assert expiry.sweep(db, now) == 1
+    assert {d['_id']: d['status'] for d in db.donations.find()} == {
+        'overdue': 'expired', 'due-later': 'pending', 'assigned': 'assigned', 'no-expiry': 'pending'}
+    overdue = db.donations.find_one({'_id': 'overdue'})
+    assert overdue['expired_at'] == overdue['updated_at'] == now
+    totals = db.counters.find_one({'_id': counters.TOTALS_ID})
+    assert (totals['pending_donations'], totals['expired_donations']) == (2, 1)
+
+    # Nothing new to sweep, and the counters are left alone
+    assert expiry.sweep(db, now) == 0
+    assert db.counters.find_one({'_id': counters.TOTALS_ID})['expired_donations'] == 1
+
+
+def test_pending_queue_is_soonest_expiry_first(db):
+    now = datetime(2024, 6, 1, 12)
+    db.donations.insert_many([
+        {'_id': i, 'status': 'pending', 'expiry_date': now + timedelta(hours=hours)}
+        for i, hours in enumerate([5, -1, 2, 9, 1])
+    ])
+    assert [d['_id'] for d in expiry.pending_queue(db.donations, limit=3, now=now)] == [4, 2, 0]
@@ -0,0 +1,63 @@
+import random
+
+import pytest
+
+from geo import VolunteerGrid, find_nearest_volunteers, haversine_km, make_point
+
+MUMBAI = (19.076, 72.8777)
+
+
+def _volunteers(count, seed=7, spread=3.0):
+    rng = random.Random(seed)
+    return [{'email': f'v{i}@x', 'location': make_point(MUMBAI[0] + rng.uniform(-spread, spread),
+                                                       MUMBAI[1] + rng.uniform(-spread, spread))}
+            for i in range(count)]
+
+
+def _brute_force(volunteers, lat, lon, k, max_distance_km=None):
+    ranked = sorted((float(haversine_km(lat, lon, [v['location']['coordinates'][1]],
+                                        [v['location']['coordinates'][0]])[0]), v['email']) for v in volunteers)
+    if max_distance_km is not None:
+        ranked = [row for row in ranked if row[0] <= max_distance_km]
+    return ranked[:k]
+
+
+def test_make_point_rejects_missing_and_out_of_range_coordinates():
+    assert make_point(19.1, 72.9) == {'type': 'Point', 'coordinates': [72.9, 19.1]}
+    assert make_point('19.1', '72.9')['coordinates'] == [72.9, 19.1]
+    assert make_point(0, 0) is None
+    assert make_point(None, 72.9) is None
+    assert make_point(91, 72.9) is None and make_point(19.1, 181) is None
+
+
+@pytest.mark.parametrize('k,max_distance_km', [(1, None), (5, None), (20, None), (5, 40), (50, 120), (500, None)])
+def test_grid_matches_a_brute_force_scan(k, max_distance_km):
+    volunteers = _volunteers(300)
+    grid = VolunteerGrid(volunteers)
+    for lat, lon in [MUMBAI, (MUMBAI[0] + 2.5, MUMBAI[1] - 2.9), (12.97, 77.59)]:
+        found = [(round(distance, 6), v['email']) for v, distance in grid.nearest(lat, lon, k, max_distance_km)]
+        expected = [(round(distance, 6), email) for distance, email in _brute_force(volunteers, lat, lon, k,
+                                                                                   max_distance_km)]
+        assert found == expected
+
+
+def test_grid_ignores_volunteers_without_a_location():
+    grid = VolunteerGrid([{'email': 'a@x'}, {'email': 'b@x', 'location': make_point(*MUMBAI)}])
+    assert [v['email'] for v, _ in grid.nearest(MUMBAI[0], MUMBAI[1], 5)] == ['b@x']
+    assert VolunteerGrid([]).nearest(MUMBAI[0], MUMBAI[1], 5) == []
+
+
+def test_without_geo_queries_the_grid_answers_with_the_same_filter(db):
+    volunteers = _volunteers(40, spread=0.5)
+    for i, volunteer in enumerate(volunteers):
+        volunteer['availability'] = 'available' if i % 2 else 'busy'
+    db.volunteers.insert_many(volunteers + [{'email': 'nowhere@x', 'availability': 'available'}])
+
+    # mongomock has no $nearSphere, like a database without the 2dsphere index
+    found = find_nearest_volunteers(db.volunteers, *MUMBAI, k=4, query={'availability': 'available'})
+
+    available = [v for v in volunteers if v['availability'] == 'available']
+    assert [(v['email'], round(d, 6)) for v, d in found] == \
+        [(email, round(d, 6)) for d, email in _brute_force(available, *MUMBAI, 4)]
+    assert find_nearest_volunteers(db.volunteers, 28.61, 77.21, k=4, max_distance_km=10,
+                                   query={'availability': 'available'}) == []
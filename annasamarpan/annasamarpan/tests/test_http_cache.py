@@ -0,0 +1,123 @@
+import gzip
+
+import pytest
+from flask import Flask, flash, jsonify
+
+import http_cache
+
+BODY = '<html>' + 'Annasamarpan impact ' * 100 + '</html>'
+
+
+@pytest.fixture
+def site():
+    http_cache.page_cache.clear()
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    http_cache.init_app(app)
+    app.renders = 0
+    app.version = 1
+
+    @app.route('/page', methods=['GET', 'POST'])
+    @http_cache.cached(version=lambda: app.version)
+    def page():
+        app.renders += 1
+        return BODY
+
+    @app.route('/flash')
+    def flash_then_page():
+        flash('Saved')
+        return 'ok'
+
+    @app.route('/missing')
+    @http_cache.cached()
+    def missing():
+        app.renders += 1
+        return 'gone', 404
+
+    @app.route('/api')
+    def api():
+        return jsonify(items=list(range(500)))
+
+    @app.route('/tiny')
+    def tiny():
+        return 'hi'
+
+    yield app
+    http_cache.page_cache.clear()
+
+
+def test_repeat_requests_revalidate_with_the_etag(site):
+    client = site.test_client()
+    first = client.get('/page')
+    assert first.status_code == 200 and first.get_data(as_text=True) == BODY
+    etag, weak = first.get_etag()
+    assert weak and first.headers['Cache-Control'] == 'no-cache' and first.last_modified
+
+    again = client.get('/page', headers={'If-None-Match': f'W/"{etag}"'})
+    assert again.status_code == 304 and again.get_data() == b''
+    since = client.get('/page', headers={'If-Modified-Since': first.headers['Last-Modified']})
+    assert since.status_code == 304
+    assert site.renders == 1
+
+
+def test_a_new_version_renders_again_with_a_new_etag(site):
+    client = site.test_client()
+    etag = client.get('/page').get_etag()[0]
+    site.version = 2
+    response = client.get('/page', headers={'If-None-Match': f'W/"{etag}"'})
+    # Same body, so the same ETag: the client's copy is still good
+    assert response.status_code == 304 and site.renders == 2
+
+    site.version = 3
+    assert client.get('/page').status_code == 200 and site.renders == 3
+
+
+def test_cached_pages_are_served_compressed(site):
+    client = site.test_client()
+    plain = client.get('/page')
+    zipped = client.get('/page', headers={'Accept-Encoding': 'gzip'})
+
+    assert 'Content-Encoding' not in plain.headers
+    assert zipped.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(zipped.get_data()).decode() == BODY
+    assert zipped.get_etag() == plain.get_etag()
+    assert 'Accept-Encoding' in zipped.headers['Vary']
+    assert site.renders == 1
+
+
+def test_flashes_posts_and_errors_bypass_the_cache(site):
+    client = site.test_client()
+    client.get('/page')
+    client.post('/page')
+    assert site.renders == 2
+
+    client.get('/flash')
+    assert client.get('/page').status_code == 200 and site.renders == 3
+
+    assert client.get('/missing').status_code == 404
+    assert client.get('/missing').status_code == 404
+    assert site.renders == 5
+
+
+def test_other_text_responses_are_compressed_when_large_enough(site):
+    client = site.test_client()
+    response = client.get('/api', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert b'"items"' in gzip.decompress(response.get_data())
+    assert 'Content-Encoding' not in client.get('/tiny', headers={'Accept-Encoding': 'gzip'}).headers
+
+
+def test_page_cache_evicts_the_least_recently_used():
+    cache = http_cache.PageCache(max_entries=2)
+    for key in 'abc':
+        if key == 'c':
+            cache.get('a')
+        cache.put(key, http_cache.CachedPage(key.encode(), 'text/html'))
+    assert cache.get('b') is None and cache.get('a') and cache.get('c')
+
+
+def test_public_pages_use_the_cache(client):
+    http_cache.page_cache.clear()
+    first = client.get('/about')
+    assert first.status_code == 200
+    assert client.get('/about', headers={'If-None-Match': first.headers['ETag']}).status_code == 304
@@ -0,0 +1,83 @@
+import pytest
+
+import live
+
+
+@pytest.fixture
+def admin(client):
+    with client.session_transaction() as session:
+        session['admin_email'] = 'admin@annasamarpan.com'
+    # Streams are served by the development server (and gevent workers)
+    client.environ_base['SERVER_SOFTWARE'] = 'Werkzeug/2.3.7'
+    return client
+
+
+@pytest.fixture
+def broker(monkeypatch):
+    broker = live.Broker(max_subscribers=2)
+    monkeypatch.setattr(live, 'broker', broker)
+    monkeypatch.setattr(live, 'LIVE_HEARTBEAT', 0.01)
+    # No change streams here: the app's own writes are published in-process
+    watcher = live.ChangeWatcher(None, broker)
+    watcher.supported = False
+    monkeypatch.setattr(live, '_watcher', watcher)
+    return broker
+
+
+def test_events_require_a_session(client):
+    assert client.get('/api/v1/events').status_code == 401
+
+
+def test_thread_pool_workers_refuse_streams(admin, broker):
+    response = admin.get('/api/v1/events', environ_base={'SERVER_SOFTWARE': 'gunicorn/21.2.0'})
+    assert response.status_code == 503 and 'gevent' in response.get_json()['error']
+    assert not broker.subscribers
+
+
+def test_stream_sends_retry_heartbeat_and_events(admin, broker):
+    response = admin.get('/api/v1/events', buffered=False)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    chunks = (chunk.decode() for chunk in response.response)
+
+    assert next(chunks).startswith('retry: ')
+    # Nothing published yet: an idle stream gets keep-alive comments
+    assert next(chunks) == ': keep-alive\n\n'
+
+    live.broker.publish(live.make_event('donations', 'update', 'd1', {'status': 'completed'}))
+    assert next(chunks).startswith('event: change\ndata: ')
+    response.close()
+    assert not broker.subscribers
+
+
+def test_cap_rejects_streams_until_one_disconnects(admin, broker):
+    streams = [admin.get('/api/v1/events', buffered=False) for _ in range(2)]
+    for stream in streams:
+        # The subscription is taken when the stream starts
+        next(iter(stream.response))
+    assert len(broker.subscribers) == 2
+
+    assert admin.get('/api/v1/events').status_code == 503
+
+    # A closed client connection releases its slot
+    streams[0].close()
+    assert len(broker.subscribers) == 1
+    replacement = admin.get('/api/v1/events', buffered=False)
+    assert replacement.status_code == 200
+    for stream in (replacement, streams[1]):
+        stream.close()
+    assert not broker.subscribers
+
+
+def test_app_writes_reach_streams_without_change_streams(broker):
+    subscription = broker.subscribe()
+    live.publish('donations', 'insert', {'_id': 'd2', 'status': 'pending'})
+    assert subscription.get(0)['document'] == {'status': 'pending'}
+
+
+def test_volunteer_only_receives_own_changes(broker):
+    mine = broker.subscribe('a@x')
+    broker.publish(live.make_event('assignments', 'insert', 1, {'volunteer_email': 'b@x'}))
+    broker.publish(live.make_event('assignments', 'insert', 2, {'volunteer_email': 'a@x'}))
+    assert mine.get(0)['id'] == 2
+    assert mine.get(0) is None
@@ -0,0 +1,22 @@
+import metrics
+
+
+def test_metrics_need_an_admin_or_a_scraper_token(client, monkeypatch):
+    monkeypatch.setattr(metrics, 'METRICS_TOKENS', ['scrape-secret'])
+    client.get('/about')
+
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+
+    response = client.get('/metrics', headers={'Authorization': 'Bearer scrape-secret'})
+    assert response.status_code == 200
+    assert b'annasamarpan_requests_total' in response.data
+
+    with client.session_transaction() as session:
+        session['admin_email'] = 'admin@annasamarpan.com'
+    assert client.get('/metrics').status_code == 200
+
+
+def test_no_tokens_means_admins_only(client, monkeypatch):
+    monkeypatch.setattr(metrics, 'METRICS_TOKENS', [])
+    assert client.get('/metrics', headers={'Authorization': 'Bearer '}).status_code == 401
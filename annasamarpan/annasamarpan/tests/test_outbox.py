@@ -0,0 +1,134 @@
+import socket
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import outbox
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_server():
+    """In-process SMTP server collecting (recipients, message) pairs"""
+    controller_module = pytest.importorskip('aiosmtpd.controller')
+    received = []
+
+    class Handler:
+        async def handle_DATA(self, server, session, envelope):
+            received.append((envelope.rcpt_tos, envelope.content.decode()))
+            return '250 OK'
+
+    controller = controller_module.Controller(Handler(), hostname='127.0.0.1', port=_free_port())
+    controller.start()
+    controller.received = received
+    yield controller
+    controller.stop()
+
+
+def _config(port):
+    return {'MAIL_SERVER': '127.0.0.1', 'MAIL_PORT': port, 'MAIL_USE_TLS': False,
+            'MAIL_DEFAULT_SENDER': 'noreply@annasamarpan.com'}
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_worker_pool_delivers_queued_messages(db, smtp_server):
+    for i in range(5):
+        outbox.enqueue(db.email_outbox, f'volunteer{i}@example.com', 'New assignment', f'Pickup {i}')
+
+    pool = outbox.OutboxWorkerPool(db.email_outbox, _config(smtp_server.port), workers=2, poll_interval=0.05)
+    pool.start()
+    try:
+        assert _wait_for(lambda: db.email_outbox.count_documents({'status': 'sent'}) == 5)
+    finally:
+        pool.stop()
+
+    assert sorted(rcpt for rcpts, _ in smtp_server.received for rcpt in rcpts) == [
+        f'volunteer{i}@example.com' for i in range(5)]
+    assert all('From: noreply@annasamarpan.com' in content for _, content in smtp_server.received)
+    sent = db.email_outbox.find_one({'to': 'volunteer0@example.com'})
+    assert sent['attempts'] == 1 and 'locked_by' not in sent
+
+
+def test_failed_sends_back_off_then_fail(db, monkeypatch):
+    monkeypatch.setattr(outbox, 'OUTBOX_MAX_ATTEMPTS', 2)
+    message_id = outbox.enqueue(db.email_outbox, 'a@example.com', 'Subject', 'Body')
+    # Nothing listens on this port
+    connection = outbox.SMTPConnection(outbox.smtp_settings(_config(_free_port())))
+
+    batch = outbox.claim_batch(db.email_outbox, 'w1')
+    outbox.deliver_batch(db.email_outbox, connection, batch, 'noreply@annasamarpan.com')
+    message = db.email_outbox.find_one({'_id': message_id})
+    assert message['status'] == 'queued' and message['attempts'] == 1
+    assert message['next_attempt_at'] > datetime.now() + timedelta(seconds=outbox.OUTBOX_RETRY_BASE - 5)
+    # Not due yet
+    assert outbox.claim_batch(db.email_outbox, 'w1') == []
+
+    db.email_outbox.update_one({'_id': message_id}, {'$set': {'next_attempt_at': datetime.now()}})
+    outbox.deliver_batch(db.email_outbox, connection, outbox.claim_batch(db.email_outbox, 'w1'),
+                         'noreply@annasamarpan.com')
+    assert db.email_outbox.find_one({'_id': message_id})['status'] == 'failed'
+
+
+def test_claims_are_exclusive_and_stale_locks_are_requeued(db):
+    for i in range(3):
+        outbox.enqueue(db.email_outbox, f'{i}@example.com', 'Subject', 'Body')
+
+    first = outbox.claim_batch(db.email_outbox, 'w1', batch_size=2)
+    second = outbox.claim_batch(db.email_outbox, 'w2', batch_size=2)
+    assert len(first) == 2 and len(second) == 1
+    assert not {m['_id'] for m in first} & {m['_id'] for m in second}
+
+    # A worker that crashed mid-send leaves its lock behind
+    db.email_outbox.update_many({'locked_by': 'w1'},
+                                {'$set': {'locked_at': datetime.now() - outbox.OUTBOX_LOCK_TIMEOUT * 2}})
+    assert {m['_id'] for m in outbox.claim_batch(db.email_outbox, 'w3')} == {m['_id'] for m in first}
+
+
+def test_a_claim_skips_messages_another_worker_took_first(db):
+    ids = [outbox.enqueue(db.email_outbox, f'{i}@example.com', 'Subject', 'Body') for i in range(3)]
+
+    class Racing:
+        """The outbox, with worker w2 claiming one message just before w1's update"""
+
+        def __getattr__(self, name):
+            return getattr(db.email_outbox, name)
+
+        def update_many(self, *args, **kwargs):
+            outbox.claim_batch(db.email_outbox, 'w2', batch_size=1)
+            return db.email_outbox.update_many(*args, **kwargs)
+
+    claimed = outbox.claim_batch(Racing(), 'w1')
+    assert [m['_id'] for m in claimed] == ids[1:]
+    assert db.email_outbox.find_one({'_id': ids[0]})['locked_by'] == 'w2'
+    assert len({m['claim_token'] for m in db.email_outbox.find()}) == 2
+
+    outbox.deliver_batch(db.email_outbox, outbox.SMTPConnection(outbox.smtp_settings(_config(_free_port()))),
+                         claimed, 'noreply@annasamarpan.com')
+    assert all('claim_token' not in m for m in db.email_outbox.find({'_id': {'$in': ids[1:]}}))
+
+
+def test_workers_refuse_to_start_without_a_sender(db):
+    with pytest.raises(RuntimeError, match='MAIL_DEFAULT_SENDER'):
+        outbox.OutboxWorkerPool(db.email_outbox, {'MAIL_SERVER': '127.0.0.1'})
+
+
+def test_handlers_only_enqueue(app_module, db):
+    app_module.send_volunteer_notification('v@example.com', {
+        'food_type': 'cooked_meals', 'quantity': '10 meals', 'description': 'Rice',
+        'pickup_address': 'MG Road', 'donor_email': 'd@example.com'})
+    message = db.email_outbox.find_one()
+    assert message['to'] == 'v@example.com' and message['status'] == 'queued'
@@ -0,0 +1,46 @@
+from datetime import datetime, timedelta
+
+from pagination import decode_cursor, encode_cursor, fetch_page
+
+SORT = [('created_at', -1), ('_id', -1)]
+
+
+def _seed(collection, count):
+    start = datetime(2024, 6, 1)
+    # Pairs share a timestamp so the _id tiebreak matters
+    collection.insert_many([{'_id': i, 'created_at': start + timedelta(minutes=i // 2), 'even': i % 2 == 0}
+                            for i in range(count)])
+
+
+def test_pages_cover_every_document_once(db):
+    _seed(db.donations, 23)
+    seen, cursor = [], None
+    while True:
+        page, cursor = fetch_page(db.donations, {}, SORT, 5, cursor)
+        seen.extend(d['_id'] for d in page)
+        if cursor is None:
+            break
+    assert seen == list(range(22, -1, -1))
+
+
+def test_filter_is_kept_across_pages(db):
+    _seed(db.donations, 20)
+    query = {'even': True}
+    first, cursor = fetch_page(db.donations, query, SORT, 4)
+    second, last = fetch_page(db.donations, query, SORT, 4, cursor)
+    assert [d['_id'] for d in first + second] == [18, 16, 14, 12, 10, 8, 6, 4]
+    assert last is not None
+
+
+def test_last_full_page_has_no_cursor(db):
+    _seed(db.donations, 10)
+    page, cursor = fetch_page(db.donations, {}, SORT, 10)
+    assert len(page) == 10 and cursor is None
+
+
+def test_cursor_round_trip_and_invalid_tokens():
+    document = {'created_at': datetime(2024, 6, 1, 12), '_id': 7}
+    assert decode_cursor(encode_cursor(document, SORT), SORT) == [datetime(2024, 6, 1, 12), 7]
+    assert decode_cursor('not-a-cursor', SORT) is None
+    assert decode_cursor(encode_cursor(document, SORT[:1]), SORT) is None
+    assert decode_cursor(None, SORT) is None
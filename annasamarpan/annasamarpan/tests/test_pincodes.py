@@ -0,0 +1,72 @@
+import io
+
+import pytest
+
+import pincodes
+
+SAMPLE = """pincode,latitude,longitude
+400050,19.0596,72.8295
+400051,19.0550,72.8400
+400053,19.1300,72.8300
+560001,12.9716,77.5946
+560001,12.9730,77.5960
+110001,NA,NA
+"""
+
+
+@pytest.fixture
+def index(monkeypatch):
+    index = pincodes.PincodeIndex.from_rows(pincodes.read_source(io.StringIO(SAMPLE)))
+    monkeypatch.setattr(pincodes, '_index', index)
+    return index
+
+
+def test_exact_match(index):
+    assert index.resolve('400050') == ((19.0596, 72.8295), pincodes.EXACT)
+    assert index.resolve(' 400 050 ')[1] == pincodes.EXACT
+    # Repeated post offices of one pincode are averaged
+    assert index.lookup(560001) == (12.9723, 77.5953)
+
+
+def test_unknown_pincode_falls_back_to_its_district(index):
+    found, source = index.resolve('400099')
+    assert source == pincodes.DISTRICT
+    assert found == (19.08153, 72.83317)
+    assert index.lookup('400099', district_fallback=False) is None
+
+
+def test_unknown_district_and_invalid_pincodes(index):
+    # 110001 had no coordinates, so Delhi's district is absent
+    for pincode in ('110001', '999999', '012345', '4000', 'abcdef', None):
+        assert index.resolve(pincode) == (None, None)
+        assert pincodes.location_fields(pincode) == {}
+
+
+def test_location_fields_record_how_the_point_was_found(index):
+    assert pincodes.location_fields('400050') == {
+        'location': {'type': 'Point', 'coordinates': [72.8295, 19.0596]}, 'location_source': 'pincode'}
+    assert pincodes.location_fields('400099')['location_source'] == 'pincode_district'
+
+
+def test_built_table_round_trips(index, tmp_path):
+    path = str(tmp_path / 'pincodes.npy')
+    index.save(path)
+    loaded = pincodes.PincodeIndex.load(path)
+    assert len(loaded) == len(index) == 4
+    assert loaded.resolve('400099') == index.resolve('400099')
+
+
+def test_bundled_sample_loads():
+    sample = pincodes.PincodeIndex.load(pincodes.SAMPLE_PATH)
+    assert len(sample) > 0
+    assert sample.resolve('400050')[1] == pincodes.EXACT
+
+
+def test_registrations_store_the_fallback(client, db, index):
+    form = {'name': 'Asha', 'email': 'asha@example.com', 'phone': '1', 'address': 'a', 'city': 'Mumbai',
+            'state': 'MH', 'food_type': 'bakery', 'quantity': '2 kg', 'description': 'Bread'}
+    client.post('/donor', data=dict(form, pincode='400099', idempotency_key='k1'))
+    client.post('/donor', data=dict(form, email='ravi@example.com', pincode='110005', idempotency_key='k2'))
+
+    assert db.donors.find_one({'email': 'asha@example.com'})['location_source'] == 'pincode_district'
+    assert 'location' not in db.donors.find_one({'email': 'ravi@example.com'})
@@ -0,0 +1,61 @@
+import os
+import subprocess
+import sys
+
+from flask import Flask
+from pymongo import MongoClient
+from pymongo.read_preferences import Primary, SecondaryPreferred
+
+import api
+import replicas
+from conftest import APP_DIR
+
+
+def test_init_app_accepts_replica_routed_database():
+    # A real driver Database raises on bool(); mongomock does not
+    database = MongoClient('mongodb://localhost:27017/', connect=False).annasamarpan
+    analytics = replicas.analytics_database(database)
+    app = Flask(__name__)
+
+    api.init_app(app, database, analytics)
+
+    assert app.extensions['annasamarpan_db'] is database
+    assert app.extensions['annasamarpan_analytics_db'] is analytics
+    assert isinstance(analytics.read_preference, SecondaryPreferred)
+    assert analytics.read_preference.max_staleness == replicas.MAX_STALENESS_SECONDS
+
+
+def test_app_factory_imports_with_the_real_driver():
+    # wsgi.py, gunicorn's on_starting and the CLIs all import the app module
+    env = dict(os.environ, MONGO_URI='mongodb://localhost:27017/?replicaSet=rs0', READ_ROUTING='true')
+    result = subprocess.run(
+        [sys.executable, '-c', 'import wsgi'],
+        cwd=APP_DIR, env=env, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+
+
+def test_analytics_reads_prefer_secondaries(app_module, monkeypatch):
+    monkeypatch.setattr(replicas, 'READ_ROUTING', True)
+    with app_module.app.test_request_context('/'):
+        analytics = app_module.get_analytics_db()
+    assert isinstance(analytics.read_preference, SecondaryPreferred)
+
+
+def test_routing_off_reads_the_primary(app_module, monkeypatch):
+    monkeypatch.setattr(replicas, 'READ_ROUTING', False)
+    with app_module.app.test_request_context('/'):
+        assert isinstance(app_module.get_analytics_db().read_preference, Primary)
+
+
+def test_session_reads_primary_after_a_write(app_module, monkeypatch):
+    monkeypatch.setattr(replicas, 'READ_ROUTING', True)
+    with app_module.app.test_request_context('/'):
+        from flask import session
+
+        replicas.note_write(session)
+        assert replicas.prefers_primary(session)
+        assert isinstance(app_module.get_analytics_db().read_preference, Primary)
+
+        session[replicas.STICKY_KEY] = 0
+        assert not replicas.prefers_primary(session)
+        assert isinstance(app_module.get_analytics_db().read_preference, SecondaryPreferred)
@@ -0,0 +1,112 @@
+from datetime import datetime, timedelta
+
+import rollups
+
+T0 = datetime(2024, 7, 2)
+
+
+def _donation(donor_email, created_at, quantity, status, food_type='cooked_meals', updated_at=None):
+    return {'donor_email': donor_email, 'created_at': created_at, 'quantity': quantity, 'status': status,
+            'food_type': food_type, 'updated_at': updated_at or created_at}
+
+
+def _bucket(db, collection, **key):
+    document = db[collection].find_one(key)
+    return {field: document[field] for field in ('donations', 'delivered', 'meals_donated', 'meals_delivered')}
+
+
+def _seed(db):
+    db.donors.insert_many([{'email': 'pune@x', 'city': 'Pune'}, {'email': 'delhi@x', 'city': 'Delhi'}])
+    db.donations.insert_many([
+        _donation('pune@x', datetime(2024, 6, 3, 9), '20 meals', 'completed'),
+        _donation('pune@x', datetime(2024, 6, 3, 18), ' 5 Meals', 'pending'),
+        _donation('pune@x', datetime(2024, 6, 3, 19), '12 kg', 'completed'),
+        # Too large for a 64-bit integer: a donation without meals, not a failed refresh
+        _donation('delhi@x', datetime(2024, 6, 4), '99999999999999999999 meals', 'completed'),
+        _donation('nobody@x', datetime(2024, 7, 1), '8 meals', 'completed', food_type=None),
+    ])
+    db['donations_archive_2024_06'].insert_one(_donation('pune@x', datetime(2024, 6, 3, 7), '10 meals', 'completed'))
+
+
+def test_full_refresh_buckets_by_day_city_and_food_type(server_db):
+    db = server_db
+    _seed(db)
+
+    assert rollups.refresh(db, now=T0) == (None, None)
+
+    # Three hot donations and one archived one on the same day and city
+    assert _bucket(db, rollups.DAILY, day='2024-06-03', city='Pune', food_type='cooked_meals') == {
+        'donations': 4, 'delivered': 3, 'meals_donated': 35, 'meals_delivered': 30}
+    assert _bucket(db, rollups.DAILY, day='2024-06-04', city='Delhi', food_type='cooked_meals') == {
+        'donations': 1, 'delivered': 1, 'meals_donated': 0, 'meals_delivered': 0}
+    assert _bucket(db, rollups.DAILY, day='2024-07-01', city='Unknown', food_type='other')['meals_delivered'] == 8
+    assert _bucket(db, rollups.MONTHLY, month='2024-06', city='Pune', food_type='cooked_meals')['donations'] == 4
+    assert db[rollups.MONTHLY].count_documents({}) == 3
+    assert db[rollups.STATE].find_one()['watermark'] == T0
+
+
+def test_incremental_refresh_recomputes_only_touched_days(server_db):
+    db = server_db
+    _seed(db)
+    rollups.refresh(db, now=T0)
+
+    later = T0 + timedelta(hours=1)
+    db.donations.update_one({'quantity': ' 5 Meals'}, {'$set': {'status': 'completed', 'updated_at': later}})
+    db.donations.insert_one(_donation('delhi@x', datetime(2024, 6, 4, 10), '7 meals', 'completed',
+                                      updated_at=later))
+
+    days, months = rollups.refresh(db, now=T0 + timedelta(hours=2))
+
+    assert sorted(days) == ['2024-06-03', '2024-06-04'] and months == ['2024-06']
+    assert _bucket(db, rollups.DAILY, day='2024-06-03', city='Pune', food_type='cooked_meals') == {
+        'donations': 4, 'delivered': 4, 'meals_donated': 35, 'meals_delivered': 35}
+    assert _bucket(db, rollups.MONTHLY, month='2024-06', city='Delhi', food_type='cooked_meals') == {
+        'donations': 2, 'delivered': 2, 'meals_donated': 7, 'meals_delivered': 7}
+    # July was not touched, so its buckets keep their first refresh
+    assert db[rollups.DAILY].find_one({'day': '2024-07-01'})['refreshed_at'] == T0
+    assert db[rollups.MONTHLY].find_one({'month': '2024-07'})['refreshed_at'] == T0
+
+    assert rollups.refresh(db, now=T0 + timedelta(hours=3)) == ([], [])
+
+
+def test_day_ranges_cover_whole_days():
+    assert rollups._day_ranges({'2024-06-04', '2024-06-03'}) == {'$or': [
+        {'created_at': {'$gte': datetime(2024, 6, 3), '$lt': datetime(2024, 6, 4)}},
+        {'created_at': {'$gte': datetime(2024, 6, 4), '$lt': datetime(2024, 6, 5)}},
+    ]}
+
+
+def _month(months_ago):
+    day = datetime.now().replace(day=1)
+    for _ in range(months_ago):
+        day = (day - timedelta(days=1)).replace(day=1)
+    return day.strftime('%Y-%m')
+
+
+def test_trends_sum_the_monthly_buckets_of_the_last_year(db):
+    def bucket(month, city, food_type, donations, meals):
+        return {'month': month, 'city': city, 'food_type': food_type, 'donations': donations,
+                'delivered': donations, 'meals_donated': meals, 'meals_delivered': meals}
+
+    db[rollups.MONTHLY].insert_many([
+        bucket(_month(0), 'Pune', 'cooked_meals', 3, 60),
+        bucket(_month(0), 'Delhi', 'fruits', 5, 0),
+        bucket(_month(2), 'Pune', 'fruits', 4, 0),
+        bucket(_month(12), 'Delhi', 'cooked_meals', 50, 900),
+    ])
+
+    trends = rollups.get_trends(db, ttl=60)
+
+    assert trends['months'] == [
+        {'month': _month(2), 'donations': 4, 'delivered': 4, 'meals_donated': 0, 'meals_delivered': 0},
+        {'month': _month(0), 'donations': 8, 'delivered': 8, 'meals_donated': 60, 'meals_delivered': 60},
+    ]
+    assert [(row['city'], row['donations']) for row in trends['cities']] == [('Pune', 7), ('Delhi', 5)]
+    assert [(row['food_type'], row['donations']) for row in trends['food_types']] == [('fruits', 9),
+                                                                                     ('cooked_meals', 3)]
+
+    # Served from the cache until a refresh invalidates it
+    db[rollups.MONTHLY].delete_many({})
+    assert rollups.get_trends(db, ttl=60) == trends
+    rollups.invalidate()
+    assert rollups.get_trends(db, ttl=60)['months'] == []
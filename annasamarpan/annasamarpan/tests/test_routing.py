@@ -0,0 +1,103 @@
+import itertools
+import math
+import random
+from datetime import datetime, timedelta
+
+from bson.objectid import ObjectId
+
+import routing
+from geo import make_point
+
+NOW = datetime(2024, 6, 1, 12)
+
+
+def euclidean(lat1, lon1, lat2, lon2):
+    return math.hypot(lat1 - lat2, lon1 - lon2)
+
+
+def _length(start, pickups, order, end=None):
+    nodes = [start] + [pickups[i] for i in order] + ([end] if end else [])
+    return sum(euclidean(*a, *b) for a, b in zip(nodes, nodes[1:]))
+
+
+def test_route_visits_every_pickup_and_reports_its_legs():
+    order, legs, total = routing.plan_route((0, 0), [(3, 0), (1, 0), (2, 0)], euclidean)
+    assert order == [1, 2, 0]
+    assert legs == [1, 1, 1] and total == 3
+
+
+def test_two_opt_untangles_a_crossing_route():
+    # Nearest neighbour climbs to (0, 2), doubles back to (1, 0) and crosses its own path to (2, 3)
+    pickups = [(0, 1), (0, 2), (1, 0), (2, 3)]
+    assert math.isclose(_length((0, 0), pickups, [0, 1, 2, 3]), 2 + math.sqrt(5) + math.sqrt(10))
+
+    order, legs, total = routing.plan_route((0, 0), pickups, euclidean)
+    assert order == [2, 0, 1, 3]
+    assert math.isclose(total, 1 + math.sqrt(2) + 1 + math.sqrt(5))
+
+    # With a drop-off the last leg is reported after the pickups
+    order, legs, total = routing.plan_route((0, 0), pickups, euclidean, end=(3, 3))
+    assert len(legs) == len(pickups) + 1 and math.isclose(legs[-1], euclidean(*pickups[order[-1]], 3, 3))
+
+
+def test_routes_are_two_opt_optimal_and_close_to_the_best_order():
+    rng = random.Random(3)
+    for _ in range(40):
+        start = (rng.random(), rng.random())
+        pickups = [(rng.random(), rng.random()) for _ in range(6)]
+        end = (rng.random(), rng.random()) if rng.random() < 0.5 else None
+        order, legs, total = routing.plan_route(start, pickups, euclidean, end)
+
+        assert sorted(order) == list(range(6))
+        assert math.isclose(total, _length(start, pickups, order, end))
+        assert math.isclose(sum(legs), total)
+        # No segment reversal shortens it
+        for i, j in itertools.combinations(range(7), 2):
+            reversed_order = order[:i] + order[i:j][::-1] + order[j:]
+            assert _length(start, pickups, reversed_order, end) >= total - 1e-9
+        best = min(_length(start, pickups, list(p), end) for p in itertools.permutations(range(6)))
+        assert total <= best * 1.25
+
+
+def _donation(hours, lat, lon):
+    return ({'_id': ObjectId(), 'expiry_date': NOW + timedelta(hours=hours)}, make_point(lat, lon))
+
+
+def test_pickups_cluster_by_distance_and_expiry_window():
+    located = [
+        _donation(3, 19.070, 72.870),   # seeds the batch of close pickups
+        _donation(4, 19.075, 72.872),   # 0.6 km away
+        _donation(2, 19.200, 72.970),   # 17 km away: its own batch
+        _donation(30, 19.071, 72.871),  # next door but expires a day later
+        _donation(5, 19.060, 72.860),   # 1.5 km away
+    ]
+    batches = routing.cluster_pickups(located, radius_km=2, window=timedelta(hours=6), max_stops=5, now=NOW)
+
+    # Seeds are taken soonest expiry first; members after the seed are nearest first
+    assert batches == [[2], [0, 1, 4], [3]]
+
+
+def test_batches_are_capped_at_max_stops():
+    located = [_donation(1, 19.07 + i * 0.001, 72.87) for i in range(7)]
+    batches = routing.cluster_pickups(located, radius_km=5, window=timedelta(hours=6), max_stops=3, now=NOW)
+    assert [len(batch) for batch in batches] == [3, 3, 1]
+    assert sorted(sum(batches, [])) == list(range(7))
+
+
+def test_commit_reroutes_a_batch_that_lost_a_stop(db):
+    volunteer = {'email': 'v@x', 'availability': 'available', 'active_assignments': 0,
+                 'location': make_point(19.06, 72.86)}
+    db.volunteers.insert_one(dict(volunteer))
+    stops = [_donation(3, 19.070, 72.870), _donation(3, 19.075, 72.872), _donation(3, 19.080, 72.875)]
+    db.donations.insert_many([dict(donation, status='pending') for donation, _ in stops])
+    batch = (volunteer, stops, routing.build_route(volunteer, stops, euclidean))
+    db.donations.update_one({'_id': stops[1][0]['_id']}, {'$set': {'status': 'assigned'}})
+
+    [(_, kept, route)] = routing.commit_batches(db, [batch], euclidean)
+
+    assert [donation['_id'] for donation, _ in kept] == [stops[0][0]['_id'], stops[2][0]['_id']]
+    assert [stop['donation_id'] for stop in route['stops']] == [stops[0][0]['_id'], stops[2][0]['_id']]
+    assert db.volunteers.find_one()['active_assignments'] == 2
+    assignments = list(db.assignments.find().sort('route.stop', 1))
+    assert [a['route']['stop'] for a in assignments] == [1, 2]
+    assert {a['route']['id'] for a in assignments} == {route['id']}
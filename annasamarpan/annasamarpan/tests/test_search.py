@@ -0,0 +1,88 @@
+from datetime import datetime
+
+import search
+from indexes import INDEXES
+
+
+def _insert(db, collection, **document):
+    document.setdefault('created_at', datetime(2024, 6, 1))
+    return db[collection].insert_one(search.add_search_terms(collection, document)).inserted_id
+
+
+def test_search_terms_normalize_names_emails_and_phones():
+    terms = search.search_terms('donors', {'name': 'Ravi Kumar', 'email': 'Ravi.K@Example.com',
+                                           'phone': '+91 98201-23456', 'pincode': '400050', 'city': 'Navi Mumbai'})
+    assert terms == sorted({'ravi kumar', 'ravi', 'kumar', 'ravi.k@example.com', 'ravi.k', '919820123456',
+                            '9820123456', '400050', 'navi mumbai', 'navi', 'mumbai'})
+    assert search.search_terms('donations', {'donor_email': 'a@x', 'food_type': 'cooked_meals'}) == \
+        ['a', 'a@x', 'cooked', 'cooked_meals', 'meals']
+
+
+def test_tokenize_keeps_phone_numbers_whole_and_caps_words():
+    assert search.tokenize(' 98201 23456 ') == ['9820123456']
+    assert search.tokenize('(+91) 98201-23456') == ['919820123456']
+    assert search.tokenize('Ravi  KUMAR') == ['ravi', 'kumar']
+    assert search.tokenize('a b c d e f g') == ['a', 'b', 'c', 'd', 'e']
+    assert search.tokenize('  ') == []
+
+
+def test_key_lookup_needs_every_word_and_ranks_exact_over_prefix(db):
+    exact = _insert(db, 'volunteers', name='Ravi Kumar', city='Pune')
+    prefix = _insert(db, 'volunteers', name='Ravindra Kumar', city='Pune')
+    _insert(db, 'volunteers', name='Ravi Shah', city='Delhi')
+
+    hits = search._key_hits(db.volunteers, ['ravi', 'kumar'], {'name': 1})
+    scores = {document['_id']: score for score, document in hits}
+    assert set(scores) == {exact, prefix}
+    assert scores[exact] == search.EXACT_TERM_SCORE
+    assert scores[prefix] == (search.PREFIX_TERM_SCORE + search.EXACT_TERM_SCORE) / 2
+    assert all('search_terms' not in document for _, document in hits)
+
+    by_phone = _insert(db, 'recipients', name='Shelter', phone='022 2640 1234')
+    assert [d['_id'] for _, d in search._key_hits(db.recipients, search.tokenize('022 2640'), {})] == [by_phone]
+
+
+def test_highlights_mark_matches_and_escape_the_rest():
+    assert str(search.highlight('Ravindra <Kumar>', ['ravi'])) == '<mark>Ravi</mark>ndra &lt;Kumar&gt;'
+    # Stemmed text matches mark the shared prefix
+    assert str(search.highlight('Fresh meal packs', ['meals'])) == 'Fresh <mark>meal</mark> packs'
+    assert str(search.highlight('+91 98201 23456', ['9820123456'])) == '<mark>+91 98201 23456</mark>'
+    assert search.highlight('Pune', ['delhi']) is None
+
+
+def test_backfill_adds_terms_to_old_records_once(db):
+    db.donors.insert_many([{'name': 'Asha Rao', 'email': 'asha@x'}, {'name': 'Old', 'search_terms': ['old']}])
+    db.donations.insert_one({'donor_email': 'asha@x', 'food_type': 'fruits'})
+
+    assert search.backfill_search_terms(db) == 2
+    assert db.donors.find_one({'name': 'Asha Rao'})['search_terms'] == ['asha', 'asha rao', 'asha@x', 'rao']
+    assert search.backfill_search_terms(db) == 0
+
+
+def test_search_merges_key_and_text_hits_across_collections(server_db):
+    db = server_db
+    for name in search.SEARCH_COLLECTIONS:
+        for keys, options in INDEXES[name]:
+            if any(field == 'search_terms' or kind == 'text' for field, kind in keys):
+                db[name].create_index(keys, **options)
+    donor = _insert(db, 'donors', name='Meena Iyer', email='meena@x', city='Chennai', address='4 Beach Road')
+    volunteer = _insert(db, 'volunteers', name='Meenakshi Rao', email='mr@x', city='Chennai')
+    donation = _insert(db, 'donations', donor_email='meena@x', food_type='cooked_meals',
+                       description='Veg biryani for 40', pickup_address='4 Beach Road')
+
+    # The donor's name is an exact key and a text match, the donation's donor
+    # email an exact key, the volunteer's name only a prefix
+    hits = search.search(db, 'meena')
+    assert [(hit['collection'], hit['_id']) for hit in hits] == [
+        ('donors', donor), ('donations', donation), ('volunteers', volunteer)]
+    assert hits[0]['highlights']['name'] == '<mark>Meena</mark> Iyer'
+    assert hits[2]['highlights']['name'] == '<mark>Meena</mark>kshi Rao'
+
+    # Description words are only in the text index
+    [hit] = search.search(db, 'biryani')
+    assert hit['_id'] == donation and hit['highlights']['description'] == 'Veg <mark>biryani</mark> for 40'
+
+    # Found through both the city key and the text index: the scores add up
+    chennai = {hit['_id']: hit['score'] for hit in search.search(db, 'chennai', collections=['donors'])}
+    assert chennai[donor] > search.EXACT_TERM_SCORE
+    assert search.search(db, '   ') == []
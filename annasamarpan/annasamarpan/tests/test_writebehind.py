@@ -0,0 +1,145 @@
+import glob
+import os
+import threading
+
+import pytest
+from bson import json_util
+from bson.objectid import ObjectId
+
+import counters
+import writebehind
+
+# The journal is locked with flock()
+fcntl = pytest.importorskip('fcntl')
+
+FORM = {'name': 'Ravi', 'email': 'ravi@example.com', 'phone': '9800000001', 'address': '4 Park Street',
+        'city': 'Kolkata', 'state': 'WB', 'pincode': '700016'}
+
+
+def _buffer(db, tmp_path, **options):
+    options.setdefault('flush_ms', 50)
+    return writebehind.WriteBehind(lambda: db, journal_dir=str(tmp_path), fsync=False, enabled=True, **options)
+
+
+def _segments(tmp_path):
+    return glob.glob(os.path.join(str(tmp_path), 'writebehind-*.jsonl'))
+
+
+def _orphan(tmp_path, records, name='writebehind-1-dead-000001.jsonl'):
+    with open(os.path.join(str(tmp_path), name), 'w', encoding='utf-8') as segment:
+        for collection, document in records:
+            segment.write(json_util.dumps({'c': collection, 'd': document}) + '\n')
+    return os.path.join(str(tmp_path), name)
+
+
+def test_disabled_buffer_leaves_the_write_to_the_caller(db, tmp_path):
+    buffer = writebehind.WriteBehind(lambda: db, journal_dir=str(tmp_path), enabled=False)
+    assert buffer.offer('volunteers', {'email': 'a@x'}) is False
+    assert buffer.thread is None and _segments(tmp_path) == []
+
+
+def test_offer_journals_then_flush_stores_and_retires_the_segment(db, tmp_path):
+    inserted = []
+    buffer = _buffer(db, tmp_path, flush_ms=60000, batch_size=100,
+                     after_insert={'volunteers': lambda database, count: inserted.append(count)})
+    assert buffer.offer('volunteers', {'email': 'a@x'}) and buffer.offer('volunteers', {'email': 'b@x'})
+
+    # Journaled with its _id before anything reaches the database
+    [segment] = _segments(tmp_path)
+    journaled = writebehind.read_segment(segment)
+    assert [document['email'] for _, document in journaled] == ['a@x', 'b@x']
+    assert all(isinstance(document['_id'], ObjectId) for _, document in journaled)
+    assert db.volunteers.count_documents({}) == 0
+
+    buffer.stop()
+    assert sorted(v['email'] for v in db.volunteers.find()) == ['a@x', 'b@x']
+    assert {v['_id'] for v in db.volunteers.find()} == {document['_id'] for _, document in journaled}
+    assert inserted == [2]
+    assert _segments(tmp_path) == []
+
+
+def test_full_batch_is_flushed_without_waiting_for_the_timer(db, tmp_path):
+    buffer = _buffer(db, tmp_path, flush_ms=60000, batch_size=3)
+    for i in range(3):
+        buffer.offer('monthly_donors', {'email': f'{i}@x'})
+    for _ in range(200):
+        if db.monthly_donors.count_documents({}) == 3:
+            break
+        threading.Event().wait(0.01)
+    assert db.monthly_donors.count_documents({}) == 3
+    buffer.stop()
+
+
+def test_full_buffer_hands_the_write_back_after_the_timeout(db, tmp_path):
+    release = threading.Event()
+
+    def blocked_database():
+        release.wait(5)
+        return db
+
+    buffer = writebehind.WriteBehind(blocked_database, journal_dir=str(tmp_path), fsync=False, enabled=True,
+                                     buffer_size=1, flush_ms=0, enqueue_timeout=0.05)
+    assert buffer.offer('volunteers', {'email': 'a@x'}) is True
+    assert buffer.offer('volunteers', {'email': 'b@x'}) is False
+    release.set()
+    buffer.stop()
+    assert [v['email'] for v in db.volunteers.find()] == ['a@x']
+
+
+def test_recover_replays_orphans_without_inserting_twice(db, tmp_path):
+    stored = {'_id': ObjectId(), 'email': 'stored@x'}
+    db.volunteers.insert_one(dict(stored))
+    path = _orphan(tmp_path, [('volunteers', stored), ('volunteers', {'_id': ObjectId(), 'email': 'new@x'}),
+                              ('monthly_donors', {'_id': ObjectId(), 'email': 'm@x'})])
+    # A torn last line from a crash mid-append is skipped
+    with open(path, 'a', encoding='utf-8') as segment:
+        segment.write('{"c": "volunteers", "d": {"em')
+    inserted = []
+    buffer = _buffer(db, tmp_path, after_insert={'volunteers': lambda database, count: inserted.append(count)})
+
+    assert buffer.recover() == 3
+    assert sorted(v['email'] for v in db.volunteers.find()) == ['new@x', 'stored@x']
+    assert db.monthly_donors.count_documents({}) == 1
+    assert inserted == [1]
+    assert not os.path.exists(path)
+    assert not os.path.exists(os.path.join(str(tmp_path), writebehind.REJECTED_FILE))
+
+
+def test_recover_skips_segments_a_live_process_holds(db, tmp_path):
+    path = _orphan(tmp_path, [('volunteers', {'_id': ObjectId(), 'email': 'a@x'})])
+    with open(path, encoding='utf-8') as held:
+        fcntl.flock(held, fcntl.LOCK_EX)
+        assert _buffer(db, tmp_path).recover() == 0
+    assert os.path.exists(path) and db.volunteers.count_documents({}) == 0
+
+
+def test_unique_conflicts_are_refused_and_kept(db, tmp_path, capsys):
+    db.volunteers.create_index('email', unique=True)
+    db.volunteers.insert_one({'_id': ObjectId(), 'email': 'taken@x'})
+    replayed = {'_id': ObjectId(), 'email': 'replayed@x'}
+    db.volunteers.insert_one(dict(replayed))
+    conflict = {'_id': ObjectId(), 'email': 'taken@x'}
+    fresh = {'_id': ObjectId(), 'email': 'fresh@x'}
+
+    assert _buffer(db, tmp_path)._insert('volunteers', [replayed, conflict, fresh]) == 1
+
+    assert db.volunteers.count_documents({}) == 3
+    with open(os.path.join(str(tmp_path), writebehind.REJECTED_FILE), encoding='utf-8') as rejected:
+        [line] = rejected.readlines()
+    assert json_util.loads(line)['d'] == conflict
+    assert str(conflict['_id']) in capsys.readouterr().out
+
+
+def test_volunteer_sign_up_is_queued_and_a_known_email_reported(app_module, client, db, tmp_path, monkeypatch):
+    buffer = _buffer(db, tmp_path, after_insert=app_module.WRITE_BEHIND_AFTER_INSERT)
+    monkeypatch.setattr(app_module, 'write_behind', buffer)
+
+    client.post('/volunteer', data=FORM)
+    buffer.stop()
+    assert db.volunteers.find_one({'email': FORM['email']})['name'] == 'Ravi'
+    counters.invalidate()
+    assert counters.get_stats(db.counters)['total_volunteers'] == 1
+
+    response = client.post('/volunteer', data=FORM, follow_redirects=True)
+    assert b'already registered' in response.data
+    assert db.volunteers.count_documents({}) == 1
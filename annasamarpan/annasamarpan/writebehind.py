@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""
+Write-behind registrations for Annasamarpan
+With WRITE_BEHIND=true, the /volunteer and /monthly-donor handlers hand their
+validated documents to a bounded in-process buffer and return right away. A
+flusher thread writes the buffer with insert_many every WRITE_BEHIND_FLUSH_MS
+milliseconds, or as soon as WRITE_BEHIND_BATCH_SIZE documents are waiting, so
+a registration drive costs the database a few large inserts instead of
+thousands of small ones.
+
+Every document is appended to a local journal (and fsynced) before the
+handler returns. Segments are deleted once their documents are stored, and
+segments left behind by a crashed process are replayed on the next start.
+Documents carry their _id from the moment they are journaled, so a replay
+never inserts anything twice. When the buffer is full, a handler waits up to
+WRITE_BEHIND_ENQUEUE_TIMEOUT seconds for space and then writes synchronously,
+so under sustained overload latency climbs back to database latency rather
+than memory growing without bound.
+
+Usage:
+    python writebehind.py status   # journal segments waiting to be written
+    python writebehind.py replay   # write segments left by processes that exited
+"""
+
+import argparse
+import atexit
+import collections
+import glob
+import os
+import threading
+import time
+import uuid
+
+from bson import json_util
+from bson.objectid import ObjectId
+from pymongo.errors import BulkWriteError, PyMongoError
+
+# Buffer registrations and write them in batches
+WRITE_BEHIND = os.environ.get('WRITE_BEHIND', 'false').lower() == 'true'
+
+# Documents held in memory before handlers are made to wait
+WRITE_BEHIND_BUFFER = int(os.environ.get('WRITE_BEHIND_BUFFER', 5000))
+
+# Flush when this many documents are waiting, or after WRITE_BEHIND_FLUSH_MS
+WRITE_BEHIND_BATCH_SIZE = int(os.environ.get('WRITE_BEHIND_BATCH_SIZE', 500))
+WRITE_BEHIND_FLUSH_MS = int(os.environ.get('WRITE_BEHIND_FLUSH_MS', 200))
+
+# Seconds a handler waits for buffer space before writing synchronously
+WRITE_BEHIND_ENQUEUE_TIMEOUT = float(os.environ.get('WRITE_BEHIND_ENQUEUE_TIMEOUT', 0.5))
+
+# Where journal segments live; use a persistent volume in containers
+WRITE_BEHIND_JOURNAL_DIR = os.environ.get(
+    'WRITE_BEHIND_JOURNAL_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'journal'))
+
+# fsync every append; without it a process crash is still safe, a power cut is not
+WRITE_BEHIND_FSYNC = os.environ.get('WRITE_BEHIND_FSYNC', 'true').lower() == 'true'
+
+# Records per journal segment before a new one is started
+SEGMENT_RECORDS = 10000
+
+# Documents the database refused for good (e.g. a repeated email) are kept here
+REJECTED_FILE = 'rejected.jsonl'
+
+
+def _fcntl():
+    """fcntl, imported on first use so the module still loads on Windows"""
+    try:
+        import fcntl
+    except ImportError:
+        raise RuntimeError('WRITE_BEHIND locks its journal with flock(), which needs Linux or macOS '
+                           '(run it under docker compose on Windows)') from None
+    return fcntl
+
+
+def read_segment(path):
+    """(collection, document) pairs from a journal segment; a torn last line is skipped"""
+    records = []
+    with open(path, encoding='utf-8') as segment:
+        for line in segment:
+            try:
+                record = json_util.loads(line)
+            except ValueError:
+                continue
+            records.append((record['c'], record['d']))
+    return records
+
+
+class _Segment:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'a', encoding='utf-8')
+        # Held until the segment is retired; a segment nobody holds is an orphan
+        fcntl = _fcntl()
+        fcntl.flock(self.file, fcntl.LOCK_EX)
+        self.records = 0
+        self.outstanding = 0
+
+
+class WriteBehind:
+    """Journaled buffer of inserts drained by one flusher thread per process"""
+
+    def __init__(self, get_database, journal_dir=WRITE_BEHIND_JOURNAL_DIR, buffer_size=WRITE_BEHIND_BUFFER,
+                 batch_size=WRITE_BEHIND_BATCH_SIZE, flush_ms=WRITE_BEHIND_FLUSH_MS,
+                 enqueue_timeout=WRITE_BEHIND_ENQUEUE_TIMEOUT, fsync=WRITE_BEHIND_FSYNC, after_insert=None,
+                 enabled=WRITE_BEHIND):
+        if enabled:
+            # Fail at startup rather than on the first sign-up
+            _fcntl()
+        self.enabled = enabled
+        self.get_database = get_database
+        self.journal_dir = journal_dir
+        self.buffer_size = buffer_size
+        self.batch_size = batch_size
+        self.flush_ms = flush_ms
+        self.enqueue_timeout = enqueue_timeout
+        self.fsync = fsync
+        # collection -> callback(db, inserted_count), e.g. to bump counters
+        self.after_insert = after_insert or {}
+        self.lock = threading.Lock()
+        self.ready = threading.Condition(self.lock)
+        self.pending = collections.deque()
+        self.slots = None
+        self.segments = {}
+        self.segment = None
+        self.sequence = 0
+        self.pid = None
+        self.thread = None
+        self.stopping = False
+
+    def ensure_started(self):
+        """Start the flusher in this process (again after fork), replaying orphaned segments first"""
+        if self.pid == os.getpid() and self.thread is not None and self.thread.is_alive():
+            return
+        with self.lock:
+            if self.pid == os.getpid() and self.thread is not None and self.thread.is_alive():
+                return
+            # State copied from a parent process belongs to the parent
+            self.pid = os.getpid()
+            self.pending.clear()
+            self.segments = {}
+            self.segment = None
+            self.stopping = False
+            self.slots = threading.BoundedSemaphore(self.buffer_size)
+            os.makedirs(self.journal_dir, exist_ok=True)
+            self.thread = threading.Thread(target=self.run, name='write-behind', daemon=True)
+            self.thread.start()
+        atexit.register(self.stop)
+
+    def offer(self, collection, document):
+        """Journal a document and queue it for insertion
+
+        Returns False, leaving the write to the caller, when write-behind is
+        off or the buffer stayed full for the whole enqueue timeout.
+        """
+        if not self.enabled:
+            return False
+        self.ensure_started()
+        if not self.slots.acquire(timeout=self.enqueue_timeout):
+            return False
+        document.setdefault('_id', ObjectId())
+        line = json_util.dumps({'c': collection, 'd': document}) + '\n'
+        with self.lock:
+            segment = self._current_segment()
+            segment.file.write(line)
+            segment.file.flush()
+            if self.fsync:
+                os.fsync(segment.file.fileno())
+            segment.records += 1
+            segment.outstanding += 1
+            self.pending.append((collection, document, segment))
+            if len(self.pending) == 1 or len(self.pending) >= self.batch_size:
+                self.ready.notify()
+        return True
+
+    def _current_segment(self):
+        if self.segment is None or self.segment.records >= SEGMENT_RECORDS:
+            self.sequence += 1
+            path = os.path.join(self.journal_dir, f'writebehind-{self.pid}-{uuid.uuid4().hex[:8]}-{self.sequence:06d}.jsonl')
+            self.segment = self.segments[path] = _Segment(path)
+        return self.segment
+
+    def _retire(self, segment):
+        # Every document in it is stored; nothing left to replay
+        segment.file.close()
+        os.unlink(segment.path)
+        del self.segments[segment.path]
+        if self.segment is segment:
+            self.segment = None
+
+    def run(self):
+        self.recover()
+        while True:
+            with self.ready:
+                while not self.pending and not self.stopping:
+                    self.ready.wait(1.0)
+                if not self.pending:
+                    return
+                # Give the batch up to flush_ms to fill
+                deadline = time.monotonic() + self.flush_ms / 1000
+                while len(self.pending) < self.batch_size and not self.stopping:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.ready.wait(remaining)
+                batch = [self.pending.popleft() for _ in range(min(self.batch_size, len(self.pending)))]
+
+            self.write([(collection, document) for collection, document, _ in batch])
+
+            with self.lock:
+                for _, _, segment in batch:
+                    segment.outstanding -= 1
+                for segment in {segment for _, _, segment in batch}:
+                    if not segment.outstanding:
+                        self._retire(segment)
+            for _ in batch:
+                self.slots.release()
+
+    def write(self, records):
+        """insert_many per collection, retrying until the database has them all"""
+        by_collection = {}
+        for collection, document in records:
+            by_collection.setdefault(collection, []).append(document)
+        for collection, documents in by_collection.items():
+            delay = 0.5
+            while True:
+                try:
+                    inserted = self._insert(collection, documents)
+                    break
+                except PyMongoError as e:
+                    print(f"⚠️  Write-behind insert into {collection} failed ({e}); retrying in {delay:.1f}s")
+                    time.sleep(delay)
+                    delay = min(delay * 2, 30)
+            if inserted and collection in self.after_insert:
+                self.after_insert[collection](self.get_database(), inserted)
+
+    def _insert(self, collection, documents):
+        try:
+            return len(self.get_database()[collection].insert_many(documents, ordered=False).inserted_ids)
+        except BulkWriteError as e:
+            errors = e.details['writeErrors']
+            # A document whose _id is already stored was written by an earlier
+            # attempt or replay. Any other failure, including a duplicate on
+            # another unique key (a repeated volunteer email), is a real refusal
+            duplicate_ids = [documents[error['index']]['_id'] for error in errors if error['code'] == 11000]
+            stored = {document['_id'] for document in
+                      self.get_database()[collection].find({'_id': {'$in': duplicate_ids}}, {'_id': 1})}
+            refused = [error for error in errors if documents[error['index']]['_id'] not in stored]
+            if refused:
+                with open(os.path.join(self.journal_dir, REJECTED_FILE), 'a', encoding='utf-8') as rejected:
+                    for error in refused:
+                        document = documents[error['index']]
+                        rejected.write(json_util.dumps({'c': collection, 'd': document,
+                                                        'error': error.get('errmsg')}) + '\n')
+                        print(f"❌ Write-behind {collection} document {document['_id']} refused: {error.get('errmsg')}")
+                print(f"❌ {len(refused)} write-behind documents refused by {collection}; see {REJECTED_FILE}")
+            return e.details['nInserted']
+
+    def recover(self):
+        """Write the segments of processes that died before flushing them; returns documents replayed"""
+        fcntl = _fcntl()
+        replayed = 0
+        for path in sorted(glob.glob(os.path.join(self.journal_dir, 'writebehind-*.jsonl'))):
+            with open(path, encoding='utf-8') as segment:
+                try:
+                    # Fails while the writing process (or another recoverer) holds it
+                    fcntl.flock(segment, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+                try:
+                    if os.stat(path).st_ino != os.fstat(segment.fileno()).st_ino:
+                        continue
+                except FileNotFoundError:
+                    # Replayed and removed by another process in the meantime
+                    continue
+                records = read_segment(path)
+                for start in range(0, len(records), self.batch_size):
+                    self.write(records[start:start + self.batch_size])
+                os.unlink(path)
+            replayed += len(records)
+        if replayed:
+            print(f"✅ Replayed {replayed} journaled write-behind documents")
+        return replayed
+
+    def stop(self, timeout=10):
+        """Flush what is buffered and stop the flusher"""
+        if self.thread is None or self.pid != os.getpid():
+            return
+        with self.ready:
+            self.stopping = True
+            self.ready.notify()
+        self.thread.join(timeout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect or replay the write-behind journal')
+    parser.add_argument('command', choices=['status', 'replay'])
+    parser.add_argument('--journal-dir', default=WRITE_BEHIND_JOURNAL_DIR)
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.journal_dir, '*.jsonl')))
+    if args.command == 'status':
+        print(f"📒 Write-behind {'on' if WRITE_BEHIND else 'off'}; journal {args.journal_dir}")
+        for path in paths:
+            print(f"   {os.path.basename(path)}: {len(read_segment(path))} documents")
+        if not paths:
+            print("   (empty)")
+        return
+
+    import app
+
+    journal = WriteBehind(app.get_db, journal_dir=args.journal_dir, after_insert=app.WRITE_BEHIND_AFTER_INSERT,
+                          enabled=False)
+    print(f"✅ Replayed {journal.recover()} documents")
+
+
+if __name__ == '__main__':
+    main()
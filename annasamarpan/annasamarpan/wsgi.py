@@ -0,0 +1,10 @@
+"""
+WSGI entry point for Annasamarpan
+Run with a production server instead of the Flask development server:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+
+from app import create_app
+
+app = create_app()